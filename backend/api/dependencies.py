@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+"""
+Shared service instances used by the API routes, and their lifecycle.
+
+Services are built from the settings at import time; :func:`startup` and
+:func:`shutdown` are driven by the FastAPI lifespan in ``backend.main``.
+"""
+
+import logging
+from typing import Optional
+
+from backend.config import get_settings
+from backend.services.answer_cache import AnswerCache
+from backend.services.answer_streams import AnswerStreamRegistry
+from backend.services.batch_answers import BatchAnswerService
+from backend.services.context_builder import ContextBuilder
+from backend.services.conversation_memory import ConversationMemory
+from backend.services.deepseek_service import DeepSeekService
+from backend.services.rag_service import RAGService
+from backend.services.retrieval_executor import RetrievalExecutor
+from backend.services.scheduler import UpstreamScheduler
+from backend.services.stream_coalescer import StreamCoalescer
+from backend.utils.bm25_index import BM25Index
+from backend.utils.embedding_store import EmbeddingStore
+from backend.utils.neo4j_client import Neo4jClient
+from backend.utils.sessions import SessionTokens
+from backend.utils.tracing import TraceRecorder
+from backend.utils.vector_index import VectorIndex
+
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+neo4j_client: Optional[Neo4jClient]
+if (
+    settings.neo4j_uri
+    and settings.neo4j_user
+    and settings.neo4j_password
+):
+    neo4j_client = Neo4jClient(
+        uri=settings.neo4j_uri,
+        user=settings.neo4j_user,
+        password=settings.neo4j_password,
+    )
+else:
+    logger.warning("Neo4j configuration incomplete; RAG will run without graph data")
+    neo4j_client = None
+
+retrieval_executor = RetrievalExecutor(
+    mode=settings.rag_executor_mode,
+    max_workers=settings.rag_executor_workers,
+    max_pending=settings.rag_executor_max_pending,
+    inline_threshold=settings.rag_executor_inline_threshold,
+)
+rag_service = RAGService(
+    neo4j_client,
+    candidate_limit=settings.rag_candidate_limit,
+    vector_index=(
+        VectorIndex()
+        if settings.vector_index_enabled and neo4j_client is not None
+        else None
+    ),
+    use_fulltext=settings.neo4j_fulltext_enabled,
+    embedding_store=(
+        EmbeddingStore(settings.embedding_store_path)
+        if settings.embedding_store_path
+        else None
+    ),
+    bm25_index=BM25Index() if settings.bm25_index_enabled else None,
+    rrf_k=settings.rag_rrf_k,
+    executor=retrieval_executor,
+    context_builder=ContextBuilder(
+        token_budget=settings.rag_context_token_budget,
+        mmr_lambda=settings.rag_mmr_lambda,
+        duplicate_threshold=settings.rag_duplicate_threshold,
+        max_answer_tokens=settings.rag_max_answer_tokens,
+    ),
+    strategies=settings.rag_strategies,
+    deadline=settings.rag_deadline_ms / 1000 if settings.rag_deadline_ms > 0 else None,
+    hedge_delay=settings.rag_hedge_ms / 1000 if settings.rag_hedge_ms > 0 else None,
+)
+deepseek_service = DeepSeekService(
+    api_key=settings.deepseek_api_key,
+    api_base=settings.deepseek_api_base,
+    max_connections=settings.deepseek_max_connections,
+    max_keepalive_connections=settings.deepseek_max_keepalive_connections,
+    keepalive_expiry=settings.deepseek_keepalive_expiry,
+    connect_timeout=settings.deepseek_connect_timeout,
+    first_byte_timeout=settings.deepseek_first_byte_timeout,
+    inter_token_timeout=settings.deepseek_inter_token_timeout,
+    max_retries=settings.deepseek_max_retries,
+    http2=settings.deepseek_http2,
+    hedge_delay=settings.deepseek_hedge_ms / 1000 if settings.deepseek_hedge_ms > 0 else None,
+)
+answer_cache: Optional[AnswerCache] = (
+    AnswerCache(
+        max_entries=settings.answer_cache_max_entries,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        sqlite_path=settings.answer_cache_sqlite_path,
+        max_disk_entries=settings.answer_cache_sqlite_max_rows,
+        prune_interval=settings.answer_cache_sqlite_prune_interval,
+    )
+    if settings.answer_cache_enabled
+    else None
+)
+conversation_memory: Optional[ConversationMemory] = (
+    ConversationMemory(
+        max_turns=settings.conversation_max_turns,
+        token_budget=settings.conversation_token_budget,
+        max_conversations=settings.conversation_max_conversations,
+        max_total_tokens=settings.conversation_max_total_tokens,
+        idle_ttl_seconds=settings.conversation_idle_ttl_seconds,
+        sqlite_path=settings.conversation_sqlite_path,
+        disk_ttl_seconds=settings.conversation_sqlite_ttl_seconds,
+        max_disk_rows=settings.conversation_sqlite_max_rows,
+        prune_interval=settings.conversation_sqlite_prune_interval,
+    )
+    if settings.conversation_memory_enabled
+    else None
+)
+scheduler = UpstreamScheduler(
+    max_concurrent=settings.upstream_max_concurrent,
+    rate_per_second=settings.upstream_rate_per_second,
+    burst=settings.upstream_burst,
+    max_queue=settings.upstream_max_queue,
+)
+stream_coalescer: Optional[StreamCoalescer] = (
+    StreamCoalescer() if settings.stream_coalescing_enabled else None
+)
+answer_streams = AnswerStreamRegistry(
+    grace_period=settings.stream_resume_grace_seconds,
+    max_stream_chars=settings.stream_replay_max_chars,
+    max_total_chars=settings.stream_replay_max_total_chars,
+)
+
+session_tokens = SessionTokens(settings.session_secret)
+
+trace_recorder = TraceRecorder(
+    enabled=settings.trace_enabled,
+    slow_threshold_ms=settings.trace_slow_threshold_ms,
+    path=settings.trace_file,
+    max_bytes=settings.trace_max_bytes,
+    backup_count=settings.trace_backup_count,
+    profile_sample_rate=settings.trace_profile_sample_rate,
+    profile_interval=settings.trace_profile_interval_ms / 1000.0,
+)
+
+SYSTEM_PROMPT = (
+    "You are an educational Q&A assistant. "
+    "Use the provided knowledge graph context when helpful, and give clear, "
+    "concise explanations suitable for students."
+)
+
+batch_answers = BatchAnswerService(
+    rag_service,
+    deepseek_service,
+    scheduler,
+    system_prompt=SYSTEM_PROMPT,
+    model=settings.deepseek_model,
+    answer_cache=answer_cache,
+    concurrency=settings.batch_concurrency,
+    retrieval_chunk=settings.batch_retrieval_chunk,
+    max_jobs=settings.batch_max_jobs,
+    job_ttl_seconds=settings.batch_job_ttl_seconds,
+)
+
+
+def get_batch_answer_service() -> BatchAnswerService:
+    """Return the shared batch answer service (used by the REST routes)."""
+
+    return batch_answers
+
+
+async def startup() -> None:
+    """Prepare shared chat services before the first connection is served."""
+
+    if neo4j_client is not None and settings.neo4j_fulltext_enabled:
+        await neo4j_client.ensure_fulltext_indexes()
+    if neo4j_client is not None and settings.topic_graph_enabled:
+        await neo4j_client.refresh_topic_graph()
+    try:
+        await rag_service.load_index()
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Failed to load vector index; falling back to Neo4j scans: %s", exc)
+    if neo4j_client is not None and settings.topic_graph_enabled:
+        neo4j_client.add_graph_change_listener(rag_service.load_index)
+        neo4j_client.start_topic_graph_refresh(
+            settings.topic_graph_probe_interval,
+            max_age=settings.topic_graph_max_age or None,
+        )
+    if settings.deepseek_warmup:
+        await deepseek_service.warm_up()
+
+
+async def shutdown() -> None:
+    """Release resources held by shared chat services."""
+
+    await answer_streams.close()
+    await batch_answers.close()
+    await deepseek_service.aclose()
+    retrieval_executor.shutdown()
+    if neo4j_client is not None:
+        await neo4j_client.close()
+    if answer_cache is not None:
+        answer_cache.close()
+    if conversation_memory is not None:
+        conversation_memory.close()
@@ -2,9 +2,15 @@ from __future__ import annotations
 
 """REST API routes for the DeepSeek Education Assistant backend."""
 
-from fastapi import APIRouter
+from typing import AsyncIterator
 
-from backend.models.message import HealthResponse
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from backend.api.dependencies import get_batch_answer_service
+from backend.config import get_settings
+from backend.models.message import BatchAnswerRequest, BatchJobStatus, HealthResponse
+from backend.services.batch_answers import BatchAnswerService, BatchJob, BatchJobLimitError
 
 
 router = APIRouter(prefix="/api", tags=["api"])
@@ -16,3 +22,97 @@ async def health_check() -> HealthResponse:
 
     return HealthResponse()
 
+
+def _check_batch_size(request: BatchAnswerRequest) -> None:
+    """Reject empty batches and batches over the configured size."""
+
+    limit = get_settings().batch_max_questions
+    if not request.questions:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "No questions given.")
+    if len(request.questions) > limit:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {limit} questions can be answered per batch.",
+        )
+
+
+def _job_status(job: BatchJob, offset: int = 0) -> BatchJobStatus:
+    """Describe ``job`` with its results from ``offset`` on."""
+
+    completed = len(job.results)
+    offset = min(max(offset, 0), completed)
+    return BatchJobStatus(
+        job_id=job.job_id,
+        status=job.status,
+        total=job.total,
+        completed=completed,
+        results=job.results[offset:completed],
+        next_offset=completed,
+    )
+
+
+@router.post("/answer/batch")
+async def answer_batch(
+    request: BatchAnswerRequest,
+    service: BatchAnswerService = Depends(get_batch_answer_service),
+) -> StreamingResponse:
+    """
+    Answer many questions, streaming one NDJSON result line per question.
+
+    Lines arrive in completion order; each carries the question's
+    ``index`` in the request. Disconnecting stops the remaining answers.
+    """
+
+    _check_batch_size(request)
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in service.answer(request.questions):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/answer/batch/jobs",
+    response_model=BatchJobStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_batch_job(
+    request: BatchAnswerRequest,
+    service: BatchAnswerService = Depends(get_batch_answer_service),
+) -> BatchJobStatus:
+    """Start answering many questions in the background; poll the returned job."""
+
+    _check_batch_size(request)
+    try:
+        job = service.submit(request.questions)
+    except BatchJobLimitError as exc:
+        raise HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, str(exc)) from exc
+    return _job_status(job)
+
+
+@router.get("/answer/batch/jobs/{job_id}", response_model=BatchJobStatus)
+async def get_batch_job(
+    job_id: str,
+    offset: int = 0,
+    service: BatchAnswerService = Depends(get_batch_answer_service),
+) -> BatchJobStatus:
+    """Return a batch job's state and its results from ``offset`` on."""
+
+    job = service.job(job_id)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Unknown or expired batch job.")
+    return _job_status(job, offset)
+
+
+@router.delete("/answer/batch/jobs/{job_id}", response_model=BatchJobStatus)
+async def cancel_batch_job(
+    job_id: str,
+    service: BatchAnswerService = Depends(get_batch_answer_service),
+) -> BatchJobStatus:
+    """Cancel a batch job, keeping the results it already has."""
+
+    job = await service.cancel(job_id)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Unknown or expired batch job.")
+    return _job_status(job)
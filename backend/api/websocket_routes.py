@@ -2,17 +2,33 @@ from __future__ import annotations
 
 """WebSocket routes for chat interactions."""
 
+import asyncio
+import functools
 import json
 import logging
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from backend.api import dependencies
 from backend.config import get_settings
-from backend.models.message import AssistantChunk, UserMessage
-from backend.services.deepseek_service import DeepSeekService
-from backend.services.rag_service import RAGService
-from backend.utils.neo4j_client import Neo4jClient
+from backend.models.message import (
+    AssistantChunk,
+    CancelMessage,
+    QueueStatus,
+    ResumeFailed,
+    ResumeMessage,
+    SessionInfo,
+    UserMessage,
+)
+from backend.services.answer_cache import AnswerCache, iter_replay_chunks
+from backend.services.answer_streams import AnswerStream, StreamOffsetError
+from backend.services.context_builder import build_user_prompt
+from backend.services.scheduler import SchedulerQueueFullError
+from backend.utils.chunk_batcher import ChunkBatcher
+from backend.utils.metrics import ANSWER_STREAM_RESUMES, ERRORS, WEBSOCKET_CONNECTIONS
+from backend.utils.sessions import scoped_key
+from backend.utils.tracing import trace_mark, trace_span
 
 
 logger = logging.getLogger(__name__)
@@ -20,50 +36,343 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["ws"])
 
 _settings = get_settings()
-_neo4j_client: Optional[Neo4jClient]
-if (
-    _settings.neo4j_uri
-    and _settings.neo4j_user
-    and _settings.neo4j_password
-):
-    _neo4j_client = Neo4jClient(
-        uri=_settings.neo4j_uri,
-        user=_settings.neo4j_user,
-        password=_settings.neo4j_password,
+
+
+async def _stream_answer(
+    send_text: Callable[[str], Awaitable[None]],
+    message: UserMessage,
+    scheduler_key: str,
+    request_key: str,
+    user_prompt: str,
+    history: List[Dict[str, str]],
+) -> AsyncIterator[str]:
+    """
+    Stream an answer from DeepSeek, sharing identical in-flight requests.
+
+    The upstream call waits for a slot from the scheduler under
+    ``scheduler_key`` for fairness; queue positions are reported to the
+    client that started it. Completed answers are stored in the answer cache once
+    per upstream stream, regardless of how many clients were attached to it.
+    """
+
+    async def report_position(position: int) -> None:
+        await send_text(
+            QueueStatus(
+                message_id=message.message_id,
+                position=position,
+            ).model_dump_json()
+        )
+
+    async def open_upstream() -> AsyncIterator[str]:
+        async with dependencies.scheduler.slot(
+            scheduler_key,
+            on_position=report_position,
+        ):
+            trace_mark("scheduler.admitted")
+            async for chunk in dependencies.deepseek_service.astream_chat(
+                system_prompt=dependencies.SYSTEM_PROMPT,
+                user_content=user_prompt,
+                model=_settings.deepseek_model,
+                history=history,
+            ):
+                yield chunk
+
+    async def store_answer(answer: str) -> None:
+        if dependencies.answer_cache is not None:
+            await dependencies.answer_cache.set(request_key, answer)
+
+    if dependencies.stream_coalescer is not None:
+        async for chunk in dependencies.stream_coalescer.stream(
+            request_key,
+            open_upstream,
+            on_complete=store_answer,
+        ):
+            yield chunk
+        return
+
+    answer_parts: list[str] = []
+    async for chunk in open_upstream():
+        answer_parts.append(chunk)
+        yield chunk
+    await store_answer("".join(answer_parts))
+
+
+async def _answer_message(stream: AnswerStream, message: UserMessage, session_id: str) -> None:
+    """
+    Run RAG and append the DeepSeek answer for one user message to ``stream``.
+
+    The message's ``conversation_id`` is scoped to ``session_id``, so
+    clients using the same id never share history.
+    """
+
+    conversation_key = scoped_key(session_id, message.conversation_id) if message.conversation_id else None
+
+    context = ""
+    try:
+        context = await dependencies.rag_service.build_context(message.content)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Error while building RAG context: %s", exc)
+        ERRORS.labels("rag").inc()
+        stream.append(
+            "An error occurred while retrieving context from the "
+            "knowledge graph. I will answer without it."
+        )
+    user_prompt = build_user_prompt(message.content, context)
+
+    history: List[Dict[str, str]] = []
+    if dependencies.conversation_memory is not None and conversation_key is not None:
+        history = await dependencies.conversation_memory.history(conversation_key)
+
+    request_key = AnswerCache.make_key(
+        model=_settings.deepseek_model,
+        system_prompt=dependencies.SYSTEM_PROMPT,
+        question=message.content,
+        context=context,
+        history=history,
     )
-else:
-    logger.warning("Neo4j configuration incomplete; RAG will run without graph data")
-    _neo4j_client = None
-
-_rag_service = RAGService(_neo4j_client)
-_deepseek_service = DeepSeekService(
-    api_key=_settings.deepseek_api_key,
-    api_base=_settings.deepseek_api_base,
-)
+    cached_answer: Optional[str] = None
+    if dependencies.answer_cache is not None:
+        with trace_span("answer_cache.get"):
+            cached_answer = await dependencies.answer_cache.get(request_key)
 
-_SYSTEM_PROMPT = (
-    "You are an educational Q&A assistant. "
-    "Use the provided knowledge graph context when helpful, and give clear, "
-    "concise explanations suitable for students."
-)
+    # Stream response from DeepSeek (or replay a cached answer) into the
+    # stream's replay buffer; subscribers forward it to their clients.
+    answer_parts: List[str] = []
+    try:
+        with trace_span("answer.stream", cached=cached_answer is not None):
+            if cached_answer is not None:
+                for chunk in iter_replay_chunks(cached_answer):
+                    stream.append(chunk)
+                answer_parts.append(cached_answer)
+            else:
+                async for chunk in _stream_answer(
+                    stream.broadcast,
+                    message,
+                    conversation_key or session_id,
+                    request_key,
+                    user_prompt,
+                    history,
+                ):
+                    stream.append(chunk)
+                    answer_parts.append(chunk)
+    except SchedulerQueueFullError:
+        logger.warning("Upstream queue full; rejecting message %s", message.message_id)
+        ERRORS.labels("admission").inc()
+        stream.finish(
+            "The assistant is handling too many questions right now. "
+            "Please try again in a moment."
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Error during DeepSeek streaming: %s", exc)
+        ERRORS.labels("answer").inc()
+        stream.finish(
+            "An error occurred while generating the answer. "
+            "Please try again later."
+        )
+    else:
+        if dependencies.conversation_memory is not None and conversation_key is not None:
+            await dependencies.conversation_memory.append_turn(
+                conversation_key,
+                message.content,
+                "".join(answer_parts),
+            )
+
+
+async def _generate_answer(message: UserMessage, session_id: str, stream: AnswerStream) -> None:
+    """Produce the answer for ``message`` under a ``chat_turn`` trace."""
+
+    trace = dependencies.trace_recorder.start(
+        "chat_turn",
+        message_id=message.message_id,
+        conversation_id=message.conversation_id,
+    )
+    try:
+        await _answer_message(stream, message, session_id)
+    except asyncio.CancelledError:
+        logger.info("Answer for message %s cancelled", message.message_id)
+        if trace is not None:
+            trace.attributes["cancelled"] = True
+        raise
+    finally:
+        dependencies.trace_recorder.finish(trace)
+
+
+class _ChatConnection:
+    """
+    Per-socket state: attached answer streams and serialized sends.
+
+    Answers are generated by the shared stream registry, so they survive
+    this socket; each attached stream is forwarded by its own task so the
+    receive loop keeps reading frames (including ``cancel`` and ``resume``
+    requests) while answers stream. ``session_id`` identifies the client
+    across reconnects.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str, max_concurrent: int) -> None:
+        self._websocket = websocket
+        self._session_id = session_id
+        self._max_concurrent = max_concurrent
+        self._tasks: Dict[str, asyncio.Task[None]] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send_text(self, data: str) -> None:
+        """Send one frame; frames from concurrent tasks never interleave."""
+
+        async with self._send_lock:
+            await self._websocket.send_text(data)
+
+    async def start(self, message: UserMessage) -> None:
+        """
+        Start answering ``message`` unless the connection is at capacity.
+
+        A message whose answer this session still holds for the same
+        question (for example re-sent after a reconnect) is replayed from
+        the beginning instead of being generated again.
+        """
+
+        if not await self._admit(message.message_id):
+            return
+        stream = dependencies.answer_streams.get(self._session_id, message.message_id)
+        if stream is None or stream.start_offset > 0 or stream.question != message.content:
+            stream = dependencies.answer_streams.start(
+                self._session_id,
+                message.message_id,
+                message.content,
+                functools.partial(_generate_answer, message, self._session_id),
+            )
+        self._attach(stream, 0)
+
+    async def resume(self, message: ResumeMessage) -> None:
+        """Reattach to a registered answer and continue from ``message.offset``."""
+
+        if message.message_id in self._tasks:
+            return
+        if not await self._admit(message.message_id):
+            return
+        stream = dependencies.answer_streams.get(self._session_id, message.message_id)
+        if stream is None:
+            reason = "unknown or expired message_id"
+        else:
+            try:
+                self._attach(stream, message.offset)
+            except StreamOffsetError as exc:
+                reason = str(exc)
+            else:
+                ANSWER_STREAM_RESUMES.labels("resumed").inc()
+                return
+        ANSWER_STREAM_RESUMES.labels("failed").inc()
+        await self.send_text(ResumeFailed(message_id=message.message_id, reason=reason).model_dump_json())
+
+    async def _admit(self, message_id: str) -> bool:
+        """Check the per-connection limit, telling the client if it is reached."""
+
+        if message_id not in self._tasks and len(self._tasks) < self._max_concurrent:
+            return True
+        await self.send_text(
+            AssistantChunk(
+                message_id=message_id,
+                content=(
+                    "Too many messages are being answered on this connection. "
+                    "Please wait for the current answer to finish."
+                ),
+                is_final=True,
+            ).model_dump_json()
+        )
+        return False
+
+    def _attach(self, stream: AnswerStream, offset: int) -> None:
+        """Subscribe to ``stream`` at ``offset`` and forward it in a task."""
+
+        subscription = stream.subscribe(self.send_text, offset)
+        batcher = ChunkBatcher(
+            self.send_text,
+            stream.message_id,
+            max_bytes=_settings.ws_flush_max_bytes,
+            max_delay=_settings.ws_flush_interval_ms / 1000.0,
+            offset=offset,
+        )
+
+        async def forward() -> None:
+            try:
+                async for chunk in subscription:
+                    await batcher.add(chunk)
+                # Final chunk: empty on success, the error message otherwise.
+                await batcher.close(stream.error or "")
+            except Exception as exc:  # noqa: BLE001
+                logger.info("Stopped forwarding message %s: %s", stream.message_id, exc)
+            finally:
+                subscription.close()
+                batcher.discard()
+                self._tasks.pop(stream.message_id, None)
+
+        self._tasks[stream.message_id] = asyncio.create_task(forward())
+
+    async def cancel(self, message_id: str) -> None:
+        """Abort the answer for ``message_id`` and send its final chunk."""
+
+        task = self._tasks.get(message_id)
+        stopped = dependencies.answer_streams.cancel(self._session_id, message_id)
+        if task is None and not stopped:
+            return
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.send_text(
+            AssistantChunk(
+                message_id=message_id,
+                content="",
+                is_final=True,
+            ).model_dump_json()
+        )
+
+    async def close(self) -> None:
+        """Detach from all answers; the registry keeps them for the grace period."""
+
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _parse_client_message(raw_data: str) -> Union[UserMessage, CancelMessage, ResumeMessage]:
+    """Validate a raw WebSocket frame into a client message model."""
+
+    payload: dict[str, Any] = json.loads(raw_data)
+    if payload.get("type") == "cancel":
+        return CancelMessage.model_validate(payload)
+    if payload.get("type") == "resume":
+        return ResumeMessage.model_validate(payload)
+    return UserMessage.model_validate(payload)
 
 
 @router.websocket("/ws/chat")
 async def websocket_chat_endpoint(websocket: WebSocket) -> None:
     """
     WebSocket endpoint for chat with RAG + DeepSeek streaming.
+
+    A client reconnecting with the ``session`` token it was sent keeps its
+    session; otherwise a new session is issued.
     """
 
+    token, session_id = dependencies.session_tokens.session_for(websocket.query_params.get("session"))
+
     await websocket.accept()
+    WEBSOCKET_CONNECTIONS.inc()
+    connection = _ChatConnection(
+        websocket,
+        session_id,
+        max_concurrent=_settings.ws_max_concurrent_messages,
+    )
     try:
+        await connection.send_text(SessionInfo(session=token).model_dump_json())
         while True:
             raw_data = await websocket.receive_text()
             try:
-                payload: dict[str, Any] = json.loads(raw_data)
-                message = UserMessage.model_validate(payload)
+                message = _parse_client_message(raw_data)
             except Exception as exc:  # noqa: BLE001
                 logger.warning("Invalid WebSocket payload: %s", exc)
-                await websocket.send_text(
+                await connection.send_text(
                     AssistantChunk(
                         message_id="unknown",
                         content="Invalid message format.",
@@ -72,60 +381,18 @@ async def websocket_chat_endpoint(websocket: WebSocket) -> None:
                 )
                 continue
 
-            try:
-                context = await _rag_service.build_context(message.content)
-                user_prompt = f"{context}\n\nUser question: {message.content}"
-            except Exception as exc:  # noqa: BLE001
-                logger.error("Error while building RAG context: %s", exc)
-                await websocket.send_text(
-                    AssistantChunk(
-                        message_id=message.message_id,
-                        content=(
-                            "An error occurred while retrieving context from the "
-                            "knowledge graph. I will answer without it."
-                        ),
-                        is_final=False,
-                    ).model_dump_json()
-                )
-                user_prompt = message.content
-
-            # Stream response from DeepSeek and forward chunks to the client.
-            try:
-                async for chunk in _deepseek_service.astream_chat(
-                    system_prompt=_SYSTEM_PROMPT,
-                    user_content=user_prompt,
-                ):
-                    await websocket.send_text(
-                        AssistantChunk(
-                            message_id=message.message_id,
-                            content=chunk,
-                            is_final=False,
-                        ).model_dump_json()
-                    )
-
-                # Final empty chunk to signal completion.
-                await websocket.send_text(
-                    AssistantChunk(
-                        message_id=message.message_id,
-                        content="",
-                        is_final=True,
-                    ).model_dump_json()
-                )
-            except Exception as exc:  # noqa: BLE001
-                logger.error("Error during DeepSeek streaming: %s", exc)
-                await websocket.send_text(
-                    AssistantChunk(
-                        message_id=message.message_id,
-                        content=(
-                            "An error occurred while generating the answer. "
-                            "Please try again later."
-                        ),
-                        is_final=True,
-                    ).model_dump_json()
-                )
+            if isinstance(message, CancelMessage):
+                await connection.cancel(message.message_id)
+            elif isinstance(message, ResumeMessage):
+                await connection.resume(message)
+            else:
+                await connection.start(message)
     except WebSocketDisconnect:
         logger.info("WebSocket client disconnected")
     except Exception as exc:  # noqa: BLE001
         logger.error("Unexpected WebSocket error: %s", exc)
+        ERRORS.labels("websocket").inc()
         await websocket.close()
-
+    finally:
+        await connection.close()
+        WEBSOCKET_CONNECTIONS.dec()
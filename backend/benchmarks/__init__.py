@@ -0,0 +1 @@
+"""Microbenchmarks for CPU hot paths, with stored baselines."""
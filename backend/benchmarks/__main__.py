@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+"""
+Command-line entry point: ``python -m backend.benchmarks``.
+
+Runs the retrieval microbenchmarks, prints a table and compares against the
+stored baseline. Exits with status 1 when any case is slower (or allocates
+more) than the baseline by more than ``--tolerance``, and with status 2 when
+there is no baseline to compare against. Baselines are only comparable on
+the machine that produced them, so none is committed; create or refresh one
+with ``--update-baseline``.
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from backend.benchmarks.retrieval import BenchmarkResult, run_retrieval_benchmarks
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+EXIT_REGRESSION = 1
+EXIT_NO_BASELINE = 2
+
+
+def compare(
+    results: Dict[str, BenchmarkResult],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """Return a description of every regression beyond ``tolerance``."""
+
+    regressions: List[str] = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        min_ops = reference["ops_per_second"] * (1.0 - tolerance)
+        if result.ops_per_second < min_ops:
+            regressions.append(
+                f"{name}: {result.ops_per_second:.1f} ops/s < "
+                f"{reference['ops_per_second']:.1f} ops/s baseline"
+            )
+        max_alloc = reference["alloc_bytes_per_call"] * (1.0 + tolerance)
+        # Ignore tiny absolute changes in allocation-free cases.
+        if result.alloc_bytes_per_call > max(max_alloc, 1024):
+            regressions.append(
+                f"{name}: {result.alloc_bytes_per_call} B/call > "
+                f"{reference['alloc_bytes_per_call']} B/call baseline"
+            )
+    return regressions
+
+
+def main() -> None:
+    """Run the benchmarks from the command line."""
+
+    parser = argparse.ArgumentParser(description="Retrieval pipeline microbenchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to run each case")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_retrieval_benchmarks(args.sizes, min_time=args.min_time)
+    serialized = {name: result.to_dict() for name, result in results.items()}
+
+    print(f"{'case':<40} {'ops/s':>14} {'alloc B/call':>14}")
+    for name, result in results.items():
+        print(f"{name:<40} {result.ops_per_second:>14.1f} {result.alloc_bytes_per_call:>14}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(serialized, handle, indent=2)
+
+    if args.update_baseline:
+        baseline: Dict[str, Any] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as handle:
+                baseline = json.load(handle)
+        baseline.update(serialized)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(
+            f"\nNo baseline at {args.baseline}; nothing was compared. "
+            "Run with --update-baseline on this machine to create one.",
+            file=sys.stderr,
+        )
+        sys.exit(EXIT_NO_BASELINE)
+
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f"\nWarning: not in the baseline, so not compared: {', '.join(missing)}", file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions beyond tolerance:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(EXIT_REGRESSION)
+    print("\nNo regressions beyond tolerance.")
+
+
+if __name__ == "__main__":
+    main()
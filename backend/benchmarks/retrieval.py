@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+"""
+Retrieval pipeline microbenchmarks over synthetic Q&A corpora.
+
+Every case runs without a database: a :class:`FakeNeo4jClient` serves the
+synthetic corpus through the same methods :class:`RAGService` calls.
+"""
+
+import asyncio
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.services.rag_service import RAGService
+from backend.services.retrieval_executor import search_indexes, search_indexes_batch
+from backend.utils.bm25_index import BM25Index
+from backend.utils.embedding_utils import (
+    embed_text,
+    embed_texts,
+    rank_by_similarity,
+    top_k_by_similarity,
+)
+from backend.utils.topic_graph import TopicGraph
+from backend.utils.vector_index import VectorIndex, format_qa_snippet
+
+
+_TOPICS = (
+    "Linear Algebra",
+    "Calculus",
+    "Machine Learning",
+    "Probability",
+    "Physics",
+    "Chemistry",
+    "Biology",
+    "History",
+)
+_VOCABULARY = (
+    "matrix vector derivative integral limit function gradient model data "
+    "probability variance energy force reaction cell enzyme empire treaty "
+    "equation proof theorem rank eigenvalue series convergence learning "
+    "regression classification entropy momentum velocity atom molecule"
+).split()
+
+# Candidates fetched per request on the Neo4j (non-index) retrieval path.
+CANDIDATE_LIMIT = 200
+# Queries per request in the batch retrieval cases.
+BATCH_QUERIES = 64
+
+
+def make_corpus(size: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Generate ``size`` deterministic topic/question/answer records."""
+
+    rng = random.Random(seed)
+    corpus: List[Dict[str, Any]] = []
+    for i in range(size):
+        question_words = rng.choices(_VOCABULARY, k=8)
+        answer_words = rng.choices(_VOCABULARY, k=40)
+        corpus.append(
+            {
+                "id": f"q{i}",
+                "topic": _TOPICS[i % len(_TOPICS)],
+                "question": "What is " + " ".join(question_words) + "?",
+                "answer": " ".join(answer_words).capitalize() + ".",
+            }
+        )
+    return corpus
+
+
+class FakeNeo4jClient:
+    """In-memory stand-in for :class:`Neo4jClient` serving a fixed corpus."""
+
+    def __init__(self, corpus: List[Dict[str, Any]]) -> None:
+        self._corpus = corpus
+        self.topic_graph: Optional[TopicGraph] = None
+
+    async def get_related_qa(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the first ``limit`` records, like a matching scan."""
+
+        return self._corpus[:limit]
+
+    async def search_fulltext_qa(
+        self,
+        query: str,
+        limit: int = 20,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return the first ``limit`` records, like a full-text hit list."""
+
+        return self._corpus[:limit]
+
+    async def get_topic_neighbourhood_qa(
+        self,
+        query: str,
+        limit: int = 20,
+        seeds: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Return the first ``limit`` records of the first record's topic."""
+
+        topic = self._corpus[0]["topic"] if self._corpus else None
+        return [item for item in self._corpus if item["topic"] == topic][:limit]
+
+    async def get_all_qa(self) -> List[Dict[str, Any]]:
+        """Return the whole corpus."""
+
+        return list(self._corpus)
+
+    async def close(self) -> None:
+        """Nothing to release."""
+
+        return None
+
+
+@dataclass
+class BenchmarkResult:
+    """Throughput and allocation measurements for one case."""
+
+    name: str
+    ops_per_second: float
+    alloc_bytes_per_call: int
+    iterations: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the JSON-serializable form stored in baselines."""
+
+        return {
+            "ops_per_second": self.ops_per_second,
+            "alloc_bytes_per_call": self.alloc_bytes_per_call,
+            "iterations": self.iterations,
+        }
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    min_time: float = 0.2,
+    min_iterations: int = 3,
+    rounds: int = 3,
+) -> BenchmarkResult:
+    """
+    Time ``func`` and measure the peak memory it allocates per call.
+
+    Each of ``rounds`` timing rounds runs without tracing until ``min_time``
+    has elapsed (and at least ``min_iterations`` calls); the best round is
+    reported to damp scheduler noise. Allocations are measured in one
+    separate traced call so tracing overhead does not skew throughput.
+    """
+
+    func()  # warm-up
+    best_rate = 0.0
+    total_iterations = 0
+    for _ in range(rounds):
+        iterations = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while iterations < min_iterations or elapsed < min_time:
+            func()
+            iterations += 1
+            elapsed = time.perf_counter() - started
+        best_rate = max(best_rate, iterations / elapsed)
+        total_iterations += iterations
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name,
+        ops_per_second=best_rate,
+        alloc_bytes_per_call=max(0, peak - baseline),
+        iterations=total_iterations,
+    )
+
+
+def run_retrieval_benchmarks(
+    sizes: List[int],
+    min_time: float = 0.2,
+) -> Dict[str, BenchmarkResult]:
+    """Run every retrieval case for each corpus size."""
+
+    results: Dict[str, BenchmarkResult] = {}
+    loop = asyncio.new_event_loop()
+    query = "What is the derivative of a matrix function?"
+    query_embedding = embed_text(query)
+
+    try:
+        for size in sizes:
+            corpus = make_corpus(size)
+            snippets = [format_qa_snippet(item) for item in corpus]
+            corpus_embeddings = [embed_text(text) for text in snippets]
+            corpus_matrix = embed_texts(snippets)
+            candidates = snippets[:CANDIDATE_LIMIT]
+            batch_queries = [item["question"] for item in corpus[:BATCH_QUERIES]]
+
+            neo4j_rag = RAGService(
+                FakeNeo4jClient(corpus),
+                candidate_limit=CANDIDATE_LIMIT,
+                strategies=("graph",),
+            )
+            index = VectorIndex()
+            index.add(corpus)
+            index_rag = RAGService(FakeNeo4jClient(corpus), vector_index=index, strategies=("index",))
+            bm25 = BM25Index()
+            bm25.build(corpus)
+            hybrid_rag = RAGService(
+                FakeNeo4jClient(corpus),
+                candidate_limit=20,
+                vector_index=index,
+                bm25_index=bm25,
+                strategies=("index",),
+            )
+            topic_graph = TopicGraph.from_records(corpus)
+            parallel_client = FakeNeo4jClient(corpus)
+            parallel_client.topic_graph = topic_graph
+            parallel_rag = RAGService(
+                parallel_client,
+                candidate_limit=20,
+                vector_index=index,
+                bm25_index=bm25,
+            )
+
+            cases: Dict[str, Callable[[], Any]] = {
+                "embed_text": lambda: embed_text(query),
+                "embed_texts[candidates]": lambda: embed_texts(candidates),
+                "rank_by_similarity[corpus]": lambda: rank_by_similarity(
+                    query_embedding, corpus_embeddings
+                ),
+                "top_k_by_similarity[corpus]": lambda: top_k_by_similarity(
+                    query_embedding, corpus_matrix, 5
+                ),
+                "format_snippets[corpus]": lambda: [format_qa_snippet(item) for item in corpus],
+                "build_context[neo4j]": lambda: loop.run_until_complete(
+                    neo4j_rag.build_context(query)
+                ),
+                "build_context[index]": lambda: loop.run_until_complete(
+                    index_rag.build_context(query)
+                ),
+                "bm25_search[corpus]": lambda: bm25.search(query, 20),
+                "build_context[hybrid]": lambda: loop.run_until_complete(
+                    hybrid_rag.build_context(query)
+                ),
+                "topic_graph_neighbourhood[corpus]": lambda: topic_graph.neighbourhood(query, 20),
+                "build_context[parallel]": lambda: loop.run_until_complete(
+                    parallel_rag.build_context(query)
+                ),
+                "search_indexes[batch]": lambda: [
+                    search_indexes(index, bm25, item, 20, 20, 60) for item in batch_queries
+                ],
+                "search_indexes_batch[batch]": lambda: search_indexes_batch(
+                    index, bm25, batch_queries, 20, 20, 60
+                ),
+            }
+            for case, func in cases.items():
+                name = f"{case}@{size}"
+                results[name] = measure(name, func, min_time=min_time)
+    finally:
+        loop.close()
+    return results
@@ -7,7 +7,7 @@ This module centralizes access to environment variables used by the backend.
 """
 
 from functools import lru_cache
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -22,11 +22,95 @@ class Settings(BaseModel):
 
     deepseek_api_key: Optional[str] = os.getenv("DEEPSEEK_API_KEY")
     deepseek_api_base: str = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
+    deepseek_model: str = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+    deepseek_max_connections: int = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "100"))
+    deepseek_max_keepalive_connections: int = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    deepseek_keepalive_expiry: float = float(os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", "30"))
+    deepseek_connect_timeout: float = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+    deepseek_first_byte_timeout: float = float(os.getenv("DEEPSEEK_FIRST_BYTE_TIMEOUT", "30"))
+    deepseek_inter_token_timeout: float = float(os.getenv("DEEPSEEK_INTER_TOKEN_TIMEOUT", "30"))
+    deepseek_max_retries: int = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
+    deepseek_hedge_ms: float = float(os.getenv("DEEPSEEK_HEDGE_MS", "0"))
+    deepseek_http2: bool = os.getenv("DEEPSEEK_HTTP2", "false").lower() == "true"
+    deepseek_warmup: bool = os.getenv("DEEPSEEK_WARMUP", "true").lower() == "true"
+
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    answer_cache_ttl_seconds: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    answer_cache_sqlite_path: Optional[str] = os.getenv("ANSWER_CACHE_SQLITE_PATH") or None
+    answer_cache_sqlite_max_rows: int = int(os.getenv("ANSWER_CACHE_SQLITE_MAX_ROWS", "100000"))
+    answer_cache_sqlite_prune_interval: float = float(os.getenv("ANSWER_CACHE_SQLITE_PRUNE_INTERVAL", "300"))
+    upstream_max_concurrent: int = int(os.getenv("UPSTREAM_MAX_CONCURRENT", "32"))
+    upstream_rate_per_second: float = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "0"))
+    upstream_burst: int = int(os.getenv("UPSTREAM_BURST", "10"))
+    upstream_max_queue: int = int(os.getenv("UPSTREAM_MAX_QUEUE", "256"))
+    stream_coalescing_enabled: bool = os.getenv("STREAM_COALESCING_ENABLED", "true").lower() == "true"
+
+    conversation_memory_enabled: bool = os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true"
+    conversation_max_turns: int = int(os.getenv("CONVERSATION_MAX_TURNS", "20"))
+    conversation_token_budget: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1024"))
+    conversation_max_conversations: int = int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "10000"))
+    conversation_max_total_tokens: int = int(os.getenv("CONVERSATION_MAX_TOTAL_TOKENS", "5000000"))
+    conversation_idle_ttl_seconds: float = float(os.getenv("CONVERSATION_IDLE_TTL_SECONDS", "3600"))
+    conversation_sqlite_path: Optional[str] = os.getenv("CONVERSATION_SQLITE_PATH") or None
+    conversation_sqlite_ttl_seconds: float = float(os.getenv("CONVERSATION_SQLITE_TTL_SECONDS", "604800"))
+    conversation_sqlite_max_rows: int = int(os.getenv("CONVERSATION_SQLITE_MAX_ROWS", "1000000"))
+    conversation_sqlite_prune_interval: float = float(os.getenv("CONVERSATION_SQLITE_PRUNE_INTERVAL", "300"))
+
+    batch_max_questions: int = int(os.getenv("BATCH_MAX_QUESTIONS", "5000"))
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    batch_retrieval_chunk: int = int(os.getenv("BATCH_RETRIEVAL_CHUNK", "256"))
+    batch_max_jobs: int = int(os.getenv("BATCH_MAX_JOBS", "16"))
+    batch_job_ttl_seconds: float = float(os.getenv("BATCH_JOB_TTL_SECONDS", "3600"))
 
     neo4j_uri: Optional[str] = os.getenv("NEO4J_URI")
     neo4j_user: Optional[str] = os.getenv("NEO4J_USER")
     neo4j_password: Optional[str] = os.getenv("NEO4J_PASSWORD")
 
+    neo4j_fulltext_enabled: bool = os.getenv("NEO4J_FULLTEXT_ENABLED", "true").lower() == "true"
+
+    topic_graph_enabled: bool = os.getenv("TOPIC_GRAPH_ENABLED", "true").lower() == "true"
+    topic_graph_probe_interval: float = float(os.getenv("TOPIC_GRAPH_PROBE_INTERVAL", "30"))
+    topic_graph_max_age: float = float(os.getenv("TOPIC_GRAPH_MAX_AGE", "3600"))
+
+    rag_candidate_limit: int = int(os.getenv("RAG_CANDIDATE_LIMIT", "20"))
+    vector_index_enabled: bool = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+    bm25_index_enabled: bool = os.getenv("BM25_INDEX_ENABLED", "true").lower() == "true"
+    rag_rrf_k: int = int(os.getenv("RAG_RRF_K", "60"))
+    rag_context_token_budget: int = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+    rag_max_answer_tokens: int = int(os.getenv("RAG_MAX_ANSWER_TOKENS", "400"))
+    rag_mmr_lambda: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    rag_duplicate_threshold: float = float(os.getenv("RAG_DUPLICATE_THRESHOLD", "0.95"))
+    rag_strategies: List[str] = [
+        name.strip()
+        for name in os.getenv("RAG_STRATEGIES", "index,topics").split(",")
+        if name.strip()
+    ]
+    rag_deadline_ms: float = float(os.getenv("RAG_DEADLINE_MS", "300"))
+    rag_hedge_ms: float = float(os.getenv("RAG_HEDGE_MS", "150"))
+    rag_executor_mode: str = os.getenv("RAG_EXECUTOR_MODE", "thread")
+    rag_executor_workers: int = int(os.getenv("RAG_EXECUTOR_WORKERS", "4"))
+    rag_executor_max_pending: int = int(os.getenv("RAG_EXECUTOR_MAX_PENDING", "64"))
+    rag_executor_inline_threshold: int = int(os.getenv("RAG_EXECUTOR_INLINE_THRESHOLD", "2000"))
+    embedding_store_path: Optional[str] = os.getenv("EMBEDDING_STORE_PATH") or None
+
+    ws_max_concurrent_messages: int = int(os.getenv("WS_MAX_CONCURRENT_MESSAGES", "2"))
+    ws_flush_max_bytes: int = int(os.getenv("WS_FLUSH_MAX_BYTES", "256"))
+    ws_flush_interval_ms: float = float(os.getenv("WS_FLUSH_INTERVAL_MS", "30"))
+    stream_resume_grace_seconds: float = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "60"))
+    stream_replay_max_chars: int = int(os.getenv("STREAM_REPLAY_MAX_CHARS", "32768"))
+    stream_replay_max_total_chars: int = int(os.getenv("STREAM_REPLAY_MAX_TOTAL_CHARS", "8000000"))
+
+    trace_enabled: bool = os.getenv("TRACE_ENABLED", "false").lower() == "true"
+    trace_slow_threshold_ms: float = float(os.getenv("TRACE_SLOW_THRESHOLD_MS", "2000"))
+    trace_file: str = os.getenv("TRACE_FILE", "slow_traces.log")
+    trace_max_bytes: int = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+    trace_backup_count: int = int(os.getenv("TRACE_BACKUP_COUNT", "3"))
+    trace_profile_sample_rate: float = float(os.getenv("TRACE_PROFILE_SAMPLE_RATE", "0"))
+    trace_profile_interval_ms: float = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
+
+    session_secret: Optional[str] = os.getenv("SESSION_SECRET") or None
+
     backend_port: int = int(os.getenv("BACKEND_PORT", "8000"))
     frontend_origin: str = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 
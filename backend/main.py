@@ -5,13 +5,16 @@ FastAPI application entrypoint for the DeepSeek Education Assistant backend.
 """
 
 import logging
+from contextlib import asynccontextmanager
 from logging.config import dictConfig
-from typing import Any
+from typing import Any, AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend.api import dependencies
 from backend.api.rest_routes import router as rest_router
+from backend.api.metrics_routes import router as metrics_router
 from backend.api.websocket_routes import router as websocket_router
 from backend.config import get_settings
 
@@ -41,6 +44,17 @@ def configure_logging() -> None:
     dictConfig(logging_config)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start shared services on startup and release them on shutdown."""
+
+    await dependencies.startup()
+    try:
+        yield
+    finally:
+        await dependencies.shutdown()
+
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application instance."""
 
@@ -50,6 +64,7 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="DeepSeek Education Assistant Backend",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
     # CORS configuration for the Vue frontend.
@@ -63,6 +78,7 @@ def create_app() -> FastAPI:
 
     # Include routers.
     app.include_router(rest_router)
+    app.include_router(metrics_router)
     app.include_router(websocket_router)
 
     return app
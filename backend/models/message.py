@@ -2,7 +2,8 @@ from __future__ import annotations
 
 """Pydantic models for chat messages and WebSocket payloads."""
 
-from typing import Literal, Optional
+import json
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 
@@ -15,16 +16,128 @@ class UserMessage(BaseModel):
     conversation_id: Optional[str] = None
 
 
+class CancelMessage(BaseModel):
+    """Client request to stop generating the answer for a message."""
+
+    type: Literal["cancel"] = "cancel"
+    message_id: str
+
+
+class ResumeMessage(BaseModel):
+    """Client request to reattach to an answer after reconnecting."""
+
+    type: Literal["resume"] = "resume"
+    message_id: str
+    offset: int = 0
+
+
 class AssistantChunk(BaseModel):
-    """Outgoing assistant message chunk sent over WebSocket."""
+    """
+    Outgoing assistant message chunk sent over WebSocket.
+
+    ``offset`` is the position in the answer text just after this chunk's
+    content; clients send the last one back in a ``resume`` message.
+    """
 
     type: Literal["assistant_chunk"] = "assistant_chunk"
     message_id: str
     content: str
     is_final: bool = False
+    offset: Optional[int] = None
+
+
+class ResumeFailed(BaseModel):
+    """Outgoing notice that an answer can no longer be resumed."""
+
+    type: Literal["resume_failed"] = "resume_failed"
+    message_id: str
+    reason: str
+
+
+class SessionInfo(BaseModel):
+    """
+    Outgoing session token, sent first on every connection.
+
+    Clients pass it back as the ``session`` query parameter when they
+    reconnect; conversations and answers are private to their session.
+    """
+
+    type: Literal["session"] = "session"
+    session: str
+
+
+class QueueStatus(BaseModel):
+    """Outgoing notice of a message's position in the upstream wait queue."""
+
+    type: Literal["queue_status"] = "queue_status"
+    message_id: str
+    position: int
+
+
+class BatchAnswerRequest(BaseModel):
+    """Questions submitted to the batch answer endpoints."""
+
+    questions: List[str]
+
+
+class BatchAnswerResult(BaseModel):
+    """
+    Answer to one question of a batch.
+
+    ``index`` is the question's position in the request; ``answer`` is
+    ``None`` and ``error`` set if it could not be answered.
+    """
+
+    index: int
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+
+class BatchJobStatus(BaseModel):
+    """
+    State of a background batch job and a page of its results.
+
+    Results are listed in completion order starting at the requested
+    offset; pass ``next_offset`` back to fetch only newer ones.
+    """
+
+    job_id: str
+    status: Literal["running", "completed", "cancelled", "failed"]
+    total: int
+    completed: int
+    results: List[BatchAnswerResult] = []
+    next_offset: int = 0
 
 
 class HealthResponse(BaseModel):
     """Simple health-check response body."""
 
     status: Literal["ok"] = "ok"
+
+
+def encode_assistant_chunk(
+    message_id: str,
+    content: str,
+    is_final: bool = False,
+    offset: Optional[int] = None,
+) -> str:
+    """
+    Serialize an ``AssistantChunk`` payload without building a model.
+
+    Produces the same compact JSON as ``AssistantChunk(...).model_dump_json()``
+    and is used on the per-token streaming path where model validation would
+    dominate the cost.
+    """
+
+    return (
+        '{"type":"assistant_chunk","message_id":'
+        + json.dumps(message_id, ensure_ascii=False)
+        + ',"content":'
+        + json.dumps(content, ensure_ascii=False)
+        + (',"is_final":true' if is_final else ',"is_final":false')
+        + ',"offset":'
+        + ("null" if offset is None else str(offset))
+        + "}"
+    )
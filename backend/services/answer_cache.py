@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+"""Bounded LRU/TTL cache for completed DeepSeek answers."""
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from backend.utils.metrics import ANSWER_CACHE_ENTRIES, ANSWER_CACHE_HITS, ANSWER_CACHE_MISSES
+
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?？!！.。,，;；:： "
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share a cache key.
+
+    Applies NFKC normalization (full-width to half-width), lowercases,
+    collapses whitespace and strips trailing punctuation.
+    """
+
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+def iter_replay_chunks(answer: str, chunk_size: int = 64) -> Iterator[str]:
+    """Split a cached answer into stream-sized pieces for replay."""
+
+    for start in range(0, len(answer), chunk_size):
+        yield answer[start : start + chunk_size]
+
+
+class AnswerCache:
+    """
+    In-memory LRU cache of completed answers with TTL and optional SQLite tier.
+
+    Keys are derived from the model, system prompt, normalized question and
+    a hash of the retrieved context (see :meth:`make_key`). The memory tier
+    is bounded by ``max_entries``; when ``sqlite_path`` is set, answers are
+    also written to disk so they survive restarts. Disk access runs in a
+    worker thread to keep the event loop free. At most every
+    ``prune_interval`` seconds a write also deletes expired rows and, beyond
+    ``max_disk_entries``, the rows closest to expiry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        sqlite_path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+        prune_interval: float = 300.0,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._max_disk_entries = max_disk_entries
+        self._prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if sqlite_path:
+            try:
+                self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS answer_cache ("
+                    "key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS answer_cache_expires_at ON answer_cache (expires_at)"
+                )
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.error("Failed to open answer cache database %s: %s", sqlite_path, exc)
+                self._db = None
+
+    @staticmethod
+    def make_key(
+        model: str,
+        system_prompt: str,
+        question: str,
+        context: str,
+        history: Sequence[Dict[str, str]] = (),
+    ) -> str:
+        """Build a cache key from the request parameters and conversation history."""
+
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        parts = [model, system_prompt, normalize_question(question), context_hash]
+        if history:
+            transcript = "\x1e".join(f"{item['role']}\x1d{item['content']}" for item in history)
+            parts.append(hashlib.sha256(transcript.encode("utf-8")).hexdigest())
+        material = "\x1f".join(parts)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for ``key`` or ``None`` on a miss."""
+
+        now = time.monotonic()
+        item = self._entries.get(key)
+        if item is not None:
+            expires_at, answer = item
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                ANSWER_CACHE_HITS.inc()
+                return answer
+            del self._entries[key]
+            ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+        if self._db is not None:
+            wall_now = time.time()
+            row = await asyncio.to_thread(self._db_get, key, wall_now)
+            if row is not None:
+                answer, expires_at = row
+                self._remember(key, answer, now + (expires_at - wall_now))
+                ANSWER_CACHE_HITS.inc()
+                return answer
+
+        ANSWER_CACHE_MISSES.inc()
+        return None
+
+    async def set(self, key: str, answer: str) -> None:
+        """Store a completed answer under ``key``."""
+
+        if not answer:
+            return
+        self._remember(key, answer, time.monotonic() + self._ttl_seconds)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, answer, time.time() + self._ttl_seconds)
+
+    def _remember(self, key: str, answer: str, expires_at: float) -> None:
+        """Insert into the memory tier, evicting the least recently used."""
+
+        self._entries[key] = (expires_at, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """Read an unexpired ``(answer, expires_at)`` row from the disk tier."""
+
+        assert self._db is not None
+        with self._db_lock:
+            try:
+                row = self._db.execute(
+                    "SELECT answer, expires_at FROM answer_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= now:
+                    self._db.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+                return row[0], row[1]
+            except sqlite3.Error as exc:
+                logger.warning("Answer cache read failed: %s", exc)
+                return None
+
+    def _db_set(self, key: str, answer: str, expires_at: float) -> None:
+        """Upsert an answer into the disk tier."""
+
+        assert self._db is not None
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answer_cache (key, answer, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, answer, expires_at),
+                )
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.warning("Answer cache write failed: %s", exc)
+                return
+            now = time.monotonic()
+            if now >= self._next_prune:
+                self._next_prune = now + self._prune_interval
+                self._db_prune(time.time())
+
+    def _db_prune(self, now: float) -> None:
+        """Delete expired rows and the rows closest to expiry beyond the row cap."""
+
+        assert self._db is not None
+        try:
+            expired = self._db.execute("DELETE FROM answer_cache WHERE expires_at < ?", (now,)).rowcount
+            overflow = self._db.execute(
+                "DELETE FROM answer_cache WHERE key IN ("
+                "SELECT key FROM answer_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_disk_entries,),
+            ).rowcount
+            self._db.commit()
+        except sqlite3.Error as exc:
+            logger.warning("Answer cache prune failed: %s", exc)
+            return
+        if expired or overflow:
+            logger.info("Pruned %d expired and %d overflow answer cache rows", expired, overflow)
+
+    def close(self) -> None:
+        """Close the on-disk tier, if any."""
+
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+"""Answer generations that outlive their WebSocket and can be resumed."""
+
+import asyncio
+import bisect
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.utils.metrics import ANSWER_STREAM_EVICTIONS, ANSWER_STREAM_REPLAY_CHARS, ANSWER_STREAMS_ACTIVE
+
+
+logger = logging.getLogger(__name__)
+
+SendText = Callable[[str], Awaitable[None]]
+Generator = Callable[["AnswerStream"], Awaitable[None]]
+# Registry key: the owning session and the client's message id.
+StreamKey = Tuple[str, str]
+
+
+class StreamOffsetError(ValueError):
+    """Raised when a resume offset is no longer (or not yet) in the replay buffer."""
+
+
+class AnswerStream:
+    """
+    Replay buffer and subscribers of one answer generation.
+
+    The generation appends text with :meth:`append`; every character gets
+    an absolute offset, starting at 0. Subscribers read from any offset
+    still held in the buffer. Once the buffer exceeds its cap, chunks that
+    every current subscriber has already read are dropped from the front.
+
+    ``owner`` is the session that started the generation and ``question``
+    the text it answers; only the owner can reach the stream.
+    """
+
+    def __init__(
+        self,
+        registry: "AnswerStreamRegistry",
+        message_id: str,
+        owner: str = "",
+        question: str = "",
+    ) -> None:
+        self.message_id = message_id
+        self.owner = owner
+        self.question = question
+        self.task: Optional[asyncio.Task[None]] = None
+        self.done = False
+        self.error: Optional[str] = None
+        self._registry = registry
+        self._chunks: List[str] = []
+        self._starts: List[int] = []
+        self._first = 0
+        self._length = 0
+        self._buffered = 0
+        self._positions: Dict[int, int] = {}
+        self._senders: Dict[int, SendText] = {}
+        self._next_token = 0
+        self._changed = asyncio.Event()
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def key(self) -> StreamKey:
+        """Return the registry key of this stream."""
+
+        return self.owner, self.message_id
+
+    @property
+    def length(self) -> int:
+        """Return the number of characters produced so far."""
+
+        return self._length
+
+    @property
+    def start_offset(self) -> int:
+        """Return the oldest offset still held in the replay buffer."""
+
+        return self._starts[0] if self._chunks else self._length
+
+    @property
+    def buffered(self) -> int:
+        """Return the number of characters held in the replay buffer."""
+
+        return self._buffered
+
+    @property
+    def subscribers(self) -> int:
+        """Return the number of attached subscribers."""
+
+        return len(self._positions)
+
+    def append(self, text: str) -> None:
+        """Add generated text and wake the subscribers."""
+
+        if not text or self.done:
+            return
+        self._chunks.append(text)
+        self._starts.append(self._length)
+        self._length += len(text)
+        self._buffered += len(text)
+        self._registry._resize(self, len(text))
+        self._trim(self._registry.max_stream_chars)
+        self._notify()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """
+        Mark the generation as complete.
+
+        ``error`` is a message for the client when the answer failed; it is
+        kept apart from the answer text so it can go in the final frame.
+        """
+
+        if not self.done:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    async def broadcast(self, frame: str) -> None:
+        """Send a side-channel frame (such as a queue position) to every subscriber."""
+
+        for send_text in list(self._senders.values()):
+            try:
+                await send_text(frame)
+            except Exception as exc:  # noqa: BLE001
+                logger.debug("Dropping frame for a departed subscriber: %s", exc)
+
+    def subscribe(self, send_text: SendText, offset: int = 0) -> "StreamSubscription":
+        """
+        Attach a subscriber that reads from ``offset``.
+
+        Raises :class:`StreamOffsetError` if ``offset`` was already trimmed
+        from the replay buffer or lies beyond the text produced so far.
+        """
+
+        if offset < self.start_offset or offset > self._length:
+            raise StreamOffsetError(
+                f"Offset {offset} outside the replay buffer [{self.start_offset}, {self._length}]"
+            )
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        index = max(bisect.bisect_right(self._starts, offset) - 1, 0)
+        skip = offset - self._starts[index] if self._chunks else 0
+        token = self._next_token
+        self._next_token += 1
+        self._positions[token] = self._first + index
+        self._senders[token] = send_text
+        return StreamSubscription(self, token, skip)
+
+    def _unsubscribe(self, token: int) -> None:
+        """Detach a subscriber and let the registry start the grace period."""
+
+        if self._positions.pop(token, None) is None:
+            return
+        self._senders.pop(token, None)
+        self._trim(self._registry.max_stream_chars)
+        if not self._positions:
+            self._registry._detached(self)
+
+    def _chunk(self, position: int) -> Optional[str]:
+        """Return the chunk at absolute ``position``, or ``None`` if not produced yet."""
+
+        index = position - self._first
+        return self._chunks[index] if 0 <= index < len(self._chunks) else None
+
+    def _trim(self, max_chars: int) -> None:
+        """Drop leading chunks over ``max_chars`` that no subscriber still needs."""
+
+        floor = min(self._positions.values(), default=self._first + len(self._chunks))
+        dropped = 0
+        while self._buffered - dropped > max_chars and self._first < floor:
+            dropped += len(self._chunks[0])
+            del self._chunks[0]
+            del self._starts[0]
+            self._first += 1
+        if dropped:
+            self._buffered -= dropped
+            self._registry._resize(self, -dropped)
+
+    def _release(self) -> None:
+        """Free the replay buffer after the stream left the registry."""
+
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        self._registry._resize(self, -self._buffered)
+        self._first += len(self._chunks)
+        self._chunks = []
+        self._starts = []
+        self._buffered = 0
+        self.finish()
+
+    def _notify(self) -> None:
+        """Wake every subscriber waiting for new text or completion."""
+
+        event = self._changed
+        self._changed = asyncio.Event()
+        event.set()
+
+
+class StreamSubscription:
+    """One reader of an :class:`AnswerStream`; iterate it, then :meth:`close` it."""
+
+    def __init__(self, stream: AnswerStream, token: int, skip: int) -> None:
+        self._stream = stream
+        self._token = token
+        self._skip = skip
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        stream = self._stream
+        while self._token in stream._positions:
+            position = stream._positions[self._token]
+            chunk = stream._chunk(position)
+            if chunk is not None:
+                stream._positions[self._token] = position + 1
+                if self._skip:
+                    chunk, self._skip = chunk[self._skip :], 0
+                if chunk:
+                    yield chunk
+                continue
+            if stream.done:
+                return
+            await stream._changed.wait()
+
+    def close(self) -> None:
+        """Detach from the stream; safe to call more than once."""
+
+        self._stream._unsubscribe(self._token)
+
+
+class AnswerStreamRegistry:
+    """
+    Answer generations keyed by owner and ``message_id``, kept alive across reconnects.
+
+    A generation runs in its own task, independent of the connection that
+    started it. When its last subscriber detaches, the stream is kept for
+    ``grace_period`` seconds (still generating if unfinished) so a
+    reconnecting client can resume it; after that it is cancelled and
+    dropped. A ``grace_period`` of 0 cancels a generation as soon as its
+    client leaves.
+
+    Each replay buffer holds at most ``max_stream_chars`` characters that
+    all subscribers have read. When all buffers together exceed
+    ``max_total_chars``, detached streams are evicted least recently used
+    first.
+
+    Streams are keyed by the owning session and the client's message id,
+    so clients choosing the same ``message_id`` never reach each other's
+    answers.
+    """
+
+    def __init__(
+        self,
+        grace_period: float = 60.0,
+        max_stream_chars: int = 32768,
+        max_total_chars: int = 8_000_000,
+    ) -> None:
+        self.grace_period = grace_period
+        self.max_stream_chars = max_stream_chars
+        self.max_total_chars = max_total_chars
+        self._streams: "OrderedDict[StreamKey, AnswerStream]" = OrderedDict()
+        self._total_chars = 0
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def get(self, owner: str, message_id: str) -> Optional[AnswerStream]:
+        """Return ``owner``'s stream for ``message_id``, marking it recently used."""
+
+        stream = self._streams.get((owner, message_id))
+        if stream is not None:
+            self._streams.move_to_end(stream.key)
+        return stream
+
+    def start(
+        self,
+        owner: str,
+        message_id: str,
+        question: str,
+        generate: Generator,
+    ) -> AnswerStream:
+        """
+        Start ``generate(stream)`` as ``owner``'s stream for ``message_id``.
+
+        A previous stream under the same key is cancelled and replaced. The
+        caller should subscribe right away; until then the stream counts as
+        detached only once its generation finishes.
+        """
+
+        previous = self._streams.pop((owner, message_id), None)
+        if previous is not None:
+            self._evict(previous, "replaced")
+        stream = AnswerStream(self, message_id, owner, question)
+        self._streams[stream.key] = stream
+        stream.task = asyncio.create_task(self._drive(stream, generate))
+        ANSWER_STREAMS_ACTIVE.set(len(self._streams))
+        return stream
+
+    def cancel(self, owner: str, message_id: str) -> bool:
+        """Stop and drop ``owner``'s stream for ``message_id``; return whether one existed."""
+
+        stream = self._streams.pop((owner, message_id), None)
+        if stream is None:
+            return False
+        self._evict(stream, "cancelled")
+        return True
+
+    async def close(self) -> None:
+        """Cancel every generation and drop all streams."""
+
+        streams = list(self._streams.values())
+        self._streams.clear()
+        for stream in streams:
+            self._evict(stream, "shutdown")
+        tasks = [stream.task for stream in streams if stream.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _drive(self, stream: AnswerStream, generate: Generator) -> None:
+        """Run the generation and mark the stream complete however it ends."""
+
+        try:
+            await generate(stream)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Answer generation for %s failed: %s", stream.message_id, exc)
+        finally:
+            stream.finish()
+            if stream.subscribers == 0:
+                self._detached(stream)
+
+    def _detached(self, stream: AnswerStream) -> None:
+        """Start the grace period of a stream that lost its last subscriber."""
+
+        if self._streams.get(stream.key) is not stream:
+            return
+        if self.grace_period <= 0:
+            self._expire(stream)
+            return
+        if stream._expiry is None:
+            loop = asyncio.get_running_loop()
+            stream._expiry = loop.call_later(self.grace_period, self._expire, stream)
+
+    def _expire(self, stream: AnswerStream) -> None:
+        """Drop a stream whose grace period ran out without a new subscriber."""
+
+        stream._expiry = None
+        if stream.subscribers or self._streams.get(stream.key) is not stream:
+            return
+        del self._streams[stream.key]
+        self._evict(stream, "expired")
+
+    def _evict(self, stream: AnswerStream, reason: str) -> None:
+        """Cancel a stream's generation and free its buffer."""
+
+        if stream.task is not None and not stream.task.done():
+            stream.task.cancel()
+        stream._release()
+        ANSWER_STREAM_EVICTIONS.labels(reason).inc()
+        ANSWER_STREAMS_ACTIVE.set(len(self._streams))
+        logger.debug("Answer stream %s dropped (%s)", stream.message_id, reason)
+
+    def _resize(self, stream: AnswerStream, delta: int) -> None:
+        """Track buffered characters and evict detached streams over the cap."""
+
+        self._total_chars += delta
+        ANSWER_STREAM_REPLAY_CHARS.set(self._total_chars)
+        if delta <= 0 or self._total_chars <= self.max_total_chars:
+            return
+        for candidate in list(self._streams.values()):
+            if self._total_chars <= self.max_total_chars:
+                break
+            if candidate.subscribers or candidate is stream:
+                continue
+            del self._streams[candidate.key]
+            self._evict(candidate, "memory")
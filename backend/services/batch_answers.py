@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+"""Bulk question answering without a WebSocket, for offline jobs."""
+
+import asyncio
+import functools
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from backend.models.message import BatchAnswerResult
+from backend.services.answer_cache import AnswerCache, normalize_question
+from backend.services.context_builder import build_user_prompt
+from backend.services.deepseek_service import DeepSeekService
+from backend.services.rag_service import RAGService
+from backend.services.scheduler import SchedulerQueueFullError, UpstreamScheduler
+from backend.utils.metrics import BATCH_JOBS_ACTIVE, BATCH_QUESTIONS, ERRORS
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJobLimitError(RuntimeError):
+    """Raised when a batch job cannot be submitted because too many are held."""
+
+
+class _Answer(NamedTuple):
+    """Outcome of answering one distinct question."""
+
+    answer: Optional[str]
+    cached: bool
+    error: Optional[str]
+
+
+class BatchJob:
+    """Results of a background batch, collected for polling in completion order."""
+
+    def __init__(self, job_id: str, total: int) -> None:
+        self.job_id = job_id
+        self.total = total
+        self.status = "running"
+        self.results: List[BatchAnswerResult] = []
+        self.task: Optional[asyncio.Task[None]] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        """Return ``True`` once the job stopped running."""
+
+        return self.status != "running"
+
+
+class BatchAnswerService:
+    """
+    Answer many questions in one request, streamed or as a polled job.
+
+    Questions that normalize to the same text (see
+    :func:`~backend.services.answer_cache.normalize_question`) are answered
+    once and the result is reported for each of them. Contexts are built
+    ``retrieval_chunk`` distinct questions at a time with
+    :meth:`RAGService.build_contexts`, which searches the index for the
+    whole chunk in one batched pass. At most ``concurrency`` answers of a
+    batch are generated at once; each takes an upstream slot from the
+    shared scheduler under the batch's own key, so a large batch is served
+    round-robin with interactive conversations rather than ahead of them.
+    Results are produced in completion order.
+
+    Background jobs are kept ``job_ttl_seconds`` after they finish; at
+    most ``max_jobs`` are held, dropping the oldest finished job first.
+    """
+
+    def __init__(
+        self,
+        rag_service: RAGService,
+        deepseek_service: DeepSeekService,
+        scheduler: UpstreamScheduler,
+        system_prompt: str,
+        model: str = "deepseek-chat",
+        answer_cache: Optional[AnswerCache] = None,
+        concurrency: int = 8,
+        retrieval_chunk: int = 256,
+        max_jobs: int = 16,
+        job_ttl_seconds: float = 3600.0,
+    ) -> None:
+        self._rag_service = rag_service
+        self._deepseek_service = deepseek_service
+        self._scheduler = scheduler
+        self._system_prompt = system_prompt
+        self._model = model
+        self._answer_cache = answer_cache
+        self._concurrency = max(concurrency, 1)
+        self._retrieval_chunk = max(retrieval_chunk, 1)
+        self._max_jobs = max_jobs
+        self._job_ttl_seconds = job_ttl_seconds
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+
+    async def answer(
+        self,
+        questions: Sequence[str],
+        batch_id: Optional[str] = None,
+    ) -> AsyncIterator[BatchAnswerResult]:
+        """
+        Yield one result per question, in completion order.
+
+        Closing the iterator early cancels the answers still being
+        generated.
+        """
+
+        batch_id = batch_id or uuid.uuid4().hex
+        groups: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            groups.setdefault(normalize_question(question), []).append(index)
+        distinct = [(questions[indices[0]], indices) for indices in groups.values()]
+        if len(distinct) < len(questions):
+            BATCH_QUESTIONS.labels("deduplicated").inc(len(questions) - len(distinct))
+
+        pending: Dict[asyncio.Task[_Answer], List[int]] = {}
+        async with aclosing(self._with_contexts(distinct)) as work:
+            try:
+                while True:
+                    while len(pending) < self._concurrency:
+                        item = await anext(work, None)
+                        if item is None:
+                            break
+                        question, context, indices = item
+                        task = asyncio.create_task(self._answer_one(question, context, f"batch:{batch_id}"))
+                        pending[task] = indices
+                    if not pending:
+                        return
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        indices = pending.pop(task)
+                        outcome = task.result()
+                        for index in indices:
+                            yield BatchAnswerResult(
+                                index=index,
+                                question=questions[index],
+                                answer=outcome.answer,
+                                error=outcome.error,
+                                cached=outcome.cached,
+                            )
+            finally:
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+
+    def submit(self, questions: Sequence[str]) -> BatchJob:
+        """
+        Start answering ``questions`` in a background job and return it.
+
+        Raises :class:`BatchJobLimitError` if ``max_jobs`` jobs are held and
+        none of them has finished.
+        """
+
+        self._expire()
+        if len(self._jobs) >= self._max_jobs:
+            finished = next((job_id for job_id, job in self._jobs.items() if job.done), None)
+            if finished is None:
+                raise BatchJobLimitError(f"{self._max_jobs} batch jobs are already running")
+            del self._jobs[finished]
+        job = BatchJob(uuid.uuid4().hex, len(questions))
+        self._jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run_job(job, list(questions)))
+        job.task.add_done_callback(functools.partial(self._job_done, job))
+        BATCH_JOBS_ACTIVE.inc()
+        return job
+
+    def job(self, job_id: str) -> Optional[BatchJob]:
+        """Return the job ``job_id`` unless it is unknown or expired."""
+
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[BatchJob]:
+        """Stop the job ``job_id``, keeping the results it already has."""
+
+        job = self.job(job_id)
+        if job is not None and job.task is not None and not job.done:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    async def close(self) -> None:
+        """Cancel every running job and drop all jobs."""
+
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.done]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._jobs.clear()
+
+    async def _run_job(self, job: BatchJob, questions: List[str]) -> None:
+        """Collect the results of a background job as they complete."""
+
+        async for result in self.answer(questions, job.job_id):
+            job.results.append(result)
+
+    def _job_done(self, job: BatchJob, task: "asyncio.Task[None]") -> None:
+        """Record how a background job ended."""
+
+        if task.cancelled():
+            job.status = "cancelled"
+        elif task.exception() is not None:
+            logger.error("Batch job %s failed: %s", job.job_id, task.exception())
+            job.status = "failed"
+        else:
+            job.status = "completed"
+        job.finished_at = time.monotonic()
+        BATCH_JOBS_ACTIVE.dec()
+
+    def _expire(self) -> None:
+        """Drop finished jobs older than the TTL."""
+
+        now = time.monotonic()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self._job_ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _with_contexts(
+        self,
+        distinct: List[Tuple[str, List[int]]],
+    ) -> AsyncIterator[Tuple[str, str, List[int]]]:
+        """Yield ``(question, context, indices)``, building contexts a chunk at a time."""
+
+        for start in range(0, len(distinct), self._retrieval_chunk):
+            chunk = distinct[start : start + self._retrieval_chunk]
+            questions = [question for question, _ in chunk]
+            try:
+                contexts = await self._rag_service.build_contexts(questions, concurrency=self._concurrency)
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error while building RAG contexts for a batch: %s", exc)
+                ERRORS.labels("rag").inc()
+                contexts = [""] * len(chunk)
+            for (question, indices), context in zip(chunk, contexts):
+                yield question, context, indices
+
+    async def _answer_one(self, question: str, context: str, scheduler_key: str) -> _Answer:
+        """Answer one question from the cache or DeepSeek, never raising."""
+
+        user_prompt = build_user_prompt(question, context)
+        request_key = AnswerCache.make_key(
+            model=self._model,
+            system_prompt=self._system_prompt,
+            question=question,
+            context=context,
+        )
+        if self._answer_cache is not None:
+            cached_answer = await self._answer_cache.get(request_key)
+            if cached_answer is not None:
+                BATCH_QUESTIONS.labels("cached").inc()
+                return _Answer(cached_answer, True, None)
+
+        try:
+            async with self._scheduler.slot(scheduler_key):
+                answer = "".join(
+                    [
+                        chunk
+                        async for chunk in self._deepseek_service.astream_chat(
+                            system_prompt=self._system_prompt,
+                            user_content=user_prompt,
+                            model=self._model,
+                        )
+                    ]
+                )
+        except SchedulerQueueFullError:
+            ERRORS.labels("admission").inc()
+            BATCH_QUESTIONS.labels("failed").inc()
+            return _Answer(None, False, "The upstream queue is full.")
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Error while answering a batch question: %s", exc)
+            ERRORS.labels("answer").inc()
+            BATCH_QUESTIONS.labels("failed").inc()
+            return _Answer(None, False, "An error occurred while generating the answer.")
+
+        if self._answer_cache is not None:
+            await self._answer_cache.set(request_key, answer)
+        BATCH_QUESTIONS.labels("answered").inc()
+        return _Answer(answer, False, None)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+"""Token-budgeted assembly of RAG context from ranked Q&A entries."""
+
+import logging
+import math
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.utils.metrics import RAG_CONTEXT_TOKENS, RAG_CONTEXT_TOKENS_SAVED
+from backend.utils.vector_index import embed_entries, format_qa_snippet
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_HEADER = (
+    "You are an educational assistant using the following knowledge graph "
+    "entries as context."
+)
+
+_CJK_CHARS = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+# Split after sentence-ending punctuation (CJK punctuation needs no space).
+_SENTENCE_END = re.compile(r"(?<=[。！？；])|(?<=[.!?;])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the number of model tokens in ``text``.
+
+    Counts one token per CJK character and one per four other characters,
+    which errs on the high side for both Chinese and English text.
+    """
+
+    cjk = len(_CJK_CHARS.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def build_user_prompt(question: str, context: str) -> str:
+    """
+    Combine retrieved ``context`` and the user's ``question`` into one message.
+
+    Every answer path uses this template, also when ``context`` is empty, so
+    the prompt sent for a cache key is the same however it was asked.
+    """
+
+    return f"{context}\n\nUser question: {question}"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shorten ``text`` to about ``max_tokens`` at a sentence boundary.
+
+    Whole sentences are kept while they fit; if even the first sentence is
+    too long it is cut at the character level. An ellipsis marks the cut.
+    """
+
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept) + " …"
+    cut = text[: max(max_tokens, 1)]
+    while cut and estimate_tokens(cut) > max_tokens:
+        cut = cut[: len(cut) * 3 // 4]
+    return cut.rstrip() + "…"
+
+
+class ContextResult(NamedTuple):
+    """Assembled context plus token accounting for one request."""
+
+    context: str
+    entries: int
+    tokens: int
+    tokens_saved: int
+
+
+class ContextBuilder:
+    """
+    Select and format ranked Q&A entries within a token budget.
+
+    Entries are chosen greedily by maximal marginal relevance: each step
+    takes the candidate maximizing ``mmr_lambda * relevance - (1 -
+    mmr_lambda) * max_similarity_to_selected``, and candidates whose cosine
+    similarity to an already selected entry reaches ``duplicate_threshold``
+    are dropped outright. Answers are capped at ``max_answer_tokens`` and
+    the last entry is shortened to fit what is left of ``token_budget``.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.95,
+        max_answer_tokens: int = 400,
+        min_entry_tokens: int = 48,
+    ) -> None:
+        self._token_budget = token_budget
+        self._mmr_lambda = mmr_lambda
+        self._duplicate_threshold = duplicate_threshold
+        self._max_answer_tokens = max_answer_tokens
+        self._min_entry_tokens = min_entry_tokens
+
+    def build(
+        self,
+        hits: Sequence[Tuple[Dict[str, Any], float]],
+        max_entries: int,
+        embeddings: Optional[np.ndarray] = None,
+    ) -> ContextResult:
+        """
+        Build the context from ``hits`` (entry, relevance score), best first.
+
+        ``embeddings`` holds one L2-normalized row per hit; when omitted the
+        entries are embedded here. ``tokens_saved`` compares the result with
+        plainly concatenating the top ``max_entries`` hits in full.
+        """
+
+        if not hits:
+            return ContextResult("", 0, 0, 0)
+        entries = [entry for entry, _ in hits]
+        if embeddings is None:
+            embeddings = embed_entries(entries)
+
+        order = self._select(
+            np.asarray([score for _, score in hits], dtype=np.float32),
+            embeddings,
+            max_entries,
+        )
+
+        header_tokens = estimate_tokens(CONTEXT_HEADER)
+        remaining = self._token_budget - header_tokens
+        parts = [CONTEXT_HEADER]
+        for idx in order:
+            label = f"Entry {len(parts)}:\n"
+            entry = entries[idx]
+            overhead = estimate_tokens(label) + estimate_tokens(format_qa_snippet({**entry, "answer": ""}))
+            answer_budget = min(self._max_answer_tokens, remaining - overhead)
+            if answer_budget < self._min_entry_tokens:
+                break
+            answer = truncate_to_tokens(entry.get("answer") or "", answer_budget)
+            block = label + format_qa_snippet({**entry, "answer": answer})
+            parts.append(block)
+            remaining -= estimate_tokens(block)
+
+        context = "\n\n".join(parts)
+        tokens = self._token_budget - remaining
+        full_tokens = header_tokens + sum(
+            estimate_tokens(f"Entry {i}:\n") + estimate_tokens(format_qa_snippet(entry))
+            for i, entry in enumerate(entries[:max_entries], start=1)
+        )
+        saved = max(0, full_tokens - tokens)
+        RAG_CONTEXT_TOKENS.observe(tokens)
+        RAG_CONTEXT_TOKENS_SAVED.inc(saved)
+        logger.debug("Context uses %d tokens for %d entries (%d saved)", tokens, len(parts) - 1, saved)
+        return ContextResult(context, len(parts) - 1, tokens, saved)
+
+    def _select(self, scores: np.ndarray, embeddings: np.ndarray, max_entries: int) -> List[int]:
+        """Return hit positions in MMR order, skipping near-duplicates."""
+
+        top = float(scores.max()) if len(scores) else 0.0
+        relevance = scores / top if top > 0 else np.ones_like(scores)
+        similarity = embeddings @ embeddings.T
+        available = np.ones(len(scores), dtype=bool)
+        max_similarity = np.zeros(len(scores), dtype=np.float32)
+        selected: List[int] = []
+        while len(selected) < max_entries and available.any():
+            mmr = self._mmr_lambda * relevance - (1.0 - self._mmr_lambda) * max_similarity
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            max_similarity = np.maximum(max_similarity, similarity[best])
+            available &= max_similarity < self._duplicate_threshold
+        return selected
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+"""Bounded per-conversation chat history with an optional SQLite tier."""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from backend.services.context_builder import estimate_tokens, truncate_to_tokens
+from backend.utils.metrics import CONVERSATION_EVICTIONS, CONVERSATION_MEMORY_TOKENS, CONVERSATIONS_ACTIVE
+
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_HEADER = "Earlier in this conversation the student asked:"
+# Tokens kept of each question folded into the summary.
+_SUMMARY_LINE_TOKENS = 32
+
+
+class Turn(NamedTuple):
+    """One chat message with its estimated token count."""
+
+    role: str
+    content: str
+    tokens: int
+
+
+class Conversation:
+    """
+    Ring buffer of recent turns plus a short summary of older ones.
+
+    Token counts are kept incrementally: each message is counted once when
+    it is added. Turns pushed out of the buffer, or trimmed to fit the
+    prompt budget, leave their (shortened) question in the summary.
+    """
+
+    def __init__(self, max_turns: int, summary_budget: int) -> None:
+        self._turns: Deque[Turn] = deque()
+        self._max_turns = max_turns
+        self._summary: Deque[Turn] = deque()
+        self._summary_budget = summary_budget
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def append(self, role: str, content: str) -> int:
+        """Add a message and return the change in held tokens."""
+
+        before = self.tokens
+        if len(self._turns) >= self._max_turns:
+            self._drop_oldest()
+        turn = Turn(role, content, estimate_tokens(content))
+        self._turns.append(turn)
+        self.tokens += turn.tokens
+        return self.tokens - before
+
+    def fit(self, budget: int) -> int:
+        """Drop the oldest turns until the history fits ``budget``; return the token change."""
+
+        before = self.tokens
+        while self._turns and self.tokens > budget:
+            self._drop_oldest()
+        return self.tokens - before
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Return the history as chat API messages, oldest first."""
+
+        messages: List[Dict[str, str]] = []
+        if self._summary:
+            lines = [_SUMMARY_HEADER] + [f"- {turn.content}" for turn in self._summary]
+            messages.append({"role": "system", "content": "\n".join(lines)})
+        messages.extend({"role": turn.role, "content": turn.content} for turn in self._turns)
+        return messages
+
+    def _drop_oldest(self) -> None:
+        """Remove the oldest turn, keeping a user question in the summary."""
+
+        turn = self._turns.popleft()
+        self.tokens -= turn.tokens
+        if turn.role != "user" or self._summary_budget <= 0:
+            return
+        line = truncate_to_tokens(turn.content, _SUMMARY_LINE_TOKENS)
+        summarized = Turn("user", line, estimate_tokens(line) + 1)
+        self._summary.append(summarized)
+        self.tokens += summarized.tokens
+        while self._summary and sum(item.tokens for item in self._summary) > self._summary_budget:
+            self.tokens -= self._summary.popleft().tokens
+
+
+class ConversationMemory:
+    """
+    LRU store of :class:`Conversation` histories keyed by ``conversation_id``.
+
+    Each history keeps at most ``max_turns`` messages and is trimmed to
+    ``token_budget`` estimated tokens before it is sent, so the prompt
+    prefix stops growing after a few turns. Answers are shortened to half
+    the budget when stored. Conversations idle for ``idle_ttl_seconds`` are
+    dropped, and the least recently used ones are evicted once more than
+    ``max_conversations`` are held or their tokens exceed
+    ``max_total_tokens``.
+
+    When ``sqlite_path`` is set, messages are also written to disk and an
+    evicted conversation is reloaded from there on its next turn. Only the
+    last ``max_turns`` messages per conversation are kept on disk. At most
+    every ``prune_interval`` seconds a write also deletes conversations
+    without a message in ``disk_ttl_seconds`` and, beyond ``max_disk_rows``,
+    the oldest messages. Disk access runs in a worker thread to keep the
+    event loop free.
+
+    ``conversation_id`` is used as given; callers must scope it to the
+    client (see :func:`~backend.utils.sessions.scoped_key`). Calls for the
+    same id are serialized, so a reload from disk is never applied twice.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 20,
+        token_budget: int = 1024,
+        max_conversations: int = 10000,
+        max_total_tokens: int = 5_000_000,
+        idle_ttl_seconds: float = 3600.0,
+        sqlite_path: Optional[str] = None,
+        disk_ttl_seconds: float = 7 * 24 * 3600.0,
+        max_disk_rows: int = 1_000_000,
+        prune_interval: float = 300.0,
+    ) -> None:
+        self._max_turns = max_turns
+        self._token_budget = token_budget
+        self._max_conversations = max_conversations
+        self._max_total_tokens = max_total_tokens
+        self._idle_ttl_seconds = idle_ttl_seconds
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._total_tokens = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._disk_ttl_seconds = disk_ttl_seconds
+        self._max_disk_rows = max_disk_rows
+        self._prune_interval = prune_interval
+        self._next_prune = 0.0
+        if sqlite_path:
+            try:
+                self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS conversation_turns ("
+                    "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                    "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL, "
+                    "PRIMARY KEY (conversation_id, seq))"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS conversation_turns_created_at "
+                    "ON conversation_turns (created_at)"
+                )
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.error("Failed to open conversation database %s: %s", sqlite_path, exc)
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    async def history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Return the budgeted history of ``conversation_id`` as chat messages."""
+
+        async with self._serialized(conversation_id):
+            conversation = await self._get(conversation_id)
+            return conversation.messages() if conversation is not None else []
+
+    async def append_turn(self, conversation_id: str, question: str, answer: str) -> None:
+        """Record a completed question/answer exchange."""
+
+        async with self._serialized(conversation_id):
+            conversation = await self._get(conversation_id)
+            if conversation is None:
+                conversation = Conversation(self._max_turns, self._token_budget // 4)
+                self._conversations[conversation_id] = conversation
+            answer = truncate_to_tokens(answer, self._token_budget // 2)
+            delta = conversation.append("user", question)
+            delta += conversation.append("assistant", answer)
+            delta += conversation.fit(self._token_budget)
+            conversation.last_used = time.monotonic()
+            self._conversations.move_to_end(conversation_id)
+            self._resize(delta)
+            self._evict()
+            if self._db is not None:
+                await asyncio.to_thread(self._db_append, conversation_id, question, answer)
+
+    @asynccontextmanager
+    async def _serialized(self, conversation_id: str) -> AsyncIterator[None]:
+        """Hold the lock of ``conversation_id``, dropping it once unused."""
+
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._lock_users[conversation_id] = self._lock_users.get(conversation_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            users = self._lock_users[conversation_id] - 1
+            if users:
+                self._lock_users[conversation_id] = users
+            else:
+                del self._lock_users[conversation_id]
+                del self._locks[conversation_id]
+
+    async def _get(self, conversation_id: str) -> Optional[Conversation]:
+        """Return a live conversation, reloading it from disk if needed."""
+
+        conversation = self._conversations.get(conversation_id)
+        if conversation is not None:
+            if time.monotonic() - conversation.last_used <= self._idle_ttl_seconds:
+                conversation.last_used = time.monotonic()
+                self._conversations.move_to_end(conversation_id)
+                return conversation
+            self._drop(conversation_id, "idle")
+
+        if self._db is None:
+            return None
+        rows = await asyncio.to_thread(self._db_load, conversation_id)
+        if not rows:
+            return None
+        conversation = Conversation(self._max_turns, self._token_budget // 4)
+        for role, content in rows:
+            conversation.append(role, content)
+        conversation.fit(self._token_budget)
+        self._conversations[conversation_id] = conversation
+        self._resize(conversation.tokens)
+        self._evict()
+        return self._conversations.get(conversation_id)
+
+    def _evict(self) -> None:
+        """Drop idle and least recently used conversations over the limits."""
+
+        now = time.monotonic()
+        while self._conversations:
+            conversation_id, oldest = next(iter(self._conversations.items()))
+            if now - oldest.last_used > self._idle_ttl_seconds:
+                reason = "idle"
+            elif len(self._conversations) > self._max_conversations:
+                reason = "lru"
+            elif self._total_tokens > self._max_total_tokens and len(self._conversations) > 1:
+                reason = "memory"
+            else:
+                break
+            self._drop(conversation_id, reason)
+
+    def _drop(self, conversation_id: str, reason: str) -> None:
+        """Remove a conversation from memory; its disk copy is kept."""
+
+        conversation = self._conversations.pop(conversation_id)
+        self._resize(-conversation.tokens)
+        CONVERSATION_EVICTIONS.labels(reason).inc()
+
+    def _resize(self, delta: int) -> None:
+        """Track held tokens and update the memory gauges."""
+
+        self._total_tokens += delta
+        CONVERSATION_MEMORY_TOKENS.set(self._total_tokens)
+        CONVERSATIONS_ACTIVE.set(len(self._conversations))
+
+    def _db_load(self, conversation_id: str) -> List[Tuple[str, str]]:
+        """Read the stored messages of a conversation, oldest first."""
+
+        assert self._db is not None
+        with self._db_lock:
+            try:
+                rows = self._db.execute(
+                    "SELECT role, content FROM conversation_turns WHERE conversation_id = ? "
+                    "ORDER BY seq DESC LIMIT ?",
+                    (conversation_id, self._max_turns),
+                ).fetchall()
+            except sqlite3.Error as exc:
+                logger.warning("Conversation read failed: %s", exc)
+                return []
+        return [(role, content) for role, content in reversed(rows)]
+
+    def _db_append(self, conversation_id: str, question: str, answer: str) -> None:
+        """Append one exchange, drop messages beyond ``max_turns`` and prune when due."""
+
+        assert self._db is not None
+        now = time.time()
+        with self._db_lock:
+            try:
+                row = self._db.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM conversation_turns WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()
+                seq = row[0]
+                self._db.executemany(
+                    "INSERT INTO conversation_turns (conversation_id, seq, role, content, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (conversation_id, seq + 1, "user", question, now),
+                        (conversation_id, seq + 2, "assistant", answer, now),
+                    ],
+                )
+                self._db.execute(
+                    "DELETE FROM conversation_turns WHERE conversation_id = ? AND seq <= ?",
+                    (conversation_id, seq + 2 - self._max_turns),
+                )
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.warning("Conversation write failed: %s", exc)
+                return
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self._prune_interval
+                self._db_prune(now)
+
+    def _db_prune(self, now: float) -> None:
+        """Delete idle conversations and the oldest messages beyond the row cap."""
+
+        assert self._db is not None
+        try:
+            idle = self._db.execute(
+                "DELETE FROM conversation_turns WHERE conversation_id IN ("
+                "SELECT conversation_id FROM conversation_turns "
+                "GROUP BY conversation_id HAVING MAX(created_at) < ?)",
+                (now - self._disk_ttl_seconds,),
+            ).rowcount
+            overflow = self._db.execute(
+                "DELETE FROM conversation_turns WHERE rowid IN ("
+                "SELECT rowid FROM conversation_turns ORDER BY created_at DESC, seq DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self._max_disk_rows,),
+            ).rowcount
+            self._db.commit()
+        except sqlite3.Error as exc:
+            logger.warning("Conversation prune failed: %s", exc)
+            return
+        if idle or overflow:
+            logger.info("Pruned %d idle and %d overflow conversation rows", idle, overflow)
+
+    def close(self) -> None:
+        """Close the on-disk tier, if any."""
+
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -3,29 +3,141 @@ from __future__ import annotations
 """Service for interacting with the DeepSeek chat completions API."""
 
 import asyncio
-import json
 import logging
-from typing import AsyncGenerator, AsyncIterator, Optional
+import random
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Sequence, Set
 
 import httpx
 
+from backend.utils.metrics import (
+    DEEPSEEK_FINISH_REASONS,
+    DEEPSEEK_HEDGES,
+    DEEPSEEK_INTER_TOKEN_SECONDS,
+    DEEPSEEK_STREAM_SECONDS,
+    DEEPSEEK_STREAMS_IN_FLIGHT,
+    DEEPSEEK_TOKENS,
+    DEEPSEEK_TTFT_SECONDS,
+    DEEPSEEK_USAGE_TOKENS,
+    ERRORS,
+)
+from backend.utils.sse import SSEDecoder, loads_json
+from backend.utils.tracing import trace_mark, trace_span
+
 
 logger = logging.getLogger(__name__)
 
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class CompletionDelta(NamedTuple):
+    """One parsed streaming chunk of a chat completion."""
+
+    content: Optional[str]
+    finish_reason: Optional[str]
+    usage: Optional[Dict[str, Any]]
+
 
 class DeepSeekService:
-    """Wrapper around an OpenAI-compatible DeepSeek streaming chat endpoint."""
+    """
+    Wrapper around an OpenAI-compatible DeepSeek streaming chat endpoint.
+
+    The pooled ``httpx.AsyncClient`` is created on first use (or by
+    :meth:`warm_up`) and released by :meth:`aclose`; the FastAPI lifespan
+    drives both. Timeouts are split by phase: ``connect_timeout`` for
+    establishing connections, ``first_byte_timeout`` until response headers
+    arrive and ``inter_token_timeout`` between streamed lines. Connection
+    errors and 429/5xx responses are retried with jittered exponential
+    backoff, but only before any output has been produced. With
+    ``hedge_delay`` set, a request without response headers after that
+    many seconds is sent a second time and the first response wins; the
+    other attempt is closed before any output is read, but the upstream
+    may still bill its prompt.
+    """
 
-    def __init__(self, api_key: Optional[str], api_base: str) -> None:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        api_base: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        first_byte_timeout: float = 30.0,
+        inter_token_timeout: float = 30.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        http2: bool = False,
+        hedge_delay: Optional[float] = None,
+    ) -> None:
         self._api_key = api_key
         self._api_base = api_base.rstrip("/")
-        self._client = httpx.AsyncClient(base_url=self._api_base, timeout=30.0)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=max(first_byte_timeout, inter_token_timeout),
+            write=connect_timeout,
+            pool=first_byte_timeout,
+        )
+        self._first_byte_timeout = first_byte_timeout
+        self._inter_token_timeout = inter_token_timeout
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._http2 = http2
+        self._hedge_delay = hedge_delay
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create or return the cached pooled AsyncClient instance."""
+
+        if self._client is None:
+            http2 = self._http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP/2 requested but 'h2' is not installed; using HTTP/1.1")
+                    http2 = False
+            logger.info("Initializing DeepSeek HTTP client (http2=%s)", http2)
+            self._client = httpx.AsyncClient(
+                base_url=self._api_base,
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=http2,
+            )
+        return self._client
+
+    async def warm_up(self) -> None:
+        """
+        Open a pooled connection ahead of the first user request.
+
+        Sends a lightweight ``GET /v1/models`` so DNS, TCP and TLS setup are
+        paid at startup. Failures are logged and otherwise ignored.
+        """
+
+        client = self._get_client()
+        if not self._api_key:
+            return
+        try:
+            response = await client.get(
+                "/v1/models",
+                headers={"Authorization": f"Bearer {self._api_key}"},
+            )
+            logger.info("DeepSeek warm-up finished with status %s", response.status_code)
+        except httpx.HTTPError as exc:
+            logger.warning("DeepSeek warm-up request failed: %s", exc)
 
     async def astream_chat(
         self,
         system_prompt: str,
         user_content: str,
         model: str = "deepseek-chat",
+        history: Sequence[Dict[str, str]] = (),
     ) -> AsyncIterator[str]:
         """
         Stream chat completion tokens from DeepSeek.
@@ -33,6 +145,29 @@ class DeepSeekService:
         Yields partial text chunks as they arrive from the API.
         """
 
+        async with aclosing(
+            self.astream_completion(system_prompt, user_content, model, history)
+        ) as deltas:
+            async for delta in deltas:
+                if delta.content:
+                    yield delta.content
+
+    async def astream_completion(
+        self,
+        system_prompt: str,
+        user_content: str,
+        model: str = "deepseek-chat",
+        history: Sequence[Dict[str, str]] = (),
+    ) -> AsyncIterator[CompletionDelta]:
+        """
+        Stream parsed completion chunks from DeepSeek.
+
+        Unlike :meth:`astream_chat`, this also yields chunks that carry only a
+        ``finish_reason`` or the final ``usage`` statistics. ``history`` holds
+        earlier ``role``/``content`` messages placed between the system
+        prompt and the user message.
+        """
+
         if not self._api_key:
             logger.error("DEEPSEEK_API_KEY is not configured")
             raise RuntimeError("DeepSeek API key is missing")
@@ -45,47 +180,227 @@ class DeepSeekService:
             "model": model,
             "messages": [
                 {"role": "system", "content": system_prompt},
+                *history,
                 {"role": "user", "content": user_content},
             ],
             "stream": True,
         }
 
+        client = self._get_client()
+        request = client.build_request(
+            "POST",
+            "/v1/chat/completions",
+            headers=headers,
+            json=payload,
+        )
+
+        started = time.perf_counter()
+        last_token_at: Optional[float] = None
+        parse_failures = 0
+        DEEPSEEK_STREAMS_IN_FLIGHT.inc()
         try:
-            async with self._client.stream(
-                "POST",
-                "/v1/chat/completions",
-                headers=headers,
-                json=payload,
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue
-                    if line.startswith("data: "):
-                        data_str = line[len("data: ") :].strip()
-                    else:
-                        data_str = line.strip()
-                    if data_str == "[DONE]":
-                        break
+            with trace_span("deepseek.request"):
+                response = await self._send_with_retry(client, request)
+            try:
+                decoder = SSEDecoder()
+                raw_chunks = response.aiter_bytes()
+                finished = False
+                while not finished:
+                    # A fresh timeout per network read keeps the deadline off
+                    # the consumer's time between yields.
                     try:
-                        data = json.loads(data_str)
-                        delta = data["choices"][0]["delta"]
-                        content = delta.get("content")
-                        if content:
-                            yield content
-                    except Exception as exc:  # noqa: BLE001
-                        logger.warning("Failed to parse DeepSeek stream chunk: %s", exc)
-                        continue
+                        async with asyncio.timeout(self._inter_token_timeout):
+                            raw = await raw_chunks.__anext__()
+                        events = decoder.feed(raw)
+                    except StopAsyncIteration:
+                        events = decoder.flush()
+                        finished = True
+                    except TimeoutError as exc:
+                        raise httpx.ReadTimeout(
+                            "No data from DeepSeek within the inter-token timeout",
+                            request=request,
+                        ) from exc
+
+                    for event in events:
+                        if event == b"[DONE]":
+                            finished = True
+                            break
+                        try:
+                            delta = _parse_completion_chunk(event)
+                        except (ValueError, LookupError, TypeError, AttributeError):
+                            parse_failures += 1
+                            continue
+                        if delta.content:
+                            now = time.perf_counter()
+                            if last_token_at is None:
+                                DEEPSEEK_TTFT_SECONDS.observe(now - started)
+                                trace_mark("deepseek.first_token")
+                            else:
+                                DEEPSEEK_INTER_TOKEN_SECONDS.observe(now - last_token_at)
+                            last_token_at = now
+                            DEEPSEEK_TOKENS.inc()
+                        elif delta.finish_reason is None and delta.usage is None:
+                            continue
+                        if delta.finish_reason is not None:
+                            DEEPSEEK_FINISH_REASONS.labels(delta.finish_reason).inc()
+                        if delta.usage is not None:
+                            _record_usage(delta.usage)
+                        yield delta
+            finally:
+                await response.aclose()
+            DEEPSEEK_STREAM_SECONDS.observe(time.perf_counter() - started)
+            trace_mark("deepseek.stream_end")
         except httpx.HTTPError as exc:
             logger.error("Error while calling DeepSeek API: %s", exc)
+            ERRORS.labels("deepseek").inc()
             raise
+        finally:
+            DEEPSEEK_STREAMS_IN_FLIGHT.dec()
+            if parse_failures:
+                logger.warning("Skipped %d unparseable DeepSeek stream events", parse_failures)
+
+    async def _send_with_retry(
+        self,
+        client: httpx.AsyncClient,
+        request: httpx.Request,
+    ) -> httpx.Response:
+        """
+        Send ``request`` in streaming mode, retrying pre-stream failures.
+
+        Only failures where the upstream cannot have started generating are
+        retried: connection errors and 429/5xx status codes. A ``Retry-After``
+        header on 429/503 responses is honoured up to a few seconds.
+        """
+
+        attempt = 0
+        while True:
+            retry_after: Optional[float] = None
+            try:
+                response = await asyncio.wait_for(
+                    self._send_hedged(client, request),
+                    self._first_byte_timeout,
+                )
+            except asyncio.TimeoutError as exc:
+                raise httpx.ReadTimeout(
+                    "No response from DeepSeek within the first-byte timeout",
+                    request=request,
+                ) from exc
+            except (httpx.ConnectError, httpx.ConnectTimeout) as exc:
+                error: httpx.HTTPError = exc
+            else:
+                if response.status_code not in _RETRYABLE_STATUS_CODES:
+                    if response.is_error:
+                        await response.aread()
+                        await response.aclose()
+                    response.raise_for_status()
+                    return response
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                await response.aclose()
+                error = httpx.HTTPStatusError(
+                    f"DeepSeek returned retryable status {response.status_code}",
+                    request=request,
+                    response=response,
+                )
+
+            if attempt >= self._max_retries:
+                raise error
+            delay = self._retry_backoff * (2**attempt) * (0.5 + random.random())
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, 10.0))
+            attempt += 1
+            logger.warning(
+                "DeepSeek request failed before streaming (%s); retry %d/%d in %.2fs",
+                error,
+                attempt,
+                self._max_retries,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def _send_hedged(
+        self,
+        client: httpx.AsyncClient,
+        request: httpx.Request,
+    ) -> httpx.Response:
+        """
+        Send ``request`` in streaming mode, hedged after ``hedge_delay`` seconds.
+
+        The first attempt to return response headers wins and the other is
+        cancelled or closed. An attempt that fails before the hedge starts
+        raises at once, leaving retries to :meth:`_send_with_retry`.
+        """
+
+        if self._hedge_delay is None:
+            return await client.send(request, stream=True)
+
+        attempts: Set[asyncio.Task[httpx.Response]] = {asyncio.create_task(client.send(request, stream=True))}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while attempts:
+                done, attempts = await asyncio.wait(
+                    attempts,
+                    timeout=None if hedged else self._hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedged = True
+                    DEEPSEEK_HEDGES.inc()
+                    trace_mark("deepseek.hedge")
+                    attempts.add(asyncio.create_task(client.send(request, stream=True)))
+                    continue
+                responses = [task.result() for task in done if task.exception() is None]
+                if responses:
+                    for extra in responses[1:]:
+                        await extra.aclose()
+                    return responses[0]
+                error = next(iter(done)).exception()
+        finally:
+            for task in attempts:
+                task.cancel()
+            for result in await asyncio.gather(*attempts, return_exceptions=True):
+                if isinstance(result, httpx.Response):
+                    await result.aclose()
+        assert error is not None
+        raise error
 
     async def aclose(self) -> None:
         """Close the underlying HTTP client."""
 
-        await self._client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric ``Retry-After`` header value in seconds."""
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
 
+def _parse_completion_chunk(payload: bytes) -> CompletionDelta:
+    """Extract content, finish reason and usage from one SSE data payload."""
 
+    data = loads_json(payload)
+    usage = data.get("usage")
+    choices = data.get("choices")
+    if not choices:
+        return CompletionDelta(None, None, usage)
+    choice = choices[0]
+    delta = choice.get("delta")
+    content = delta.get("content") if delta else None
+    return CompletionDelta(content, choice.get("finish_reason"), usage)
 
 
+def _record_usage(usage: Dict[str, Any]) -> None:
+    """Add the prompt and completion token counts from ``usage`` to metrics."""
 
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int):
+            DEEPSEEK_USAGE_TOKENS.labels(kind).inc(tokens)
@@ -2,62 +2,517 @@ from __future__ import annotations
 
 """Retrieval-Augmented Generation (RAG) service."""
 
+import asyncio
+import functools
 import logging
-from typing import List, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
-from backend.utils.embedding_utils import embed_text, rank_by_similarity
+import numpy as np
+
+from backend.services.context_builder import ContextBuilder
+from backend.services.retrieval_executor import (
+    Hits,
+    RetrievalExecutor,
+    rank_candidates,
+    search_indexes,
+    search_indexes_batch,
+)
+from backend.utils.bm25_index import BM25Index, reciprocal_rank_fusion
+from backend.utils.embedding_store import EmbeddingStore
+from backend.utils.metrics import (
+    RAG_BUILD_CONTEXT_SECONDS,
+    RAG_DEADLINE_MISSES,
+    RAG_RANK_SECONDS,
+    RAG_STRATEGY_HEDGES,
+    RAG_STRATEGY_SECONDS,
+    RAG_STRATEGY_TIMEOUTS,
+)
+from backend.utils.tracing import trace_mark, trace_span
 from backend.utils.neo4j_client import Neo4jClient
+from backend.utils.vector_index import VectorIndex, format_qa_snippet
 
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_STRATEGIES = ("index", "graph", "topics")
+# Strategies that may query Neo4j and are worth a hedged second attempt.
+HEDGED_STRATEGIES = ("graph", "topics")
+
+# Ranked hits, best first, and their embedding rows when known.
+Ranked = Tuple[Hits, Optional[np.ndarray]]
+Strategy = Callable[[], Awaitable[Ranked]]
+
+
+def _entry_key(entry: Dict[str, Any]) -> Tuple[Any, Any]:
+    """Identify a Q&A record across retrieval strategies."""
+
+    return entry.get("question"), entry.get("answer")
+
 
 class RAGService:
-    """Service that retrieves and ranks context from Neo4j for a query."""
+    """
+    Service that retrieves and ranks context from Neo4j for a query.
+
+    With a BM25 index attached next to the vector index, retrieval is
+    hybrid: the lexical and embedding rankings are fused with reciprocal
+    rank fusion (constant ``rrf_k``) entirely in memory.
+
+    Embedding and ranking run on the optional :class:`RetrievalExecutor`
+    so large retrievals do not block the event loop; without one they run
+    inline.
+
+    Retrieval strategies (``index``, ``graph``, ``topics``) run
+    concurrently and are bounded by ``deadline`` seconds (``None`` waits
+    for all of them). When ``index`` is enabled but no index is loaded,
+    the ``graph`` strategy stands in for it even if not enabled, so
+    retrieval only queries Neo4j per message when configured to or when
+    it has nothing else. A database strategy still running after
+    ``hedge_delay`` seconds is started a second time and the first attempt
+    to succeed is used (``None`` disables hedging).
+    """
 
-    def __init__(self, neo4j_client: Optional[Neo4jClient]) -> None:
+    def __init__(
+        self,
+        neo4j_client: Optional[Neo4jClient],
+        candidate_limit: int = 20,
+        vector_index: Optional[VectorIndex] = None,
+        use_fulltext: bool = True,
+        embedding_store: Optional[EmbeddingStore] = None,
+        bm25_index: Optional[BM25Index] = None,
+        rrf_k: int = 60,
+        executor: Optional[RetrievalExecutor] = None,
+        context_builder: Optional[ContextBuilder] = None,
+        strategies: Sequence[str] = RETRIEVAL_STRATEGIES,
+        deadline: Optional[float] = 0.3,
+        hedge_delay: Optional[float] = None,
+    ) -> None:
+        unknown = set(strategies) - set(RETRIEVAL_STRATEGIES)
+        if unknown:
+            raise ValueError(f"Unknown retrieval strategies {sorted(unknown)}; expected {RETRIEVAL_STRATEGIES}")
         self._neo4j_client = neo4j_client
+        self._candidate_limit = candidate_limit
+        self._vector_index = vector_index
+        self._use_fulltext = use_fulltext
+        self._embedding_store = embedding_store
+        self._bm25_index = bm25_index
+        self._rrf_k = rrf_k
+        self._executor = executor
+        self._context_builder = context_builder or ContextBuilder()
+        self._strategy_names = tuple(name for name in RETRIEVAL_STRATEGIES if name in strategies)
+        self._deadline = deadline
+        self._hedge_delay = hedge_delay
+        self._index_lock = asyncio.Lock()
+
+    @property
+    def vector_index(self) -> Optional[VectorIndex]:
+        """Return the in-process vector index, if one is attached."""
+
+        return self._vector_index
+
+    async def load_index(self) -> int:
+        """
+        (Re)load the attached vector index from Neo4j.
+
+        Only entries that are new or edited since the last load are
+        embedded: with an embedding store attached the index is served from
+        the memory-mapped store, otherwise a copy of the current index is
+        synced with :meth:`VectorIndex.sync` off the event loop. The BM25
+        index, if attached, is rebuilt from the same entries. Both are
+        swapped in whole, so searches in flight finish on the previous
+        indexes; if the graph cannot be read they are kept as they are, while
+        an emptied graph empties them. Called again whenever the graph
+        changes (see :meth:`Neo4jClient.add_graph_change_listener`). Returns
+        the number of indexed entries, or 0 if no index is attached.
+        """
+
+        if self._vector_index is None:
+            if self._executor is not None:
+                self._executor.load_indexes(None, with_bm25=False)
+            return 0
+        async with self._index_lock:
+            if self._embedding_store is not None:
+                vector_index = VectorIndex()
+                count = await vector_index.load_from_store(self._embedding_store, self._neo4j_client)
+            else:
+                entries = await self._neo4j_client.get_all_qa() if self._neo4j_client is not None else []
+                if entries is None:
+                    return len(self._vector_index)
+                vector_index = self._vector_index.copy()
+                embedded = await asyncio.to_thread(vector_index.sync, entries)
+                count = len(vector_index)
+                logger.info("Vector index synced with %d entries (%d embedded)", count, embedded)
+            bm25_index = None
+            if self._bm25_index is not None:
+                bm25_index = await asyncio.to_thread(self._bm25_index.rebuilt, list(vector_index.entries))
+            self._vector_index = vector_index
+            if bm25_index is not None:
+                self._bm25_index = bm25_index
+            if self._executor is not None:
+                self._executor.load_indexes(self._embedding_store, with_bm25=bm25_index is not None)
+        return count
 
     async def build_context(self, query: str, top_k: int = 5) -> str:
         """
         Build a compact textual context for the given query.
 
-        If Neo4j is not configured or no candidates are found, a fallback
-        context string is returned instead.
+        The configured retrieval strategies run concurrently: the in-process
+        index (when populated), the full-text graph query and the topic
+        neighbourhood expansion. Whatever they returned by the retrieval
+        deadline is fused by reciprocal rank; strategies still running are
+        cancelled, so a slow graph yields a partial context, not an error.
+
+        Up to ``top_k`` entries are chosen from the fused pool by the
+        context builder, which drops near-duplicates and keeps the context
+        within its token budget. If Neo4j is not configured or nothing is
+        found, a fallback context string is returned instead.
         """
 
-        if self._neo4j_client is None:
+        with RAG_BUILD_CONTEXT_SECONDS.time(), trace_span("rag.build_context"):
+            return await self._build_context(query, top_k)
+
+    async def build_contexts(
+        self,
+        queries: Sequence[str],
+        top_k: int = 5,
+        concurrency: int = 16,
+    ) -> List[str]:
+        """
+        Build the contexts of many queries, in order; see :meth:`build_context`.
+
+        The in-process index is searched for all queries in one batched
+        job, scoring them with matrix products instead of one search per
+        query. The graph strategies still run per query, for at most
+        ``concurrency`` queries at a time.
+        """
+
+        if not queries:
+            return []
+        pool_size = max(top_k, self._candidate_limit)
+        index_results: List[Optional[Ranked]] = [None] * len(queries)
+        vector_index = self._vector_index
+        if "index" in self._strategy_names and vector_index is not None and len(vector_index) > 0:
+            hybrid = self._bm25_index is not None and len(self._bm25_index) > 0
+            with RAG_RANK_SECONDS.time(), trace_span(
+                "rag.rank",
+                source="hybrid" if hybrid else "index",
+                queries=len(queries),
+            ):
+                batches = await self._search_index_batch(vector_index, queries, pool_size)
+            index_results = [
+                (hits, vector_index.embeddings_for([entry["id"] for entry, _ in hits]))
+                for hits in batches
+            ]
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def build(query: str, index_ranked: Optional[Ranked]) -> str:
+            async with slots:
+                with RAG_BUILD_CONTEXT_SECONDS.time():
+                    return await self._build_context(query, top_k, index_ranked)
+
+        return list(await asyncio.gather(*(build(query, ranked) for query, ranked in zip(queries, index_results))))
+
+    async def _build_context(self, query: str, top_k: int, index_ranked: Optional[Ranked] = None) -> str:
+        """
+        Retrieve, rank and format context; see :meth:`build_context`.
+
+        ``index_ranked`` is a precomputed index ranking for ``query``; when
+        given, the index strategy is not run again.
+        """
+
+        pool_size = max(top_k, self._candidate_limit)
+        strategies = self._strategies(query, pool_size, with_index=index_ranked is None)
+        if not strategies and index_ranked is None:
             logger.warning("Neo4j is not configured; using empty RAG context")
             return "No knowledge graph context is available."
 
-        query_embedding = embed_text(query)
-        candidates = await self._neo4j_client.get_related_qa(query=query, limit=20)
+        results, timed_out = await self._run_strategies(strategies) if strategies else ({}, [])
+        if index_ranked is not None:
+            results["index"] = index_ranked
+        if not results and timed_out:
+            logger.warning("Retrieval deadline missed by every strategy: %s", ", ".join(timed_out))
+            RAG_DEADLINE_MISSES.inc()
+            trace_mark("rag.deadline_miss")
+            return "The knowledge graph did not respond in time; no context is available."
+        hits, embeddings = self._merge(results, pool_size)
+        if not hits:
+            logger.info("No retrieval candidates found for query")
+            return "No directly related entries were found in the knowledge graph."
+        return self._assemble(hits, top_k, embeddings)
+
+    def _strategies(self, query: str, pool_size: int, with_index: bool = True) -> Dict[str, Strategy]:
+        """Return factories for the enabled strategies that can run."""
+
+        strategies: Dict[str, Strategy] = {}
+        index_loaded = self._vector_index is not None and len(self._vector_index) > 0
+        if with_index and "index" in self._strategy_names and index_loaded:
+            strategies["index"] = functools.partial(self._index_strategy, self._vector_index, query, pool_size)
+        graph_fallback = with_index and "index" in self._strategy_names and not index_loaded
+        if self._neo4j_client is not None:
+            if "graph" in self._strategy_names or graph_fallback:
+                strategies["graph"] = functools.partial(self._graph_strategy, self._neo4j_client, query)
+            if "topics" in self._strategy_names:
+                strategies["topics"] = functools.partial(self._topic_strategy, self._neo4j_client, query)
+        return strategies
+
+    async def _run_strategies(self, strategies: Dict[str, Strategy]) -> Tuple[Dict[str, Ranked], List[str]]:
+        """
+        Run strategies concurrently until all finish or the deadline passes.
+
+        Returns the rankings of the strategies that succeeded and the names
+        of those abandoned at the deadline. Strategies that fail are logged
+        and left out; strategies still running at the deadline, or when
+        the caller is cancelled, are cancelled and awaited.
+        """
+
+        tasks = {
+            asyncio.create_task(self._timed_strategy(name, strategy)): name
+            for name, strategy in strategies.items()
+        }
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self._deadline)
+        finally:
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+        timed_out = sorted(tasks[task] for task in pending)
+        for name in timed_out:
+            RAG_STRATEGY_TIMEOUTS.labels(name).inc()
+        if timed_out:
+            logger.warning("Retrieval deadline reached; abandoned strategies: %s", ", ".join(timed_out))
+            trace_mark("rag.deadline", abandoned=",".join(timed_out))
+
+        results: Dict[str, Ranked] = {}
+        for task in done:
+            ranked = task.result()
+            if ranked is not None:
+                results[tasks[task]] = ranked
+        return results, timed_out
+
+    async def _timed_strategy(self, name: str, strategy: Strategy) -> Optional[Ranked]:
+        """Run one strategy, recording its latency and swallowing its errors."""
+
+        started = time.perf_counter()
+        try:
+            with trace_span(f"rag.strategy.{name}"):
+                if self._hedge_delay is not None and name in HEDGED_STRATEGIES:
+                    ranked = await self._hedged(name, strategy)
+                else:
+                    ranked = await strategy()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Retrieval strategy %s failed: %s", name, exc)
+            return None
+        RAG_STRATEGY_SECONDS.labels(name).observe(time.perf_counter() - started)
+        return ranked
+
+    async def _hedged(self, name: str, strategy: Strategy) -> Ranked:
+        """
+        Run ``strategy``, starting a second attempt if the first is slow.
+
+        The second attempt starts after ``hedge_delay`` seconds; the first
+        attempt to succeed wins and the other is cancelled. Raises the last
+        error if every attempt fails; an attempt cancelled from elsewhere
+        counts as failed.
+        """
+
+        attempts: Set[asyncio.Task[Ranked]] = {asyncio.create_task(strategy())}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=None if hedged else self._hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    attempts.discard(task)
+                    if task.cancelled():
+                        error = RuntimeError(f"{name} retrieval attempt was cancelled")
+                    elif task.exception() is not None:
+                        error = task.exception()
+                    else:
+                        return task.result()
+                if not hedged and not done:
+                    # The first attempt is still running: hedge it.
+                    hedged = True
+                    RAG_STRATEGY_HEDGES.labels(name).inc()
+                    attempts.add(asyncio.create_task(strategy()))
+                elif not attempts:
+                    assert error is not None
+                    raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+
+    def _merge(self, results: Dict[str, Ranked], pool_size: int) -> Ranked:
+        """
+        Fuse the strategy rankings into one pool with aligned embeddings.
+
+        Entries are matched across strategies by question and answer text,
+        since graph records carry no index id. Returns ``None`` embeddings
+        if any pooled entry has none, letting the context builder embed.
+        """
+
+        rankings = [results[name] for name in self._strategy_names if name in results]
+        if not rankings:
+            return [], None
+        if len(rankings) == 1:
+            return rankings[0]
+
+        vectors: Dict[Tuple[Any, Any], np.ndarray] = {}
+        for hits, embeddings in rankings:
+            if embeddings is not None:
+                for (entry, _), vector in zip(hits, embeddings):
+                    vectors.setdefault(_entry_key(entry), vector)
+        fused = reciprocal_rank_fusion(
+            [hits for hits, _ in rankings],
+            pool_size,
+            k=self._rrf_k,
+            key=_entry_key,
+        )
+        keys = [_entry_key(entry) for entry, _ in fused]
+        if not fused or any(key not in vectors for key in keys):
+            return fused, None
+        return fused, np.stack([vectors[key] for key in keys])
+
+    async def _index_strategy(self, vector_index: VectorIndex, query: str, pool_size: int) -> Ranked:
+        """Search the in-process index, fused with BM25 if attached."""
+
+        hybrid = self._bm25_index is not None and len(self._bm25_index) > 0
+        with RAG_RANK_SECONDS.time(), trace_span("rag.rank", source="hybrid" if hybrid else "index"):
+            hits = await self._search_index(vector_index, query, pool_size)
+        return hits, vector_index.embeddings_for([entry["id"] for entry, _ in hits])
+
+    async def _graph_strategy(self, neo4j_client: Neo4jClient, query: str) -> Ranked:
+        """Fetch graph candidates by full-text (or CONTAINS) search and rank them."""
+
+        return await self._rank(query, await self._fetch_candidates(neo4j_client, query))
+
+    async def _topic_strategy(self, neo4j_client: Neo4jClient, query: str) -> Ranked:
+        """
+        Expand the topics around the query and rank their questions.
+
+        Served from the client's topic graph snapshot when one is loaded,
+        so the database is only queried before the first snapshot.
+        """
+
+        topic_graph = neo4j_client.topic_graph
+        if topic_graph is not None:
+            candidates = topic_graph.neighbourhood(query, limit=self._candidate_limit)
+        else:
+            candidates = await neo4j_client.get_topic_neighbourhood_qa(
+                query=query,
+                limit=self._candidate_limit,
+            )
+        return await self._rank(query, candidates)
+
+    async def _rank(self, query: str, candidates: List[Dict[str, Any]]) -> Ranked:
+        """Rank graph candidates by embedding similarity to ``query``."""
 
         if not candidates:
-            logger.info("No Neo4j candidates found for query")
-            return "No directly related entries were found in the knowledge graph."
+            return [], None
+        candidate_texts: List[str] = [format_qa_snippet(item) for item in candidates]
+        with RAG_RANK_SECONDS.time(), trace_span("rag.rank", candidates=len(candidate_texts)):
+            if self._executor is not None:
+                rankings, matrix = await self._executor.run(
+                    len(candidate_texts),
+                    rank_candidates,
+                    query,
+                    candidate_texts,
+                    len(candidate_texts),
+                )
+            else:
+                rankings, matrix = rank_candidates(query, candidate_texts, len(candidate_texts))
+
+        hits = [(candidates[idx], score) for idx, score in rankings]
+        return hits, matrix[[idx for idx, _ in rankings]]
 
-        candidate_texts: List[str] = []
-        for item in candidates:
-            topic = item.get("topic") or "General"
-            question = item.get("question") or ""
-            answer = item.get("answer") or ""
-            snippet = f"Topic: {topic}\nQuestion: {question}\nAnswer: {answer}"
-            candidate_texts.append(snippet)
+    def _assemble(
+        self,
+        hits: Hits,
+        max_entries: int,
+        embeddings: Optional[np.ndarray],
+    ) -> str:
+        """Build the budgeted context from ranked hits and record its size."""
 
-        candidate_embeddings = [embed_text(text) for text in candidate_texts]
-        rankings = rank_by_similarity(query_embedding, candidate_embeddings)
-        top_indices = [idx for idx, _ in rankings[:top_k]]
+        result = self._context_builder.build(hits, max_entries, embeddings)
+        trace_mark(
+            "rag.context",
+            entries=result.entries,
+            tokens=result.tokens,
+            tokens_saved=result.tokens_saved,
+        )
+        return result.context
 
-        selected_snippets = [candidate_texts[idx] for idx in top_indices]
+    async def _search_index(
+        self,
+        vector_index: VectorIndex,
+        query: str,
+        top_k: int,
+    ) -> Hits:
+        """Rank indexed entries by embedding similarity, fused with BM25 if attached."""
 
-        context = "You are an educational assistant using the following knowledge graph entries as context.\n\n"
-        for i, snippet in enumerate(selected_snippets, start=1):
-            context += f"Entry {i}:\n{snippet}\n\n"
+        depth = max(top_k, self._candidate_limit)
+        if self._executor is not None:
+            return await self._executor.search(
+                vector_index,
+                self._bm25_index,
+                query,
+                top_k,
+                depth,
+                self._rrf_k,
+            )
+        return search_indexes(vector_index, self._bm25_index, query, top_k, depth, self._rrf_k)
 
-        return context.strip()
+    async def _search_index_batch(
+        self,
+        vector_index: VectorIndex,
+        queries: Sequence[str],
+        top_k: int,
+    ) -> List[Hits]:
+        """Rank indexed entries for many queries; see :meth:`_search_index`."""
 
+        depth = max(top_k, self._candidate_limit)
+        if self._executor is not None:
+            return await self._executor.search_batch(
+                vector_index,
+                self._bm25_index,
+                queries,
+                top_k,
+                depth,
+                self._rrf_k,
+            )
+        return search_indexes_batch(vector_index, self._bm25_index, queries, top_k, depth, self._rrf_k)
 
+    async def _fetch_candidates(
+        self,
+        neo4j_client: Neo4jClient,
+        query: str,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch candidate Q&A records, preferring the full-text indexes.
 
+        The CONTAINS scan is only used when full-text search is disabled or
+        the indexes cannot be queried.
+        """
 
+        if self._use_fulltext:
+            candidates = await neo4j_client.search_fulltext_qa(
+                query=query,
+                limit=self._candidate_limit,
+            )
+            if candidates is not None:
+                return candidates
+            logger.warning("Full-text search unavailable; falling back to CONTAINS scan")
 
+        return await neo4j_client.get_related_qa(
+            query=query,
+            limit=self._candidate_limit,
+        )
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+"""
+Execution of CPU-bound retrieval work away from the event loop.
+
+Embedding, scoring and ranking are plain NumPy/Python computations; running
+them on the event loop stalls token forwarding for every other connection.
+:class:`RetrievalExecutor` runs them inline, in a thread pool (NumPy releases
+the GIL for the heavy array operations) or in a process pool whose workers
+map the retrieval indexes from the embedding store.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from backend.utils.bm25_index import BM25Index, reciprocal_rank_fusion
+from backend.utils.embedding_store import EmbeddingStore
+from backend.utils.embedding_utils import embed_text, embed_texts, top_k_by_similarity
+from backend.utils.metrics import RAG_EXECUTOR_PENDING
+from backend.utils.vector_index import VectorIndex
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+Hits = List[Tuple[Dict[str, Any], float]]
+
+
+def search_indexes(
+    vector_index: VectorIndex,
+    bm25_index: Optional[BM25Index],
+    query: str,
+    top_k: int,
+    depth: int,
+    rrf_k: int,
+) -> Hits:
+    """
+    Rank indexed entries for ``query``.
+
+    Uses embedding similarity alone, or fuses it with BM25 by reciprocal
+    rank (both rankings ``depth`` deep) when a populated BM25 index is given.
+    """
+
+    query_embedding = embed_text(query)
+    if bm25_index is None or len(bm25_index) == 0:
+        return vector_index.search(query_embedding, top_k)
+    return reciprocal_rank_fusion(
+        [
+            vector_index.search(query_embedding, depth),
+            bm25_index.search(query, depth),
+        ],
+        top_k,
+        k=rrf_k,
+    )
+
+
+def search_indexes_batch(
+    vector_index: VectorIndex,
+    bm25_index: Optional[BM25Index],
+    queries: Sequence[str],
+    top_k: int,
+    depth: int,
+    rrf_k: int,
+) -> List[Hits]:
+    """
+    Rank indexed entries for many queries at once.
+
+    The batched form of :func:`search_indexes`: all queries are embedded
+    together and scored against the index with matrix products; BM25
+    rankings, if any, are fused per query.
+    """
+
+    query_matrix = embed_texts(queries)
+    if bm25_index is None or len(bm25_index) == 0:
+        return vector_index.search_many(query_matrix, top_k)
+    return [
+        reciprocal_rank_fusion(
+            [dense, bm25_index.search(query, depth)],
+            top_k,
+            k=rrf_k,
+        )
+        for query, dense in zip(queries, vector_index.search_many(query_matrix, depth))
+    ]
+
+
+def rank_candidates(
+    query: str,
+    candidate_texts: Sequence[str],
+    top_k: int,
+) -> Tuple[List[Tuple[int, float]], np.ndarray]:
+    """
+    Rank candidate texts against ``query``.
+
+    Returns the ``top_k`` ``(position, score)`` pairs, best first, and the
+    candidate embedding matrix.
+    """
+
+    matrix = embed_texts(candidate_texts)
+    return top_k_by_similarity(embed_text(query), matrix, top_k), matrix
+
+
+# Per-process indexes of process-pool workers, set by _init_worker.
+_worker_vector_index: Optional[VectorIndex] = None
+_worker_bm25_index: Optional[BM25Index] = None
+
+
+def _init_worker(store_path: str, with_bm25: bool) -> None:
+    """Build the worker's indexes from the memory-mapped embedding store."""
+
+    global _worker_vector_index, _worker_bm25_index
+
+    store = EmbeddingStore(store_path)
+    store.open()
+    index = VectorIndex()
+    index.attach_store(store)
+    _worker_vector_index = index
+    _worker_bm25_index = None
+    if with_bm25:
+        _worker_bm25_index = BM25Index()
+        _worker_bm25_index.build(index.entries)
+
+
+def _search_worker_indexes(query: str, top_k: int, depth: int, rrf_k: int) -> Hits:
+    """Run :func:`search_indexes` against the worker's preloaded indexes."""
+
+    if _worker_vector_index is None:
+        return []
+    return search_indexes(_worker_vector_index, _worker_bm25_index, query, top_k, depth, rrf_k)
+
+
+def _search_worker_indexes_batch(
+    queries: Sequence[str],
+    top_k: int,
+    depth: int,
+    rrf_k: int,
+) -> List[Hits]:
+    """Run :func:`search_indexes_batch` against the worker's preloaded indexes."""
+
+    if _worker_vector_index is None:
+        return [[] for _ in queries]
+    return search_indexes_batch(_worker_vector_index, _worker_bm25_index, queries, top_k, depth, rrf_k)
+
+
+class RetrievalExecutor:
+    """
+    Run retrieval work inline, on a thread pool or on a process pool.
+
+    Jobs whose ``cost`` (number of rows to score) is below
+    ``inline_threshold`` run inline, since handing them off would cost more
+    than it saves. At most ``max_pending`` jobs are queued or running at
+    once; further callers wait on the event loop until a slot frees up.
+
+    In ``process`` mode each worker holds its own indexes, mapped by
+    :meth:`load_indexes` from the embedding store so workers share its
+    pages. Without a store, and for searches that arrive before the workers
+    hold indexes, searches run on the event loop's default thread pool
+    instead.
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 4,
+        max_pending: int = 64,
+        inline_threshold: int = 2000,
+    ) -> None:
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown retrieval executor mode {mode!r}; expected one of {EXECUTOR_MODES}")
+        self._mode = mode
+        self._max_workers = max_workers
+        self._inline_threshold = inline_threshold
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pool: Optional[Executor] = None
+        self._loaded: Optional[Tuple[str, int, int, bool]] = None
+        if mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+
+    @property
+    def mode(self) -> str:
+        """Return the configured execution mode."""
+
+        return self._mode
+
+    @property
+    def has_worker_indexes(self) -> bool:
+        """Return ``True`` if process workers hold preloaded indexes."""
+
+        return self._mode == "process" and self._pool is not None
+
+    def load_indexes(self, store: Optional[EmbeddingStore], with_bm25: bool) -> None:
+        """
+        (Re)start the process pool with workers mapping the embedding store.
+
+        Does nothing outside ``process`` mode, or if the store's generation
+        and row count are those the current workers mapped. Without a store
+        the pool is stopped, since shipping the corpus to every worker on
+        each refresh would cost more than searching on threads.
+
+        Jobs already submitted to the previous pool finish there, so both
+        pools can run at once until they drain; together they never hold
+        more than ``max_pending`` jobs.
+        """
+
+        if self._mode != "process":
+            return
+        if store is None:
+            logger.warning("Retrieval process mode needs an embedding store; searching on threads")
+            self.shutdown()
+            return
+        loaded = (store.path, store.generation, len(store), with_bm25)
+        if loaded == self._loaded:
+            return
+        previous = self._pool
+        self._pool = ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            initializer=_init_worker,
+            initargs=(store.path, with_bm25),
+        )
+        self._loaded = loaded
+        if previous is not None:
+            previous.shutdown(wait=False)
+        logger.info("Retrieval process pool started with %d workers", self._max_workers)
+
+    async def run(self, cost: int, func: Callable[..., T], *args: Any) -> T:
+        """Run ``func(*args)`` inline or in the pool, depending on ``cost``."""
+
+        if self._pool is None or cost < self._inline_threshold:
+            return func(*args)
+        return await self._offload(self._pool, func, *args)
+
+    async def _offload(self, pool: Optional[Executor], func: Callable[..., T], *args: Any) -> T:
+        """Run ``func(*args)`` on ``pool`` (``None``: the default thread pool) under a slot."""
+
+        async with self._slots:
+            RAG_EXECUTOR_PENDING.inc()
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(pool, functools.partial(func, *args))
+            finally:
+                RAG_EXECUTOR_PENDING.dec()
+
+    async def search(
+        self,
+        vector_index: VectorIndex,
+        bm25_index: Optional[BM25Index],
+        query: str,
+        top_k: int,
+        depth: int,
+        rrf_k: int,
+    ) -> Hits:
+        """Search the indexes, on the process workers' copies when available."""
+
+        cost = len(vector_index)
+        if self.has_worker_indexes and cost >= self._inline_threshold:
+            return await self.run(cost, _search_worker_indexes, query, top_k, depth, rrf_k)
+        if self._mode == "process":
+            if cost < self._inline_threshold:
+                return search_indexes(vector_index, bm25_index, query, top_k, depth, rrf_k)
+            return await self._offload(None, search_indexes, vector_index, bm25_index, query, top_k, depth, rrf_k)
+        return await self.run(
+            cost,
+            search_indexes,
+            vector_index,
+            bm25_index,
+            query,
+            top_k,
+            depth,
+            rrf_k,
+        )
+
+    async def search_batch(
+        self,
+        vector_index: VectorIndex,
+        bm25_index: Optional[BM25Index],
+        queries: Sequence[str],
+        top_k: int,
+        depth: int,
+        rrf_k: int,
+    ) -> List[Hits]:
+        """Search the indexes for many queries in one job; see :meth:`search`."""
+
+        cost = len(vector_index) * len(queries)
+        if self.has_worker_indexes and cost >= self._inline_threshold:
+            return await self.run(cost, _search_worker_indexes_batch, list(queries), top_k, depth, rrf_k)
+        if self._mode == "process":
+            if cost < self._inline_threshold:
+                return search_indexes_batch(vector_index, bm25_index, queries, top_k, depth, rrf_k)
+            return await self._offload(
+                None,
+                search_indexes_batch,
+                vector_index,
+                bm25_index,
+                queries,
+                top_k,
+                depth,
+                rrf_k,
+            )
+        return await self.run(
+            cost,
+            search_indexes_batch,
+            vector_index,
+            bm25_index,
+            queries,
+            top_k,
+            depth,
+            rrf_k,
+        )
+
+    def shutdown(self) -> None:
+        """Stop the worker pool without waiting for queued jobs."""
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._loaded = None
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+"""Admission control and fair scheduling for upstream DeepSeek streams."""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional
+
+
+logger = logging.getLogger(__name__)
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class SchedulerQueueFullError(RuntimeError):
+    """Raised when a request cannot be queued because the queue is full."""
+
+
+class _Waiter:
+    """A queued request waiting for an upstream slot."""
+
+    __slots__ = ("admitted", "event")
+
+    def __init__(self) -> None:
+        self.admitted = False
+        self.event = asyncio.Event()
+
+
+class UpstreamScheduler:
+    """
+    Gate upstream calls behind a concurrency cap and a token-bucket rate.
+
+    Requests that cannot start immediately wait in per-key FIFO queues
+    (keyed by conversation) which are served round-robin, so one busy
+    conversation cannot starve the others. The total number of waiters is
+    bounded by ``max_queue``; beyond that :class:`SchedulerQueueFullError`
+    is raised immediately. A ``rate_per_second`` of 0 disables rate limiting.
+
+    Admitted waiters are woken directly; other changes wake only the head
+    waiter of each queue, so a release costs time proportional to the
+    number of queues rather than the number of waiters. Waiters further
+    back report their position when they join and again once they reach
+    the head of their queue.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        rate_per_second: float = 0.0,
+        burst: int = 10,
+        max_queue: int = 256,
+    ) -> None:
+        self._max_concurrent = max_concurrent
+        self._rate = rate_per_second
+        self._burst = float(max(burst, 1))
+        self._max_queue = max_queue
+        self._tokens = self._burst
+        self._last_refill = time.monotonic()
+        self._active = 0
+        self._waiting = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def active(self) -> int:
+        """Return the number of requests currently holding a slot."""
+
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of queued requests."""
+
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        key: str,
+        on_position: Optional[PositionCallback] = None,
+    ) -> AsyncIterator[None]:
+        """
+        Hold an upstream slot for the duration of the ``async with`` block.
+
+        While queued, ``on_position`` is awaited with the 1-based queue
+        position whenever it changes.
+        """
+
+        await self._acquire(key, on_position)
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    async def _acquire(self, key: str, on_position: Optional[PositionCallback]) -> None:
+        """Take a slot immediately or wait for one in the fair queue."""
+
+        if not self._queues and self._active < self._max_concurrent and self._take_token():
+            self._active += 1
+            return
+
+        if self._waiting >= self._max_queue:
+            raise SchedulerQueueFullError("Upstream request queue is full")
+
+        waiter = _Waiter()
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._waiting += 1
+        self._notify()
+        self._dispatch()
+
+        last_position = 0
+        try:
+            while True:
+                waiter.event.clear()
+                if waiter.admitted:
+                    return
+                if on_position is not None:
+                    position = self._position(key, waiter)
+                    if position != last_position:
+                        last_position = position
+                        await on_position(position)
+                        continue
+                await waiter.event.wait()
+        except BaseException:
+            if waiter.admitted:
+                self._active -= 1
+            else:
+                self._discard(key, waiter)
+            self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Admit queued requests while slots and rate tokens are available."""
+
+        admitted = False
+        while self._queues and self._active < self._max_concurrent:
+            if not self._take_token():
+                self._schedule_wakeup()
+                break
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            waiter.admitted = True
+            waiter.event.set()
+            self._waiting -= 1
+            self._active += 1
+            admitted = True
+        if admitted:
+            self._notify()
+
+    def _take_token(self) -> bool:
+        """Consume one rate-limit token if available."""
+
+        if self._rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _schedule_wakeup(self) -> None:
+        """Re-run dispatch once the next rate-limit token is available."""
+
+        if self._wakeup is not None:
+            return
+        delay = (1.0 - self._tokens) / self._rate
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        """Timer callback: forget the fired timer, then dispatch."""
+
+        self._wakeup = None
+        self._dispatch()
+
+    def _discard(self, key: str, waiter: _Waiter) -> None:
+        """Remove an abandoned waiter from its queue."""
+
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        self._waiting -= 1
+        if not queue:
+            del self._queues[key]
+        self._notify()
+
+    def _position(self, key: str, waiter: _Waiter) -> int:
+        """
+        Estimate the 1-based admission position of ``waiter``.
+
+        With round-robin service, every other queue contributes at most as
+        many entries as are ahead of the waiter in its own queue, plus one
+        more if that queue is served earlier in the current round.
+        """
+
+        queue = self._queues.get(key)
+        if queue is None or waiter not in queue:
+            return 1
+        depth = queue.index(waiter)
+        position = depth + 1
+        ahead_in_round = True
+        for other_key, other in self._queues.items():
+            if other_key == key:
+                ahead_in_round = False
+                continue
+            position += min(len(other), depth)
+            if ahead_in_round and len(other) > depth:
+                position += 1
+        return position
+
+    def _notify(self) -> None:
+        """Wake the head waiter of each queue so it can re-check its position."""
+
+        for queue in self._queues.values():
+            queue[0].event.set()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+"""Single-flight coalescing of identical in-flight upstream streams."""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+StreamFactory = Callable[[], AsyncIterator[str]]
+CompletionCallback = Callable[[str], Awaitable[None]]
+
+
+class _Flight:
+    """Shared state of one upstream stream and its subscribers."""
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task[None]] = None
+
+    def notify(self) -> None:
+        """Wake every subscriber waiting for new chunks or completion."""
+
+        event = self.changed
+        self.changed = asyncio.Event()
+        event.set()
+
+
+class StreamCoalescer:
+    """
+    Share one upstream stream between identical concurrent requests.
+
+    The first :meth:`stream` call for a key starts a background task that
+    drives the upstream iterator and appends chunks to a shared buffer.
+    Later calls for the same key attach as subscribers: they first receive
+    the chunks already produced, then follow the live stream. Every
+    subscriber reads from the buffer at its own pace, so a slow client never
+    stalls the upstream or the other subscribers. When the last subscriber
+    leaves before completion, the upstream stream is cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+
+    async def stream(
+        self,
+        key: str,
+        factory: StreamFactory,
+        on_complete: Optional[CompletionCallback] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the chunks of the stream for ``key``, starting it if needed.
+
+        ``factory`` is only called when no stream for ``key`` is in flight.
+        ``on_complete`` is called once with the full text when the upstream
+        stream finishes successfully.
+        """
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, factory, on_complete))
+        else:
+            logger.debug("Coalescing request onto in-flight stream %s", key[:12])
+
+        flight.subscribers += 1
+        offset = 0
+        try:
+            while True:
+                if offset < len(flight.chunks):
+                    chunk = flight.chunks[offset]
+                    offset += 1
+                    yield chunk
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Detach first so a new request starts a fresh stream instead
+                # of joining the one being torn down.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _drive(
+        self,
+        key: str,
+        flight: _Flight,
+        factory: StreamFactory,
+        on_complete: Optional[CompletionCallback],
+    ) -> None:
+        """Consume the upstream iterator into the flight's shared buffer."""
+
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as exc:  # noqa: BLE001
+            flight.error = exc
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+        if on_complete is not None and flight.error is None:
+            try:
+                await on_complete("".join(flight.chunks))
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Stream completion callback failed: %s", exc)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+"""Tests for resumable answer streams and their registry."""
+
+import asyncio
+
+import pytest
+
+from backend.services.answer_streams import AnswerStream, AnswerStreamRegistry, StreamOffsetError
+
+
+async def _discard(frame: str) -> None:
+    """Subscriber callback for side-channel frames the tests do not inspect."""
+
+
+def _waiting_generator(release: asyncio.Event):
+    """Return a generation that produces nothing until ``release`` is set."""
+
+    async def generate(stream: AnswerStream) -> None:
+        await release.wait()
+
+    return generate
+
+
+def test_resume_inside_buffer_reads_from_offset() -> None:
+    async def scenario() -> str:
+        registry = AnswerStreamRegistry(max_stream_chars=4)
+        release = asyncio.Event()
+
+        async def generate(stream: AnswerStream) -> None:
+            stream.append("abc")
+            stream.append("def")
+            await release.wait()
+            stream.append("g")
+
+        stream = registry.start("session", "m1", "question", generate)
+        await asyncio.sleep(0)
+        assert (stream.start_offset, stream.length) == (3, 6)
+
+        subscription = stream.subscribe(_discard, 4)
+        release.set()
+        text = "".join([chunk async for chunk in subscription])
+        subscription.close()
+        await registry.close()
+        return text
+
+    assert asyncio.run(scenario()) == "efg"
+
+
+def test_resume_outside_buffer_is_rejected() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry(max_stream_chars=4)
+        release = asyncio.Event()
+        stream = registry.start("session", "m1", "question", _waiting_generator(release))
+        stream.append("abc")
+        stream.append("def")
+
+        with pytest.raises(StreamOffsetError):
+            stream.subscribe(_discard, 2)
+        with pytest.raises(StreamOffsetError):
+            stream.subscribe(_discard, 7)
+        stream.subscribe(_discard, 6).close()
+        await registry.close()
+
+    asyncio.run(scenario())
+
+
+def test_buffer_is_kept_until_subscribers_have_read_it() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry(max_stream_chars=2)
+        release = asyncio.Event()
+        stream = registry.start("session", "m1", "question", _waiting_generator(release))
+        subscription = stream.subscribe(_discard, 0)
+        reader = subscription.__aiter__()
+
+        for text in ("ab", "cd", "ef"):
+            stream.append(text)
+        assert stream.start_offset == 0
+        assert stream.buffered == 6
+
+        assert await reader.__anext__() == "ab"
+        assert await reader.__anext__() == "cd"
+        stream.append("gh")
+        assert stream.start_offset == 4
+        assert stream.buffered == 4
+
+        await reader.aclose()
+        subscription.close()
+        await registry.close()
+
+    asyncio.run(scenario())
+
+
+def test_streams_are_private_to_their_owner() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry()
+        release = asyncio.Event()
+        stream = registry.start("alice", "m1", "question", _waiting_generator(release))
+
+        assert registry.get("alice", "m1") is stream
+        assert registry.get("bob", "m1") is None
+        assert not registry.cancel("bob", "m1")
+        assert registry.get("alice", "m1") is stream
+        await registry.close()
+
+    asyncio.run(scenario())
+
+
+def test_detached_stream_expires_after_grace_period() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry(grace_period=0.01)
+
+        async def generate(stream: AnswerStream) -> None:
+            stream.append("done")
+
+        stream = registry.start("session", "m1", "question", generate)
+        await stream.task
+        assert registry.get("session", "m1") is stream
+
+        await asyncio.sleep(0.05)
+        assert registry.get("session", "m1") is None
+        assert len(registry) == 0
+
+    asyncio.run(scenario())
+
+
+def test_last_subscriber_leaving_cancels_without_grace_period() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry(grace_period=0)
+        release = asyncio.Event()
+        stream = registry.start("session", "m1", "question", _waiting_generator(release))
+        subscription = stream.subscribe(_discard, 0)
+        await asyncio.sleep(0)
+
+        subscription.close()
+        await asyncio.gather(stream.task, return_exceptions=True)
+        assert stream.task.cancelled()
+        assert registry.get("session", "m1") is None
+
+    asyncio.run(scenario())
+
+
+def test_detached_streams_are_evicted_over_the_memory_cap() -> None:
+    async def scenario() -> None:
+        registry = AnswerStreamRegistry(max_total_chars=5)
+
+        async def generate(stream: AnswerStream) -> None:
+            stream.append("abcd")
+
+        detached = registry.start("session", "m1", "question", generate)
+        await detached.task
+
+        release = asyncio.Event()
+        attached = registry.start("session", "m2", "question", _waiting_generator(release))
+        subscription = attached.subscribe(_discard, 0)
+        attached.append("xyz")
+
+        assert registry.get("session", "m1") is None
+        assert detached.buffered == 0
+        assert registry.get("session", "m2") is attached
+        subscription.close()
+        await registry.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+"""Tests for upstream admission control and fair queueing."""
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from backend.services.scheduler import SchedulerQueueFullError, UpstreamScheduler
+
+
+async def _hold_slot(scheduler: UpstreamScheduler, release: asyncio.Event) -> None:
+    """Occupy a slot until ``release`` is set."""
+
+    async with scheduler.slot("blocker"):
+        await release.wait()
+
+
+def test_queues_are_served_round_robin() -> None:
+    async def scenario() -> None:
+        scheduler = UpstreamScheduler(max_concurrent=1)
+        release = asyncio.Event()
+        blocker = asyncio.create_task(_hold_slot(scheduler, release))
+        await asyncio.sleep(0)
+
+        order: List[str] = []
+        positions: Dict[str, List[int]] = {}
+
+        async def request(key: str, name: str) -> None:
+            async def on_position(position: int) -> None:
+                positions.setdefault(name, []).append(position)
+
+            async with scheduler.slot(key, on_position):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = []
+        for key, name in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")):
+            tasks.append(asyncio.create_task(request(key, name)))
+            await asyncio.sleep(0)
+        assert scheduler.waiting == 4
+
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        assert order == ["a1", "b1", "a2", "a3"]
+        assert positions["b1"] == [2, 1]
+        assert (scheduler.active, scheduler.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately() -> None:
+    async def scenario() -> None:
+        scheduler = UpstreamScheduler(max_concurrent=1, max_queue=1)
+        release = asyncio.Event()
+        blocker = asyncio.create_task(_hold_slot(scheduler, release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_hold_slot(scheduler, asyncio.Event()))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerQueueFullError):
+            async with scheduler.slot("other"):
+                pass
+        assert scheduler.waiting == 1
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert scheduler.waiting == 0
+        release.set()
+        await blocker
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_spaces_admissions() -> None:
+    async def scenario() -> float:
+        scheduler = UpstreamScheduler(max_concurrent=10, rate_per_second=50, burst=1)
+
+        async def request(key: str) -> None:
+            async with scheduler.slot(key):
+                pass
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(request(str(index)) for index in range(5)))
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.07
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+"""Tests for incremental server-sent event decoding."""
+
+from typing import List
+
+from backend.utils.sse import SSEDecoder
+
+
+STREAM = (
+    b": keep-alive\r\n"
+    b"\r\n"
+    b'data: {"choices":[{"delta":{"content":"\xe4\xbd\xa0\xe5\xa5\xbd"}}]}\r\n'
+    b"\r\n"
+    b"event: message\n"
+    b"data: first line\n"
+    b"data: second line\n"
+    b"\n"
+    b"data: [DONE]\n"
+    b"\n"
+)
+
+EXPECTED = [
+    b'{"choices":[{"delta":{"content":"\xe4\xbd\xa0\xe5\xa5\xbd"}}]}',
+    b"first line\nsecond line",
+    b"[DONE]",
+]
+
+
+def _decode(chunks: List[bytes]) -> List[bytes]:
+    decoder = SSEDecoder()
+    events: List[bytes] = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return events
+
+
+def test_whole_stream() -> None:
+    assert _decode([STREAM]) == EXPECTED
+
+
+def test_events_split_at_every_byte() -> None:
+    assert _decode([STREAM[index : index + 1] for index in range(len(STREAM))]) == EXPECTED
+
+
+def test_events_split_at_every_boundary() -> None:
+    for split in range(1, len(STREAM)):
+        assert _decode([STREAM[:split], STREAM[split:]]) == EXPECTED, split
+
+
+def test_unterminated_event_is_flushed() -> None:
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: partial") == []
+    assert decoder.flush() == [b"partial"]
+    assert decoder.flush() == []
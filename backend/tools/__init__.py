@@ -0,0 +1 @@
+"""Developer tools: mock upstream server, load generator and benchmarks."""
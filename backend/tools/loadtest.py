@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+"""
+WebSocket load generator for the ``/ws/chat`` endpoint.
+
+Opens N concurrent clients, each sending a sequence of questions and
+waiting for the final chunk of every answer, then reports latency and
+throughput as JSON so runs can be compared across commits::
+
+    python -m backend.tools.mock_deepseek --port 9000 &
+    DEEPSEEK_API_BASE=http://127.0.0.1:9000 DEEPSEEK_API_KEY=mock \\
+        uvicorn backend.main:app --port 8000 &
+    python -m backend.tools.loadtest --clients 200 --messages 5 --output run.json
+
+Tokens are counted in each complete answer as whitespace-separated words,
+which matches how the mock upstream emits them, plus one per CJK character
+so Chinese answers are not undercounted. A client whose answer times out
+records the error and reconnects for its remaining messages.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+
+_DEFAULT_QUESTIONS = (
+    "What is a matrix?",
+    "What is a derivative?",
+    "What is supervised learning?",
+)
+
+_CJK_CHARS = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+
+@dataclass
+class _Results:
+    """Raw measurements collected by all clients."""
+
+    ttft: List[float] = field(default_factory=list)
+    durations: List[float] = field(default_factory=list)
+    tokens: int = 0
+    messages: int = 0
+    errors: int = 0
+    error_kinds: Dict[str, int] = field(default_factory=dict)
+
+    def record_error(self, kind: str) -> None:
+        """Count one failed message under ``kind``."""
+
+        self.errors += 1
+        self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Return the ``pct`` percentile (nearest rank) of ``values``."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _count_tokens(text: str) -> int:
+    """Count CJK characters individually and other text as whitespace-separated words."""
+
+    cjk = len(_CJK_CHARS.findall(text))
+    return cjk + len(_CJK_CHARS.sub(" ", text).split())
+
+
+async def _run_turn(
+    ws: Any,
+    question: str,
+    unique: bool,
+    timeout: float,
+    results: _Results,
+) -> bool:
+    """Send one question and wait for its final chunk; return ``False`` on a timeout."""
+
+    message_id = str(uuid.uuid4())
+    if unique:
+        question = f"{question} [{message_id[:8]}]"
+    started = time.perf_counter()
+    first: Optional[float] = None
+    parts: List[str] = []
+    await ws.send(json.dumps({"type": "user_message", "message_id": message_id, "content": question}))
+    try:
+        while True:
+            data = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+            if data.get("type") != "assistant_chunk" or data.get("message_id") != message_id:
+                continue
+            content = data.get("content", "")
+            if content and first is None:
+                first = time.perf_counter()
+            if data.get("is_final"):
+                break
+            parts.append(content)
+    except asyncio.TimeoutError:
+        results.record_error("timeout")
+        return False
+
+    results.messages += 1
+    results.tokens += _count_tokens("".join(parts))
+    if data.get("content"):
+        # Final chunks only carry text when reporting an error.
+        results.record_error("error_chunk")
+        return True
+    results.durations.append(time.perf_counter() - started)
+    if first is not None:
+        results.ttft.append(first - started)
+    return True
+
+
+async def _run_client(
+    url: str,
+    questions: List[str],
+    messages: int,
+    unique: bool,
+    timeout: float,
+    results: _Results,
+) -> None:
+    """
+    Drive one WebSocket client through ``messages`` question/answer turns.
+
+    After a timed-out answer or a connection error the client reconnects
+    and carries on with its remaining turns.
+    """
+
+    turn = 0
+    while turn < messages:
+        first_turn = turn
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                while turn < messages:
+                    question = questions[turn % len(questions)]
+                    turn += 1
+                    if not await _run_turn(ws, question, unique, timeout, results):
+                        break
+        except (OSError, websockets.WebSocketException) as exc:
+            results.record_error(type(exc).__name__)
+            if turn == first_turn:
+                turn += 1
+
+
+def _git_revision() -> Optional[str]:
+    """Return the current git commit, if available."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load_test(
+    url: str,
+    clients: int,
+    messages: int,
+    questions: List[str],
+    unique: bool = True,
+    ramp_up: float = 0.0,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    """Run the load test and return the summary report."""
+
+    results = _Results()
+    started = time.perf_counter()
+
+    async def delayed(index: int) -> None:
+        if ramp_up > 0:
+            await asyncio.sleep(ramp_up * index / max(clients, 1))
+        await _run_client(url, questions, messages, unique, timeout, results)
+
+    await asyncio.gather(*(delayed(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    attempted = clients * messages
+
+    def summary(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            "p50": _percentile(values, 50),
+            "p90": _percentile(values, 90),
+            "p99": _percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "url": url,
+            "clients": clients,
+            "messages_per_client": messages,
+            "unique_questions": unique,
+            "ramp_up_seconds": ramp_up,
+        },
+        "elapsed_seconds": elapsed,
+        "messages_completed": results.messages,
+        "messages_per_second": results.messages / elapsed if elapsed else 0.0,
+        "tokens": results.tokens,
+        "tokens_per_second": results.tokens / elapsed if elapsed else 0.0,
+        "time_to_first_token_seconds": summary(results.ttft),
+        "answer_duration_seconds": summary(results.durations),
+        "errors": results.errors,
+        "error_rate": results.errors / attempted if attempted else 0.0,
+        "error_kinds": results.error_kinds,
+    }
+
+
+def main() -> None:
+    """Run the load generator from the command line."""
+
+    parser = argparse.ArgumentParser(description="WebSocket load generator for /ws/chat")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/chat")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent WebSocket clients")
+    parser.add_argument("--messages", type=int, default=3, help="messages sent by each client")
+    parser.add_argument("--questions-file", help="text file with one question per line")
+    parser.add_argument(
+        "--repeat-questions",
+        action="store_true",
+        help="send identical questions (exercises caching/coalescing)",
+    )
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds over which clients connect")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-frame receive timeout")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    questions = list(_DEFAULT_QUESTIONS)
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as handle:
+            questions = [line.strip() for line in handle if line.strip()] or questions
+
+    report = asyncio.run(
+        run_load_test(
+            url=args.url,
+            clients=args.clients,
+            messages=args.messages,
+            questions=questions,
+            unique=not args.repeat_questions,
+            ramp_up=args.ramp_up,
+            timeout=args.timeout,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+"""
+Local stand-in for the DeepSeek (OpenAI-compatible) streaming chat API.
+
+Point the backend at it with ``DEEPSEEK_API_BASE=http://localhost:9000`` to
+measure the ``/ws/chat`` path without spending real API tokens::
+
+    python -m backend.tools.mock_deepseek --port 9000 --token-rate 50
+
+The same options can be set through ``MOCK_*`` environment variables when
+running ``uvicorn backend.tools.mock_deepseek:app``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+_WORDS = (
+    "a derivative measures how a function changes as its input changes "
+    "matrices are rectangular arrays of numbers arranged in rows and columns "
+    "supervised learning uses labeled data to train a model to make predictions"
+).split()
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock upstream."""
+
+    token_rate: float = 50.0
+    first_byte_delay: float = 0.2
+    tokens_per_answer: int = 120
+    chunk_words: int = 1
+    error_rate: float = 0.0
+    midstream_error_rate: float = 0.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        """Build a configuration from ``MOCK_*`` environment variables."""
+
+        return cls(
+            token_rate=float(os.getenv("MOCK_TOKEN_RATE", "50")),
+            first_byte_delay=float(os.getenv("MOCK_FIRST_BYTE_DELAY", "0.2")),
+            tokens_per_answer=int(os.getenv("MOCK_TOKENS_PER_ANSWER", "120")),
+            chunk_words=int(os.getenv("MOCK_CHUNK_WORDS", "1")),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+            midstream_error_rate=float(os.getenv("MOCK_MIDSTREAM_ERROR_RATE", "0")),
+            seed=int(os.getenv("MOCK_SEED", "0")),
+        )
+
+
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode one SSE ``data:`` event."""
+
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def create_mock_app(config: MockConfig) -> FastAPI:
+    """Create the mock upstream application for the given configuration."""
+
+    app = FastAPI(title="Mock DeepSeek API")
+    rng = random.Random(config.seed or None)
+
+    @app.get("/v1/models")
+    async def list_models() -> Dict[str, Any]:
+        return {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        body = await request.json()
+        model = body.get("model", "deepseek-chat")
+
+        await asyncio.sleep(config.first_byte_delay)
+        if rng.random() < config.error_rate:
+            status = rng.choice((429, 500, 503))
+            return JSONResponse({"error": {"message": "injected error"}}, status_code=status)
+
+        completion_id = f"chatcmpl-mock-{int(time.time() * 1000)}"
+        fail_midstream = rng.random() < config.midstream_error_rate
+        interval = config.chunk_words / config.token_rate if config.token_rate > 0 else 0.0
+
+        async def events() -> AsyncIterator[bytes]:
+            produced = 0
+            while produced < config.tokens_per_answer:
+                count = min(config.chunk_words, config.tokens_per_answer - produced)
+                words = [_WORDS[(produced + i) % len(_WORDS)] for i in range(count)]
+                produced += count
+                yield _sse_event(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"content": " ".join(words) + " "},
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
+                )
+                if fail_midstream and produced >= config.tokens_per_answer // 2:
+                    raise RuntimeError("injected mid-stream failure")
+                if interval:
+                    await asyncio.sleep(interval)
+            yield _sse_event(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": produced,
+                        "total_tokens": produced,
+                    },
+                }
+            )
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+app = create_mock_app(MockConfig.from_env())
+
+
+def main() -> None:
+    """Run the mock upstream server from the command line."""
+
+    import uvicorn
+
+    defaults = MockConfig.from_env()
+    parser = argparse.ArgumentParser(description="Mock DeepSeek streaming chat API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--token-rate", type=float, default=defaults.token_rate, help="tokens per second per stream")
+    parser.add_argument("--first-byte-delay", type=float, default=defaults.first_byte_delay, help="seconds before the response starts")
+    parser.add_argument("--tokens-per-answer", type=int, default=defaults.tokens_per_answer)
+    parser.add_argument("--chunk-words", type=int, default=defaults.chunk_words, help="tokens per SSE event")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="probability of a 429/5xx response")
+    parser.add_argument("--midstream-error-rate", type=float, default=defaults.midstream_error_rate, help="probability of dropping a stream halfway")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        token_rate=args.token_rate,
+        first_byte_delay=args.first_byte_delay,
+        tokens_per_answer=args.tokens_per_answer,
+        chunk_words=args.chunk_words,
+        error_rate=args.error_rate,
+        midstream_error_rate=args.midstream_error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_mock_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
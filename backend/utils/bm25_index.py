@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+"""In-process BM25 inverted index and rank fusion for hybrid retrieval."""
+
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+
+from backend.utils.embedding_utils import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+# Term-frequency weight of each record field.
+FIELD_WEIGHTS = (("question", 2.0), ("topic", 1.0), ("answer", 1.0))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the topic, question and answer text of Q&A records.
+
+    Postings are stored CSR-style: for term ``t`` the documents are
+    ``doc_ids[offsets[t]:offsets[t + 1]]`` with the matching entries of
+    ``weights``, which already hold the BM25 term-frequency component for
+    that document. A query therefore costs one vectorized scatter-add per
+    query term plus a partial sort of the touched documents. The index is
+    immutable; call :meth:`build` again to change its contents, or
+    :meth:`rebuilt` for a new index that can be swapped in while this one
+    is still being searched.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self._k1 = k1
+        self._b = b
+        self._entries: List[Dict[str, Any]] = []
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._idf = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def build(self, entries: Sequence[Dict[str, Any]]) -> None:
+        """Index ``entries``, replacing the previous contents."""
+
+        terms: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        frequencies: List[float] = []
+        lengths = np.zeros(len(entries), dtype=np.float32)
+
+        for doc, entry in enumerate(entries):
+            counts: Dict[int, float] = {}
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(entry.get(field) or ""):
+                    term = terms.setdefault(token, len(terms))
+                    counts[term] = counts.get(term, 0.0) + weight
+            lengths[doc] = sum(counts.values())
+            term_ids.extend(counts)
+            doc_ids.extend([doc] * len(counts))
+            frequencies.extend(counts.values())
+
+        term_array = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_array, kind="stable")
+        sorted_docs = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(frequencies, dtype=np.float32)[order]
+        document_frequency = np.bincount(term_array, minlength=len(terms))
+
+        average_length = float(lengths.mean()) if len(entries) else 0.0
+        norm = self._k1 * (1.0 - self._b + self._b * lengths / (average_length or 1.0))
+        count = len(entries)
+
+        self._entries = list(entries)
+        self._terms = terms
+        self._offsets = np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64)
+        self._doc_ids = sorted_docs
+        self._weights = (tf * (self._k1 + 1.0) / (tf + norm[sorted_docs])).astype(np.float32)
+        self._idf = np.log(
+            1.0 + (count - document_frequency + 0.5) / (document_frequency + 0.5)
+        ).astype(np.float32)
+        logger.info("BM25 index built with %d entries and %d terms", count, len(terms))
+
+    def rebuilt(self, entries: Sequence[Dict[str, Any]]) -> "BM25Index":
+        """Return a new index with the same parameters over ``entries``."""
+
+        index = BM25Index(k1=self._k1, b=self._b)
+        index.build(entries)
+        return index
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to ``top_k`` entries with a positive BM25 score, best first."""
+
+        if not self._entries or top_k <= 0:
+            return []
+        query_terms = {self._terms[token] for token in tokenize(query) if token in self._terms}
+        if not query_terms:
+            return []
+
+        scores = np.zeros(len(self._entries), dtype=np.float32)
+        for term in query_terms:
+            start, end = self._offsets[term], self._offsets[term + 1]
+            # Each document occurs once per posting list, so plain fancy
+            # indexing accumulates correctly.
+            scores[self._doc_ids[start:end]] += self._idf[term] * self._weights[start:end]
+
+        touched = np.flatnonzero(scores)
+        if top_k < len(touched):
+            touched = touched[np.argpartition(scores[touched], -top_k)[-top_k:]]
+        best = touched[np.argsort(-scores[touched], kind="stable")]
+        return [(self._entries[idx], float(scores[idx])) for idx in best]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[Dict[str, Any], float]]],
+    top_k: int,
+    k: int = 60,
+    key: Callable[[Dict[str, Any]], Hashable] = lambda entry: entry.get("id"),
+) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Fuse ranked ``(entry, score)`` lists by reciprocal rank.
+
+    An entry scores ``sum(1 / (k + rank))`` over the lists it appears in,
+    with ranks starting at 1 and entries matched by ``key`` (their ``id`` by
+    default). Only ranks are used, so BM25 and cosine scores need no common
+    scale.
+    """
+
+    fused: Dict[Any, float] = {}
+    entries: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, (entry, _) in enumerate(ranking, start=1):
+            entry_key = key(entry)
+            fused[entry_key] = fused.get(entry_key, 0.0) + 1.0 / (k + rank)
+            entries.setdefault(entry_key, entry)
+    best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [(entries[entry_key], score) for entry_key, score in best]
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+"""Coalescing of small streamed deltas into fewer WebSocket frames."""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from backend.models.message import encode_assistant_chunk
+
+
+SendText = Callable[[str], Awaitable[None]]
+
+
+class ChunkBatcher:
+    """
+    Buffer assistant deltas for one message and flush them as larger chunks.
+
+    The first delta is always sent immediately so time-to-first-token is not
+    affected. Later deltas are buffered until ``max_bytes`` of text is
+    pending or ``max_delay`` seconds have passed since the first buffered
+    delta, whichever comes first. A ``max_delay`` of 0 disables batching.
+
+    Every frame carries the answer offset reached after its content,
+    counted from ``offset`` (non-zero when resuming a stream).
+    """
+
+    def __init__(
+        self,
+        send_text: SendText,
+        message_id: str,
+        max_bytes: int = 256,
+        max_delay: float = 0.03,
+        offset: int = 0,
+    ) -> None:
+        self._send_text = send_text
+        self._message_id = message_id
+        self._max_bytes = max_bytes
+        self._max_delay = max_delay
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._first_sent = False
+        self._timer: Optional[asyncio.Task[None]] = None
+        self._lock = asyncio.Lock()
+        self.offset = offset
+
+    async def add(self, delta: str) -> None:
+        """Queue a delta, flushing when the size or time limit is reached."""
+
+        if not delta:
+            return
+        if not self._first_sent or self._max_delay <= 0:
+            self._first_sent = True
+            async with self._lock:
+                await self._send(delta, is_final=False)
+            return
+
+        self._buffer.append(delta)
+        self._buffered_bytes += len(delta.encode("utf-8"))
+        if self._buffered_bytes >= self._max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(time.monotonic()))
+
+    async def flush(self) -> None:
+        """Send all buffered text as a single chunk."""
+
+        self._cancel_timer()
+        async with self._lock:
+            if not self._buffer:
+                return
+            content = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_bytes = 0
+            await self._send(content, is_final=False)
+
+    async def close(self, final_content: str = "") -> None:
+        """Flush pending text and send the final chunk for this message."""
+
+        await self.flush()
+        async with self._lock:
+            await self._send(final_content, is_final=True)
+
+    def discard(self) -> None:
+        """Drop pending text and stop the flush timer without sending."""
+
+        self._cancel_timer()
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    async def _flush_later(self, started: float) -> None:
+        """Flush once the time window opened at ``started`` has elapsed."""
+
+        await asyncio.sleep(max(0.0, started + self._max_delay - time.monotonic()))
+        self._timer = None
+        await self.flush()
+
+    def _cancel_timer(self) -> None:
+        """Cancel a pending timed flush unless it is the caller itself."""
+
+        timer = self._timer
+        self._timer = None
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    async def _send(self, content: str, is_final: bool) -> None:
+        """Serialize and send one chunk frame."""
+
+        self.offset += len(content)
+        await self._send_text(encode_assistant_chunk(self._message_id, content, is_final, self.offset))
@@ -28,6 +28,7 @@ async def main():
     )
     
     try:
+        await client.ensure_fulltext_indexes()
         await init_demo_data(client)
         logger.info("Demo data initialization completed successfully!")
     except Exception as e:
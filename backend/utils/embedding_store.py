@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+"""
+On-disk embedding store shared by worker processes through ``numpy.memmap``.
+
+The store is two files:
+
+* ``<path>``: a 64-byte header followed by a row-major float32 matrix with
+  one row per entry.
+* ``<path>.ids``: a JSON Lines id table. Its first line repeats the header
+  generation; line ``n + 1`` holds the id and Q&A fields of matrix row ``n``.
+
+The header records the format version, :data:`FEATURIZER_VERSION`,
+dimension, committed row count and a random generation number. Files
+written by another featurizer are reported as stale, and a matrix/id table
+pair from different rebuilds is rejected. Appends write rows and id lines
+first and bump the committed count last, so readers ignore a torn append.
+"""
+
+import json
+import logging
+import os
+import struct
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.utils.embedding_utils import EMBEDDING_DIMENSION, FEATURIZER_VERSION
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"EDUEMBED"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+# magic, format version, featurizer version, dimension, row count, generation
+_HEADER = struct.Struct("<8sIIIQQ")
+
+EmbedEntries = Callable[[Sequence[Dict[str, Any]]], np.ndarray]
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped float32 embedding matrix with an id table.
+
+    :meth:`open` maps the matrix read-only, so every worker that opens the
+    same file shares its pages through the OS page cache. :meth:`sync`
+    brings the store in line with the current Q&A entries, appending new
+    ones and rebuilding the files only when entries were removed or edited.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int = EMBEDDING_DIMENSION,
+        featurizer_version: int = FEATURIZER_VERSION,
+    ) -> None:
+        self._path = path
+        self._ids_path = f"{path}.ids"
+        self._lock_path = f"{path}.lock"
+        self._dimension = dimension
+        self._featurizer_version = featurizer_version
+        self._matrix: np.ndarray = np.zeros((0, dimension), dtype=np.float32)
+        self._entries: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entry_id: object) -> bool:
+        return entry_id in self._rows
+
+    @property
+    def path(self) -> str:
+        """Return the path of the matrix file."""
+
+        return self._path
+
+    @property
+    def generation(self) -> int:
+        """Return the generation of the opened files; a rebuild changes it."""
+
+        return self._generation
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Return the read-only ``(len(self), dimension)`` embedding matrix."""
+
+        return self._matrix
+
+    @property
+    def entries(self) -> List[Dict[str, Any]]:
+        """Return the entries in row order."""
+
+        return self._entries
+
+    def open(self) -> bool:
+        """
+        Map an existing store.
+
+        Returns ``False`` (leaving the store empty) if the files are
+        missing, written by a different format or featurizer version, or
+        inconsistent with each other.
+        """
+
+        self._reset()
+        try:
+            with open(self._path, "rb") as handle:
+                header = handle.read(HEADER_SIZE)
+        except FileNotFoundError:
+            return False
+        if len(header) < _HEADER.size:
+            logger.warning("Embedding store %s has a truncated header", self._path)
+            return False
+        magic, version, featurizer, dimension, count, generation = _HEADER.unpack_from(header)
+        if (
+            magic != _MAGIC
+            or version != FORMAT_VERSION
+            or featurizer != self._featurizer_version
+            or dimension != self._dimension
+        ):
+            logger.warning(
+                "Embedding store %s is stale (format %s, featurizer %s, dimension %s)",
+                self._path,
+                version,
+                featurizer,
+                dimension,
+            )
+            return False
+
+        entries = self._read_ids(generation, count)
+        if entries is None:
+            return False
+        if count:
+            self._matrix = np.memmap(
+                self._path,
+                dtype=np.float32,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(count, self._dimension),
+            )
+        self._entries = entries
+        self._rows = {entry["id"]: row for row, entry in enumerate(entries)}
+        self._generation = generation
+        logger.info("Embedding store %s opened with %d entries", self._path, count)
+        return True
+
+    def build(self, entries: Sequence[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """
+        Replace the store with ``entries`` and their ``embeddings``.
+
+        Both files are written under temporary names and renamed into
+        place; processes that mapped the previous files keep reading them
+        until they reopen.
+        """
+
+        generation = uuid.uuid4().int & 0xFFFFFFFFFFFFFFFF
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self._dimension)
+        tmp_path = f"{self._path}.tmp"
+        tmp_ids_path = f"{self._ids_path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(self._pack_header(len(entries), generation))
+            handle.write(matrix.tobytes())
+        with open(tmp_ids_path, "w", encoding="utf-8") as handle:
+            handle.write(json.dumps({"generation": generation}) + "\n")
+            for entry in entries:
+                handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_ids_path, self._ids_path)
+        os.replace(tmp_path, self._path)
+        self.open()
+
+    def append(self, entries: Sequence[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        """
+        Append entries that are not stored yet and return how many were added.
+
+        Appends are serialized across processes with a lock file where the
+        platform supports it; the store is re-read under the lock so rows
+        appended concurrently by another worker are not duplicated.
+        """
+
+        with _FileLock(self._lock_path):
+            return self._append_locked(entries, embeddings)
+
+    def sync(self, entries: Sequence[Dict[str, Any]], embed: EmbedEntries) -> int:
+        """
+        Make the store hold exactly ``entries`` and return how many were embedded.
+
+        New entries are embedded with ``embed`` and appended. If stored entries were
+        removed or changed, the store is rebuilt, reusing the stored
+        embeddings of unchanged entries. The store is re-read and compared
+        under the lock file, so a concurrent sync by another worker is
+        never overwritten with a stale diff.
+        """
+
+        with _FileLock(self._lock_path):
+            self.open()
+            current = {entry["id"]: entry for entry in entries}
+            unchanged = {
+                entry_id
+                for entry_id, row in self._rows.items()
+                if current.get(entry_id) == self._entries[row]
+            }
+            new = [entry for entry in entries if entry["id"] not in unchanged]
+
+            if len(unchanged) == len(self._entries):
+                if new:
+                    self._append_locked(new, embed(new))
+                return len(new)
+
+            matrix = np.empty((len(entries), self._dimension), dtype=np.float32)
+            new_rows = [row for row, entry in enumerate(entries) if entry["id"] not in unchanged]
+            for row, entry in enumerate(entries):
+                if entry["id"] in unchanged:
+                    matrix[row] = self._matrix[self._rows[entry["id"]]]
+            if new_rows:
+                matrix[new_rows] = embed([entries[row] for row in new_rows])
+            self.build(list(entries), matrix)
+            return len(new_rows)
+
+    def _append_locked(self, entries: Sequence[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        """Append entries that are not stored yet; the caller holds the lock file."""
+
+        if not self.open():
+            self.build(entries, embeddings)
+            return len(entries)
+        keep = [index for index, entry in enumerate(entries) if entry["id"] not in self._rows]
+        if not keep:
+            return 0
+        count = len(self._entries)
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self._dimension)
+        with open(self._path, "r+b") as handle:
+            handle.seek(HEADER_SIZE + count * self._dimension * 4)
+            handle.write(matrix[keep].tobytes())
+            handle.truncate()
+            handle.flush()
+            os.fsync(handle.fileno())
+        with open(self._ids_path, "r+b") as handle:
+            for _ in range(count + 1):
+                handle.readline()
+            handle.truncate()
+            for index in keep:
+                handle.write(json.dumps(entries[index], ensure_ascii=False).encode("utf-8") + b"\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        with open(self._path, "r+b") as handle:
+            handle.write(self._pack_header(count + len(keep), self._generation))
+        self.open()
+        return len(keep)
+
+    def _reset(self) -> None:
+        """Drop the current mapping and entries."""
+
+        self._matrix = np.zeros((0, self._dimension), dtype=np.float32)
+        self._entries = []
+        self._rows = {}
+        self._generation = 0
+
+    def _pack_header(self, count: int, generation: int) -> bytes:
+        """Encode a header padded to :data:`HEADER_SIZE` bytes."""
+
+        header = _HEADER.pack(
+            _MAGIC,
+            FORMAT_VERSION,
+            self._featurizer_version,
+            self._dimension,
+            count,
+            generation,
+        )
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def _read_ids(self, generation: int, count: int) -> Optional[List[Dict[str, Any]]]:
+        """Read the first ``count`` id table entries if the generation matches."""
+
+        try:
+            with open(self._ids_path, "r", encoding="utf-8") as handle:
+                meta = json.loads(handle.readline() or "{}")
+                if meta.get("generation") != generation:
+                    logger.warning("Embedding store id table %s does not match", self._ids_path)
+                    return None
+                entries = []
+                for _ in range(count):
+                    line = handle.readline()
+                    if not line:
+                        logger.warning("Embedding store id table %s is truncated", self._ids_path)
+                        return None
+                    entries.append(json.loads(line))
+        except (OSError, ValueError) as exc:
+            logger.warning("Cannot read embedding store id table %s: %s", self._ids_path, exc)
+            return None
+        return entries
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file; a no-op where ``fcntl`` is missing."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._handle: Optional[Any] = None
+
+    def __enter__(self) -> "_FileLock":
+        if fcntl is not None:
+            self._handle = open(self._path, "a")
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
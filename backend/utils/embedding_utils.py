@@ -2,18 +2,62 @@ from __future__ import annotations
 
 """Simple deterministic text embedding utilities and similarity helpers."""
 
-from typing import Iterable, List, Sequence, Tuple
+import re
+import zlib
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
 
 import numpy as np
 
 
 EMBEDDING_DIMENSION = 256
 
+# Bump whenever tokenization or hashing changes, so persisted embeddings
+# computed by an older featurizer are detected as stale.
+FEATURIZER_VERSION = 2
 
-def _tokenize(text: str) -> List[str]:
-    """Tokenize text into lowercase whitespace-separated tokens."""
+# Fixed CRC-32 start value; changing it changes every bucket.
+_HASH_SEED = 0x5EED1234
 
-    return text.lower().split()
+# Runs of CJK ideographs, kana or hangul, or runs of other letters/digits.
+_TOKEN_PATTERN = re.compile(
+    r"(?P<cjk>[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+)"
+    r"|(?P<word>[^\W_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+)"
+)
+
+
+class SparseEmbedding(NamedTuple):
+    """L2-normalized embedding stored as sorted bucket indices and weights."""
+
+    indices: np.ndarray
+    values: np.ndarray
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize lowercased text into words and CJK character n-grams.
+
+    Runs of letters and digits become one token each. CJK runs, which have
+    no spaces between words, are split into character unigrams and
+    bigrams, so "什么是矩阵" shares the tokens "矩阵" and "矩" with "矩阵乘法".
+    """
+
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if match.lastgroup == "cjk":
+            tokens.extend(run)
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+@lru_cache(maxsize=65536)
+def _bucket(token: str) -> int:
+    """Map a token to its embedding dimension with a seeded CRC-32."""
+
+    return zlib.crc32(token.encode("utf-8"), _HASH_SEED) % EMBEDDING_DIMENSION
 
 
 def embed_text(text: str) -> np.ndarray:
@@ -21,17 +65,61 @@ def embed_text(text: str) -> np.ndarray:
     Compute a simple deterministic embedding for the given text.
 
     The implementation uses a hashed bag-of-words representation mapped into
-    a fixed-size vector, which is sufficient for demo RAG purposes.
+    a fixed-size vector, which is sufficient for demo RAG purposes. Tokens
+    are hashed with a seeded CRC-32, so vectors are identical across
+    processes and restarts and can be persisted or cached.
     """
 
-    vector = np.zeros(EMBEDDING_DIMENSION, dtype=float)
-    for token in _tokenize(text):
-        index = hash(token) % EMBEDDING_DIMENSION
-        vector[index] += 1.0
+    buckets = [_bucket(token) for token in tokenize(text)]
+    vector = np.bincount(buckets, minlength=EMBEDDING_DIMENSION).astype(float)
     norm = np.linalg.norm(vector) or 1.0
     return vector / norm
 
 
+def embed_text_sparse(text: str) -> SparseEmbedding:
+    """Return the embedding of ``text`` in sparse form (non-zero buckets only)."""
+
+    buckets = np.fromiter((_bucket(token) for token in tokenize(text)), dtype=np.int32)
+    indices, counts = np.unique(buckets, return_counts=True)
+    values = counts.astype(np.float32)
+    norm = np.linalg.norm(values) or 1.0
+    return SparseEmbedding(indices.astype(np.int32), values / norm)
+
+
+def embed_texts_sparse(texts: Iterable[str]) -> List[SparseEmbedding]:
+    """Embed many texts in sparse form; see :func:`embed_text_sparse`."""
+
+    return [embed_text_sparse(text) for text in texts]
+
+
+def embed_texts(texts: Iterable[str]) -> np.ndarray:
+    """
+    Embed many texts at once into an ``(n, EMBEDDING_DIMENSION)`` matrix.
+
+    Token buckets for the whole batch are collected first and scattered into
+    the matrix with a single ``np.add.at`` call, then every row is
+    L2-normalized in one vectorized pass. Rows match ``embed_text`` output.
+    Bucket lookups are memoized, so repeated vocabulary across a corpus is
+    hashed once.
+    """
+
+    columns: List[int] = []
+    lengths: List[int] = []
+    for text in texts:
+        tokens = tokenize(text)
+        columns.extend(map(_bucket, tokens))
+        lengths.append(len(tokens))
+
+    matrix = np.zeros((len(lengths), EMBEDDING_DIMENSION), dtype=np.float32)
+    if columns:
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        np.add.at(matrix, (rows, np.asarray(columns)), 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    matrix /= norms
+    return matrix
+
+
 def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
     """Compute cosine similarity between two embedding vectors."""
 
@@ -55,3 +143,70 @@ def rank_by_similarity(
     scores.sort(key=lambda item: item[1], reverse=True)
     return scores
 
+
+def top_k_by_similarity(
+    query_embedding: np.ndarray,
+    candidate_matrix: np.ndarray,
+    top_k: int,
+) -> List[Tuple[int, float]]:
+    """
+    Return the ``top_k`` most similar rows of ``candidate_matrix``.
+
+    Scores are computed with one matrix-vector product and only the best
+    ``top_k`` entries are selected (``argpartition``) and sorted, so the cost
+    stays linear in the number of candidates. Rows and the query are
+    expected to be L2-normalized, as produced by ``embed_text(s)``.
+    """
+
+    count = candidate_matrix.shape[0]
+    if count == 0 or top_k <= 0:
+        return []
+
+    scores = candidate_matrix @ query_embedding.astype(candidate_matrix.dtype, copy=False)
+    if top_k < count:
+        best = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        best = np.arange(count)
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [(int(idx), float(scores[idx])) for idx in best]
+
+
+def top_k_by_similarity_batch(
+    query_matrix: np.ndarray,
+    candidate_matrix: np.ndarray,
+    top_k: int,
+    max_scores: int = 1 << 22,
+) -> List[List[Tuple[int, float]]]:
+    """
+    Return the ``top_k`` most similar candidate rows for each query row.
+
+    The batched form of :func:`top_k_by_similarity`: every block of queries
+    is scored with a single matrix product and its best rows are selected
+    per query with one ``argpartition``. Queries are processed in blocks of
+    at most ``max_scores`` scores, bounding the temporary score matrix.
+    """
+
+    count = candidate_matrix.shape[0]
+    queries = query_matrix.shape[0]
+    if count == 0 or top_k <= 0:
+        return [[] for _ in range(queries)]
+
+    top_k = min(top_k, count)
+    block = max(1, max_scores // count)
+    rankings: List[List[Tuple[int, float]]] = []
+    for start in range(0, queries, block):
+        queries_block = query_matrix[start : start + block].astype(candidate_matrix.dtype, copy=False)
+        scores = queries_block @ candidate_matrix.T
+        if top_k < count:
+            best = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        else:
+            best = np.broadcast_to(np.arange(count), scores.shape)
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        rankings.extend(
+            list(zip(indices, values))
+            for indices, values in zip(best.tolist(), best_scores.tolist())
+        )
+    return rankings
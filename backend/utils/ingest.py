@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+"""
+Bulk ingestion of question/answer pairs into the knowledge graph.
+
+Run ``python -m backend.utils.ingest curriculum.jsonl``. Input is streamed
+from a JSONL or CSV file with ``question``, ``answer`` and optional ``topic``
+fields, batched and written with ``UNWIND ... MERGE`` by several
+concurrent sessions. Progress is checkpointed to a JSON file so an
+interrupted run resumes where it stopped; because every write is a MERGE,
+batches repeated after a crash are harmless.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.config import get_settings
+from backend.utils.neo4j_client import Neo4jClient
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestStats:
+    """Counters for one ingestion run."""
+
+    rows_read: int = 0
+    rows_written: int = 0
+    rows_skipped: int = 0
+    rows_resumed: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Return the write throughput of this run."""
+
+        return self.rows_written / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def detect_format(path: str) -> str:
+    """Guess ``jsonl`` or ``csv`` from the file extension."""
+
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _normalize_row(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return a clean row, or ``None`` if question or answer is missing."""
+
+    question = str(raw.get("question") or "").strip()
+    answer = str(raw.get("answer") or "").strip()
+    if not question or not answer:
+        return None
+    topic = str(raw.get("topic") or "").strip() or None
+    return {"topic": topic, "question": question, "answer": answer}
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Stream rows from ``path`` without loading the file into memory.
+
+    Yields ``None`` for rows that are malformed or incomplete, so row
+    positions stay stable for checkpointing.
+    """
+
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        if fmt == "csv":
+            for raw in csv.DictReader(handle):
+                yield _normalize_row(raw)
+            return
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield _normalize_row(raw) if isinstance(raw, dict) else None
+
+
+class Checkpoint:
+    """
+    Resume position for one input file.
+
+    ``rows_done`` is the number of leading input rows whose batches have
+    all been committed. The file is replaced atomically on every update.
+    """
+
+    def __init__(self, path: str, source: str) -> None:
+        self._path = path
+        self._source = os.path.abspath(source)
+        self._source_size = os.path.getsize(source)
+        self.rows_done = 0
+
+    def load(self) -> int:
+        """Read a checkpoint written for the same input file, if any."""
+
+        try:
+            with open(self._path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", self._path, exc)
+            return 0
+        if data.get("source") != self._source or data.get("source_size") != self._source_size:
+            logger.warning("Checkpoint %s belongs to a different input; starting over", self._path)
+            return 0
+        self.rows_done = int(data.get("rows_done", 0))
+        return self.rows_done
+
+    def save(self, rows_done: int) -> None:
+        """Persist ``rows_done`` for this input file."""
+
+        self.rows_done = rows_done
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "source": self._source,
+                    "source_size": self._source_size,
+                    "rows_done": rows_done,
+                    "updated_at": time.time(),
+                },
+                handle,
+            )
+        os.replace(tmp_path, self._path)
+
+    def clear(self) -> None:
+        """Remove the checkpoint after a completed run."""
+
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def _iter_batches(
+    rows: Iterator[Optional[Dict[str, Any]]],
+    batch_size: int,
+    skip_rows: int,
+    stats: IngestStats,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Group rows into ``(end_row, rows)`` batches after skipping ``skip_rows``."""
+
+    batch: List[Dict[str, Any]] = []
+    position = 0
+    for row in rows:
+        position += 1
+        if position <= skip_rows:
+            continue
+        stats.rows_read += 1
+        if row is None:
+            stats.rows_skipped += 1
+        else:
+            batch.append(row)
+        if len(batch) >= batch_size:
+            yield position, batch
+            batch = []
+    if batch or position > skip_rows:
+        yield position, batch
+
+
+async def ingest_file(
+    client: Neo4jClient,
+    path: str,
+    fmt: Optional[str] = None,
+    batch_size: int = 1000,
+    workers: int = 4,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = True,
+    progress_interval: float = 5.0,
+) -> IngestStats:
+    """
+    Stream ``path`` into Neo4j and return the run statistics.
+
+    Batches are produced by a single reader and written by ``workers``
+    concurrent sessions; the bounded queue between them keeps memory flat
+    regardless of input size. Batches finish out of order, so the
+    checkpoint only advances over the contiguous prefix of committed ones.
+    A failed batch stops the run and leaves the checkpoint before it.
+    """
+
+    fmt = fmt or detect_format(path)
+    checkpoint = Checkpoint(checkpoint_path or f"{path}.checkpoint.json", path)
+    stats = IngestStats()
+    if resume:
+        stats.rows_resumed = checkpoint.load()
+        if stats.rows_resumed:
+            logger.info("Resuming %s after row %d", path, stats.rows_resumed)
+
+    if not await client.ensure_constraints():
+        raise RuntimeError("Uniqueness constraints could not be created")
+
+    queue: "asyncio.Queue[Optional[Tuple[int, int, List[Dict[str, Any]]]]]" = asyncio.Queue(
+        maxsize=workers * 2
+    )
+    pending_ends: Dict[int, int] = {}
+    next_to_commit = 0
+    started = time.perf_counter()
+    last_report = started
+
+    def report(final: bool = False) -> None:
+        stats.elapsed = time.perf_counter() - started
+        logger.info(
+            "%s %d rows written, %d skipped, %.0f rows/s",
+            "Finished:" if final else "Progress:",
+            stats.rows_written,
+            stats.rows_skipped,
+            stats.rows_per_second,
+        )
+
+    def mark_committed(index: int, end_row: int) -> None:
+        nonlocal next_to_commit, last_report
+        pending_ends[index] = end_row
+        advanced = False
+        while next_to_commit in pending_ends:
+            end = pending_ends.pop(next_to_commit)
+            next_to_commit += 1
+            advanced = True
+        if advanced:
+            checkpoint.save(end)
+        now = time.perf_counter()
+        if now - last_report >= progress_interval:
+            last_report = now
+            report()
+
+    async def produce() -> None:
+        batches = _iter_batches(iter_rows(path, fmt), batch_size, stats.rows_resumed, stats)
+        index = 0
+        while True:
+            # File reading and JSON/CSV decoding run off the event loop.
+            item = await asyncio.to_thread(next, batches, None)
+            if item is None:
+                break
+            end_row, rows = item
+            await queue.put((index, end_row, rows))
+            index += 1
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, end_row, rows = item
+            if rows:
+                await client.merge_qa_batch(rows)
+                stats.rows_written += len(rows)
+            stats.batches += 1
+            mark_committed(index, end_row)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks.extend(asyncio.create_task(consume()) for _ in range(workers))
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        report()
+        logger.error("Ingestion stopped; rerun to resume after row %d", checkpoint.rows_done)
+        raise
+
+    checkpoint.clear()
+    report(final=True)
+    return stats
+
+
+def main() -> None:
+    """Run ingestion from the command line."""
+
+    parser = argparse.ArgumentParser(description="Bulk-load Q&A pairs into Neo4j")
+    parser.add_argument("path", help="JSONL or CSV file with question, answer and topic fields")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None)
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent write sessions")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <path>.checkpoint.json)")
+    parser.add_argument("--no-resume", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    if not all([settings.neo4j_uri, settings.neo4j_user, settings.neo4j_password]):
+        raise SystemExit("NEO4J_URI, NEO4J_USER and NEO4J_PASSWORD must be set")
+
+    async def run() -> None:
+        client = Neo4jClient(
+            uri=settings.neo4j_uri,
+            user=settings.neo4j_user,
+            password=settings.neo4j_password,
+        )
+        try:
+            await ingest_file(
+                client,
+                args.path,
+                fmt=args.format,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                checkpoint_path=args.checkpoint,
+                resume=not args.no_resume,
+                progress_interval=args.progress_interval,
+            )
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Recording is a couple of integer/float updates on plain Python objects with
+no locks: the backend records from the event loop thread, where these
+updates cannot interleave. Rendering reads the current values as-is.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Default latency buckets in seconds (1 ms to 30 s).
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a Prometheus label set such as ``{stage="rag"}``."""
+
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using Prometheus spellings for infinities."""
+
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Shared bookkeeping for labelled metric families."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values: str) -> "_Metric":
+        """Return the child metric for the given label values."""
+
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._new_child()
+            self._children[values] = child
+        return child
+
+    def _new_child(self) -> "_Metric":
+        """Create an unlabelled metric of the same kind for one label set."""
+
+        raise NotImplementedError
+
+    def _samples(self, labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...]) -> List[str]:
+        """Return the sample lines for this metric under the given labels."""
+
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Return the exposition lines for this metric family."""
+
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        if self.labelnames:
+            for values, child in list(self._children.items()):
+                lines.extend(child._samples(self.labelnames, values))
+        else:
+            lines.extend(self._samples((), ()))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the counter by ``amount``."""
+
+        self.value += amount
+
+    def _samples(self, labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...]) -> List[str]:
+        labels = _format_labels(labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the gauge by ``amount``."""
+
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease the gauge by ``amount``."""
+
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Set the gauge to ``value``."""
+
+        self.value = value
+
+    def _samples(self, labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...]) -> List[str]:
+        labels = _format_labels(labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(self.value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed upper-bound buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus the implicit +Inf bucket (non-cumulative).
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall-clock duration of the ``with`` block."""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def _samples(self, labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...]) -> List[str]:
+        lines: List[str] = []
+        cumulative = 0
+        counts = list(self.counts)
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        """Add ``metric`` unless a family with the same name exists."""
+
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register (or return the existing) counter ``name``."""
+
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Register (or return the existing) gauge ``name``."""
+
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        """Register (or return the existing) histogram ``name``."""
+
+        return self._register(  # type: ignore[return-value]
+            Histogram(name, documentation, labelnames, buckets or LATENCY_BUCKETS)
+        )
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+NEO4J_QUERY_SECONDS = REGISTRY.histogram(
+    "neo4j_query_seconds",
+    "Neo4j query latency by query kind.",
+    labelnames=("query",),
+)
+RAG_RANK_SECONDS = REGISTRY.histogram(
+    "rag_rank_seconds",
+    "Time spent embedding and ranking retrieval candidates.",
+)
+RAG_BUILD_CONTEXT_SECONDS = REGISTRY.histogram(
+    "rag_build_context_seconds",
+    "Total RAGService.build_context latency.",
+)
+RAG_CONTEXT_TOKENS = REGISTRY.histogram(
+    "rag_context_tokens",
+    "Estimated tokens in the assembled RAG context.",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+RAG_CONTEXT_TOKENS_SAVED = REGISTRY.counter(
+    "rag_context_tokens_saved_total",
+    "Estimated prompt tokens saved by budgeting, deduplication and truncation.",
+)
+RAG_STRATEGY_SECONDS = REGISTRY.histogram(
+    "rag_strategy_seconds",
+    "Latency of each retrieval strategy that finished within the deadline.",
+    labelnames=("strategy",),
+)
+RAG_STRATEGY_TIMEOUTS = REGISTRY.counter(
+    "rag_strategy_timeouts_total",
+    "Retrieval strategies abandoned at the retrieval deadline.",
+    labelnames=("strategy",),
+)
+RAG_STRATEGY_HEDGES = REGISTRY.counter(
+    "rag_strategy_hedges_total",
+    "Hedged second attempts started for slow retrieval strategies.",
+    labelnames=("strategy",),
+)
+RAG_DEADLINE_MISSES = REGISTRY.counter(
+    "rag_deadline_misses_total",
+    "Requests for which no retrieval strategy returned before the deadline.",
+)
+TOPIC_GRAPH_REFRESHES = REGISTRY.counter(
+    "topic_graph_refreshes_total",
+    "Topic graph snapshots loaded from Neo4j.",
+)
+TOPIC_GRAPH_ENTRIES = REGISTRY.gauge(
+    "topic_graph_entries",
+    "Question/answer entries in the current topic graph snapshot.",
+)
+RAG_EXECUTOR_PENDING = REGISTRY.gauge(
+    "rag_executor_pending",
+    "Retrieval jobs queued or running on the retrieval executor pool.",
+)
+DEEPSEEK_TTFT_SECONDS = REGISTRY.histogram(
+    "deepseek_time_to_first_token_seconds",
+    "Time from sending a DeepSeek request to its first content token.",
+)
+DEEPSEEK_INTER_TOKEN_SECONDS = REGISTRY.histogram(
+    "deepseek_inter_token_seconds",
+    "Gap between consecutive DeepSeek content tokens.",
+)
+DEEPSEEK_STREAM_SECONDS = REGISTRY.histogram(
+    "deepseek_stream_duration_seconds",
+    "Duration of a full DeepSeek answer stream.",
+)
+ANSWER_STREAMS_ACTIVE = REGISTRY.gauge(
+    "answer_streams_active",
+    "Resumable answer streams held in the registry.",
+)
+ANSWER_STREAM_REPLAY_CHARS = REGISTRY.gauge(
+    "answer_stream_replay_chars",
+    "Characters held in answer stream replay buffers.",
+)
+ANSWER_STREAM_EVICTIONS = REGISTRY.counter(
+    "answer_stream_evictions_total",
+    "Answer streams dropped from the registry, by reason.",
+    labelnames=("reason",),
+)
+ANSWER_STREAM_RESUMES = REGISTRY.counter(
+    "answer_stream_resumes_total",
+    "Resume requests by outcome.",
+    labelnames=("result",),
+)
+ANSWER_CACHE_HITS = REGISTRY.counter(
+    "answer_cache_hits_total",
+    "Answer cache lookups served from the memory or SQLite tier.",
+)
+ANSWER_CACHE_MISSES = REGISTRY.counter(
+    "answer_cache_misses_total",
+    "Answer cache lookups that found no unexpired answer.",
+)
+ANSWER_CACHE_ENTRIES = REGISTRY.gauge(
+    "answer_cache_entries",
+    "Answers held in the in-memory answer cache tier.",
+)
+CONVERSATIONS_ACTIVE = REGISTRY.gauge(
+    "conversations_active",
+    "Conversation histories held in memory.",
+)
+CONVERSATION_MEMORY_TOKENS = REGISTRY.gauge(
+    "conversation_memory_tokens",
+    "Estimated tokens held across in-memory conversation histories.",
+)
+CONVERSATION_EVICTIONS = REGISTRY.counter(
+    "conversation_evictions_total",
+    "Conversation histories dropped from memory, by reason.",
+    labelnames=("reason",),
+)
+BATCH_QUESTIONS = REGISTRY.counter(
+    "batch_questions_total",
+    "Batch answer questions by outcome (answered, cached, deduplicated or failed).",
+    labelnames=("outcome",),
+)
+BATCH_JOBS_ACTIVE = REGISTRY.gauge(
+    "batch_jobs_active",
+    "Background batch answer jobs still running.",
+)
+WEBSOCKET_CONNECTIONS = REGISTRY.gauge(
+    "websocket_connections_active",
+    "Open /ws/chat connections.",
+)
+DEEPSEEK_STREAMS_IN_FLIGHT = REGISTRY.gauge(
+    "deepseek_streams_in_flight",
+    "Upstream DeepSeek streams currently open.",
+)
+DEEPSEEK_TOKENS = REGISTRY.counter(
+    "deepseek_tokens_streamed_total",
+    "Content deltas received from DeepSeek.",
+)
+DEEPSEEK_HEDGES = REGISTRY.counter(
+    "deepseek_hedges_total",
+    "Hedged second DeepSeek requests sent after DEEPSEEK_HEDGE_MS without response headers.",
+)
+DEEPSEEK_USAGE_TOKENS = REGISTRY.counter(
+    "deepseek_usage_tokens_total",
+    "Token usage reported by DeepSeek, by kind (prompt or completion).",
+    labelnames=("kind",),
+)
+DEEPSEEK_FINISH_REASONS = REGISTRY.counter(
+    "deepseek_finish_reasons_total",
+    "Completed DeepSeek choices by finish reason.",
+    labelnames=("reason",),
+)
+ERRORS = REGISTRY.counter(
+    "errors_total",
+    "Errors by pipeline stage.",
+    labelnames=("stage",),
+)
@@ -2,23 +2,100 @@ from __future__ import annotations
 
 """Async Neo4j client utilities for knowledge graph access."""
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from neo4j import AsyncGraphDatabase, AsyncDriver
 
+from backend.utils.metrics import ERRORS, NEO4J_QUERY_SECONDS, TOPIC_GRAPH_ENTRIES, TOPIC_GRAPH_REFRESHES
+from backend.utils.topic_graph import TopicGraph
+from backend.utils.tracing import trace_span
+
 
 logger = logging.getLogger(__name__)
 
+# Managed full-text indexes: (index name, node label, property).
+FULLTEXT_INDEXES = (
+    ("question_text_fulltext", "Question", "text"),
+    ("answer_text_fulltext", "Answer", "text"),
+    ("topic_name_fulltext", "Topic", "name"),
+)
+
+# Uniqueness constraints backing MERGE lookups: (constraint name, label, property).
+# Answers are merged through their question, so they need no constraint of
+# their own (full answer texts can also exceed the index key size).
+UNIQUENESS_CONSTRAINTS = (
+    ("topic_name_unique", "Topic", "name"),
+    ("question_text_unique", "Question", "text"),
+)
+
+# Constraints created by earlier versions that are dropped on sight.
+OBSOLETE_CONSTRAINTS = ("answer_text_unique",)
+
+_MERGE_QA_BATCH = """
+UNWIND $rows AS row
+MERGE (q:Question {text: row.question})
+MERGE (q)-[:HAS_ANSWER]->(:Answer {text: row.answer})
+FOREACH (name IN CASE WHEN row.topic IS NULL THEN [] ELSE [row.topic] END |
+    MERGE (t:Topic {name: name})
+    MERGE (t)-[:HAS_QUESTION]->(q)
+)
+"""
+
+# Node and relationship counts, answered from the count store without a scan.
+_GRAPH_VERSION_PROBE = """
+CALL { MATCH (t:Topic) RETURN count(t) AS topics }
+CALL { MATCH (q:Question) RETURN count(q) AS questions }
+CALL { MATCH (a:Answer) RETURN count(a) AS answers }
+CALL { MATCH ()-[r:HAS_QUESTION]->() RETURN count(r) AS topic_links }
+CALL { MATCH ()-[r:HAS_ANSWER]->() RETURN count(r) AS answer_links }
+RETURN topics, questions, answers, topic_links, answer_links
+"""
+
+_LUCENE_SPECIAL_CHARS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+
+
+def build_fulltext_query(text: str) -> str:
+    """
+    Turn free user text into a safe Lucene query string.
+
+    Lucene operators are escaped and the text is lowercased so words such as
+    ``AND`` or ``NOT`` are treated as plain terms; the default OR semantics
+    then match on any individual term instead of the whole sentence.
+    """
+
+    return _LUCENE_SPECIAL_CHARS.sub(r"\\\1", text.lower()).strip()
+
 
 class Neo4jClient:
-    """Async Neo4j client handling connection and common queries."""
+    """
+    Async Neo4j client handling connection and common queries.
+
+    The client can also keep a :class:`TopicGraph` snapshot of the topic
+    adjacency (see :meth:`refresh_topic_graph`). The snapshot is replaced
+    as a whole, so readers of :attr:`topic_graph` never wait on Neo4j.
+    Callbacks registered with :meth:`add_graph_change_listener` run after
+    each background refresh that replaced the snapshot, so other
+    in-process copies of the graph can follow the same change probe.
+    """
 
     def __init__(self, uri: str, user: str, password: str) -> None:
         self._uri = uri
         self._user = user
         self._password = password
         self._driver: Optional[AsyncDriver] = None
+        self._topic_graph: Optional[TopicGraph] = None
+        self._topic_graph_lock = asyncio.Lock()
+        self._topic_graph_task: Optional[asyncio.Task] = None
+        self._change_listeners: List[Callable[[], Awaitable[Any]]] = []
+
+    @property
+    def topic_graph(self) -> Optional[TopicGraph]:
+        """Return the current topic adjacency snapshot, if one was loaded."""
+
+        return self._topic_graph
 
     async def _get_driver(self) -> AsyncDriver:
         """Create or return the cached AsyncDriver instance."""
@@ -32,12 +109,211 @@ class Neo4jClient:
         return self._driver
 
     async def close(self) -> None:
-        """Close the underlying driver if it was initialized."""
+        """Stop the topic graph refresh and close the driver if it was initialized."""
 
+        if self._topic_graph_task is not None:
+            self._topic_graph_task.cancel()
+            try:
+                await self._topic_graph_task
+            except asyncio.CancelledError:
+                pass
+            self._topic_graph_task = None
         if self._driver is not None:
             await self._driver.close()
             self._driver = None
 
+    async def ensure_fulltext_indexes(self) -> bool:
+        """
+        Create the managed full-text indexes if they do not exist yet.
+
+        Safe to call on every startup. Returns ``True`` if all indexes are in
+        place, ``False`` if creating any of them failed.
+        """
+
+        driver = await self._get_driver()
+        try:
+            async with driver.session() as session:
+                for name, label, prop in FULLTEXT_INDEXES:
+                    result = await session.run(
+                        f"CREATE FULLTEXT INDEX {name} IF NOT EXISTS "
+                        f"FOR (n:{label}) ON EACH [n.{prop}]"
+                    )
+                    await result.consume()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Error creating Neo4j full-text indexes: %s", exc)
+            return False
+        logger.info("Neo4j full-text indexes are in place")
+        return True
+
+    async def ensure_constraints(self) -> bool:
+        """
+        Create uniqueness constraints on topic names and question text.
+
+        The constraints give MERGE an index to look nodes up by, which bulk
+        ingestion depends on; answers are found through their question.
+        Creation fails if existing data already holds duplicates. Returns
+        ``True`` if all constraints are in place.
+        """
+
+        driver = await self._get_driver()
+        try:
+            async with driver.session() as session:
+                for name in OBSOLETE_CONSTRAINTS:
+                    result = await session.run(f"DROP CONSTRAINT {name} IF EXISTS")
+                    await result.consume()
+                for name, label, prop in UNIQUENESS_CONSTRAINTS:
+                    result = await session.run(
+                        f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+                        f"FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+                    )
+                    await result.consume()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Error creating Neo4j uniqueness constraints: %s", exc)
+            return False
+        logger.info("Neo4j uniqueness constraints are in place")
+        return True
+
+    async def merge_qa_batch(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Upsert a batch of topic/question/answer rows in one write transaction.
+
+        Each row has ``question`` and ``answer`` text and an optional
+        ``topic``. An answer is merged among its question's answers only, so
+        identical answers to different questions stay separate nodes. The
+        transaction is retried by the driver on transient errors such as
+        lock deadlocks between concurrent batches; other errors are raised.
+        """
+
+        driver = await self._get_driver()
+
+        async def write(tx: Any) -> None:
+            result = await tx.run(_MERGE_QA_BATCH, rows=rows)
+            await result.consume()
+
+        with NEO4J_QUERY_SECONDS.labels("merge_batch").time():
+            try:
+                async with driver.session() as session:
+                    await session.execute_write(write)
+            except Exception:
+                ERRORS.labels("neo4j").inc()
+                raise
+
+    async def search_fulltext_qa(
+        self,
+        query: str,
+        limit: int = 20,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch question/answer pairs matching the query via full-text indexes.
+
+        Questions, answers and topic names are searched through
+        ``db.index.fulltext.queryNodes``, so the cost depends on the number of
+        matches rather than on graph size. Each record carries a relevance
+        ``score`` (best score across the three indexes), highest first.
+
+        Returns ``None`` if the indexes cannot be queried, so callers can fall
+        back to :meth:`get_related_qa`.
+        """
+
+        lucene_query = build_fulltext_query(query)
+        if not lucene_query:
+            return []
+
+        driver = await self._get_driver()
+        cypher = """
+        CALL {
+            CALL db.index.fulltext.queryNodes('question_text_fulltext', $query)
+            YIELD node, score
+            WITH node, score LIMIT $limit
+            MATCH (node)-[:HAS_ANSWER]->(a:Answer)
+            OPTIONAL MATCH (t:Topic)-[:HAS_QUESTION]->(node)
+            RETURN node AS q, a, t, score
+            UNION ALL
+            CALL db.index.fulltext.queryNodes('answer_text_fulltext', $query)
+            YIELD node, score
+            WITH node, score LIMIT $limit
+            MATCH (q:Question)-[:HAS_ANSWER]->(node)
+            OPTIONAL MATCH (t:Topic)-[:HAS_QUESTION]->(q)
+            RETURN q, node AS a, t, score
+            UNION ALL
+            CALL db.index.fulltext.queryNodes('topic_name_fulltext', $query)
+            YIELD node, score
+            WITH node, score LIMIT $limit
+            MATCH (node)-[:HAS_QUESTION]->(q:Question)-[:HAS_ANSWER]->(a:Answer)
+            RETURN q, a, node AS t, score
+        }
+        WITH q, a, head(collect(t.name)) AS topic, max(score) AS score
+        RETURN topic, q.text AS question, a.text AS answer, score
+        ORDER BY score DESC
+        LIMIT $limit
+        """
+
+        records: List[Dict[str, Any]] = []
+        with NEO4J_QUERY_SECONDS.labels("fulltext").time(), trace_span("neo4j.fulltext"):
+            try:
+                async with driver.session() as session:
+                    result = await session.run(cypher, query=lucene_query, limit=limit)
+                    async for record in result:
+                        records.append(record.data())
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error querying Neo4j full-text indexes: %s", exc)
+                ERRORS.labels("neo4j").inc()
+                return None
+        return records
+
+    async def get_topic_neighbourhood_qa(
+        self,
+        query: str,
+        limit: int = 20,
+        seeds: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch question/answer pairs from the topics around the query.
+
+        Up to ``seeds`` best full-text matches among questions and topic
+        names select a set of topics; every question under those topics is
+        returned through ``Topic-[:HAS_QUESTION]->Question``, so related
+        entries that share no words with the query are found as well.
+        Returns an empty list if the indexes cannot be queried.
+        """
+
+        lucene_query = build_fulltext_query(query)
+        if not lucene_query:
+            return []
+
+        driver = await self._get_driver()
+        cypher = """
+        CALL {
+            CALL db.index.fulltext.queryNodes('question_text_fulltext', $query)
+            YIELD node, score
+            WITH node, score LIMIT $seeds
+            MATCH (t:Topic)-[:HAS_QUESTION]->(node)
+            RETURN t, score
+            UNION ALL
+            CALL db.index.fulltext.queryNodes('topic_name_fulltext', $query)
+            YIELD node, score
+            WITH node, score LIMIT $seeds
+            RETURN node AS t, score
+        }
+        WITH t, max(score) AS score
+        MATCH (t)-[:HAS_QUESTION]->(q:Question)-[:HAS_ANSWER]->(a:Answer)
+        RETURN t.name AS topic, q.text AS question, a.text AS answer, score
+        ORDER BY score DESC
+        LIMIT $limit
+        """
+
+        records: List[Dict[str, Any]] = []
+        with NEO4J_QUERY_SECONDS.labels("topic_neighbourhood").time(), trace_span("neo4j.topic_neighbourhood"):
+            try:
+                async with driver.session() as session:
+                    result = await session.run(cypher, query=lucene_query, limit=limit, seeds=seeds)
+                    async for record in result:
+                        records.append(record.data())
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error querying Neo4j topic neighbourhood: %s", exc)
+                ERRORS.labels("neo4j").inc()
+        return records
+
     async def get_related_qa(
         self,
         query: str,
@@ -46,8 +322,10 @@ class Neo4jClient:
         """
         Fetch candidate question/answer pairs related to the query.
 
-        This uses a simple CONTAINS filter over question and answer text.
-        The RAG layer will further re-rank these candidates using embeddings.
+        This uses a simple CONTAINS filter over question and answer text and
+        therefore scans every node; it is kept as the fallback for
+        :meth:`search_fulltext_qa`. The RAG layer will further re-rank these
+        candidates using embeddings.
         """
 
         driver = await self._get_driver()
@@ -62,15 +340,156 @@ class Neo4jClient:
         """
 
         records: List[Dict[str, Any]] = []
-        try:
-            async with driver.session() as session:
-                result = await session.run(cypher, query=query, limit=limit)
-                async for record in result:
-                    records.append(record.data())
-        except Exception as exc:  # noqa: BLE001
-            logger.error("Error querying Neo4j: %s", exc)
+        with NEO4J_QUERY_SECONDS.labels("contains").time(), trace_span("neo4j.contains"):
+            try:
+                async with driver.session() as session:
+                    result = await session.run(cypher, query=query, limit=limit)
+                    async for record in result:
+                        records.append(record.data())
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error querying Neo4j: %s", exc)
+                ERRORS.labels("neo4j").inc()
         return records
 
+    async def get_all_qa(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch every question/answer pair with its topic and a stable id.
+
+        Used to (re)build in-process indexes; the id combines the element ids
+        of the question and answer nodes. Returns ``None`` if the query
+        fails, so callers can tell an empty graph from an unreachable one.
+        """
+
+        driver = await self._get_driver()
+        cypher = """
+        MATCH (q:Question)-[:HAS_ANSWER]->(a:Answer)
+        OPTIONAL MATCH (t:Topic)-[:HAS_QUESTION]->(q)
+        WITH q, a, head(collect(t.name)) AS topic
+        RETURN elementId(q) + '|' + elementId(a) AS id,
+               topic, q.text AS question, a.text AS answer
+        """
+
+        records: List[Dict[str, Any]] = []
+        with NEO4J_QUERY_SECONDS.labels("all_qa").time(), trace_span("neo4j.all_qa"):
+            try:
+                async with driver.session() as session:
+                    result = await session.run(cypher)
+                    async for record in result:
+                        records.append(record.data())
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error loading Q&A entries from Neo4j: %s", exc)
+                ERRORS.labels("neo4j").inc()
+                return None
+        return records
+
+    async def probe_graph_version(self) -> Optional[Tuple[int, ...]]:
+        """
+        Return node and relationship counts of the Q&A graph as a cheap version.
+
+        The counts come from the database's count store, so the probe costs
+        the same regardless of graph size. Returns ``None`` on failure.
+        """
+
+        driver = await self._get_driver()
+        with NEO4J_QUERY_SECONDS.labels("version_probe").time():
+            try:
+                async with driver.session() as session:
+                    result = await session.run(_GRAPH_VERSION_PROBE)
+                    record = await result.single()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error probing Neo4j graph version: %s", exc)
+                ERRORS.labels("neo4j").inc()
+                return None
+        return tuple(record.values()) if record is not None else None
+
+    async def get_topic_graph_records(self) -> Optional[List[Dict[str, Any]]]:
+        """Fetch every topic/question/answer path, or ``None`` on failure."""
+
+        driver = await self._get_driver()
+        cypher = """
+        MATCH (t:Topic)-[:HAS_QUESTION]->(q:Question)-[:HAS_ANSWER]->(a:Answer)
+        RETURN t.name AS topic, q.text AS question, a.text AS answer
+        """
+
+        records: List[Dict[str, Any]] = []
+        with NEO4J_QUERY_SECONDS.labels("topic_graph").time():
+            try:
+                async with driver.session() as session:
+                    result = await session.run(cypher)
+                    async for record in result:
+                        records.append(record.data())
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Error loading the topic graph from Neo4j: %s", exc)
+                ERRORS.labels("neo4j").inc()
+                return None
+        return records
+
+    async def refresh_topic_graph(self, max_age: Optional[float] = None, force: bool = False) -> bool:
+        """
+        Reload the topic graph snapshot if the graph changed.
+
+        The graph is re-read when there is no snapshot yet, when ``force``
+        is set, when :meth:`probe_graph_version` differs from the snapshot's
+        version, or when the snapshot is older than ``max_age`` seconds
+        (edits that keep all counts unchanged are only picked up this way).
+        The new snapshot is built off the event loop and swapped in with a
+        single assignment. Returns ``True`` if the snapshot was replaced.
+        """
+
+        async with self._topic_graph_lock:
+            current = self._topic_graph
+            version = await self.probe_graph_version()
+            if current is not None and not force:
+                if version is None:
+                    return False
+                expired = max_age is not None and current.age >= max_age
+                if version == current.version and not expired:
+                    return False
+
+            records = await self.get_topic_graph_records()
+            if records is None:
+                return False
+            graph = await asyncio.to_thread(TopicGraph.from_records, records, version)
+            self._topic_graph = graph
+
+        TOPIC_GRAPH_REFRESHES.inc()
+        TOPIC_GRAPH_ENTRIES.set(len(graph))
+        logger.info(
+            "Topic graph snapshot loaded with %d topics and %d entries",
+            len(graph.topics),
+            len(graph),
+        )
+        return True
+
+    def add_graph_change_listener(self, listener: Callable[[], Awaitable[Any]]) -> None:
+        """Await ``listener()`` after each background refresh that found the graph changed."""
+
+        self._change_listeners.append(listener)
+
+    def start_topic_graph_refresh(self, interval: float, max_age: Optional[float] = None) -> None:
+        """Probe for graph changes every ``interval`` seconds in the background."""
+
+        if self._topic_graph_task is None:
+            self._topic_graph_task = asyncio.create_task(self._refresh_topic_graph_loop(interval, max_age))
+
+    async def _refresh_topic_graph_loop(self, interval: float, max_age: Optional[float]) -> None:
+        """Run :meth:`refresh_topic_graph` periodically until cancelled."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                changed = await self.refresh_topic_graph(max_age=max_age)
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Topic graph refresh failed: %s", exc)
+                continue
+            if not changed:
+                continue
+            for listener in self._change_listeners:
+                try:
+                    await listener()
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("Graph change listener failed: %s", exc)
+
 
 async def init_demo_data(client: Neo4jClient) -> None:
     """
@@ -84,21 +503,18 @@ async def init_demo_data(client: Neo4jClient) -> None:
     cypher = """
     MERGE (t1:Topic {name: 'Linear Algebra'})
     MERGE (q1:Question {text: 'What is a matrix?'})
-    MERGE (a1:Answer {text: 'A matrix is a rectangular array of numbers arranged in rows and columns.'})
     MERGE (t1)-[:HAS_QUESTION]->(q1)
-    MERGE (q1)-[:HAS_ANSWER]->(a1)
+    MERGE (q1)-[:HAS_ANSWER]->(:Answer {text: 'A matrix is a rectangular array of numbers arranged in rows and columns.'})
 
     MERGE (t2:Topic {name: 'Calculus'})
     MERGE (q2:Question {text: 'What is a derivative?'})
-    MERGE (a2:Answer {text: 'A derivative measures how a function changes as its input changes.'})
     MERGE (t2)-[:HAS_QUESTION]->(q2)
-    MERGE (q2)-[:HAS_ANSWER]->(a2)
+    MERGE (q2)-[:HAS_ANSWER]->(:Answer {text: 'A derivative measures how a function changes as its input changes.'})
 
     MERGE (t3:Topic {name: 'Machine Learning'})
     MERGE (q3:Question {text: 'What is supervised learning?'})
-    MERGE (a3:Answer {text: 'Supervised learning uses labeled data to train a model to make predictions.'})
     MERGE (t3)-[:HAS_QUESTION]->(q3)
-    MERGE (q3)-[:HAS_ANSWER]->(a3)
+    MERGE (q3)-[:HAS_ANSWER]->(:Answer {text: 'Supervised learning uses labeled data to train a model to make predictions.'})
     """
 
     try:
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+"""Server-issued client session tokens."""
+
+import hashlib
+import hmac
+import secrets
+from typing import Optional, Tuple
+
+
+class SessionTokens:
+    """
+    Issue and verify opaque session tokens for chat clients.
+
+    A token is a random session id followed by its HMAC under the server
+    ``secret``, so clients cannot pick their own ids or forge another
+    client's. Without a configured secret a random one is used, and tokens
+    stop verifying after a restart (clients are simply issued new ones).
+    """
+
+    def __init__(self, secret: Optional[str] = None) -> None:
+        self._secret = (secret or secrets.token_hex(32)).encode("utf-8")
+
+    def issue(self) -> str:
+        """Return a new session token."""
+
+        session_id = secrets.token_urlsafe(24)
+        return f"{session_id}.{self._sign(session_id)}"
+
+    def verify(self, token: Optional[str]) -> Optional[str]:
+        """Return the session id of a valid ``token``, else ``None``."""
+
+        if not token or "." not in token:
+            return None
+        session_id, signature = token.rsplit(".", 1)
+        expected = self._sign(session_id).encode("utf-8")
+        if not session_id or not hmac.compare_digest(signature.encode("utf-8"), expected):
+            return None
+        return session_id
+
+    def session_for(self, token: Optional[str]) -> Tuple[str, str]:
+        """Return ``(token, session_id)`` for a valid ``token``, or for a newly issued one."""
+
+        session_id = self.verify(token)
+        if token is not None and session_id is not None:
+            return token, session_id
+        token = self.issue()
+        return token, token.rsplit(".", 1)[0]
+
+    def _sign(self, session_id: str) -> str:
+        """Return the hex HMAC-SHA256 of ``session_id``."""
+
+        return hmac.new(self._secret, session_id.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def scoped_key(session_id: str, key: str) -> str:
+    """Combine a session id and a client-chosen key into a key private to that session."""
+
+    return hashlib.sha256(f"{session_id}\x00{key}".encode("utf-8")).hexdigest()
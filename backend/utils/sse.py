@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+"""
+Incremental decoding of ``text/event-stream`` responses.
+
+:class:`SSEDecoder` consumes raw network chunks and returns the ``data``
+payload of every completed event as ``bytes``, so callers can hand them
+straight to a JSON parser without an intermediate ``str`` per line.
+"""
+
+import json
+from typing import Any, Callable, List
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Parses a JSON document from bytes; orjson is used when it is installed.
+loads_json: Callable[[bytes], Any] = orjson.loads if orjson is not None else json.loads
+
+_CARRIAGE_RETURN = 0x0D
+_SPACE = 0x20
+
+
+class SSEDecoder:
+    """
+    Split a byte stream into server-sent events.
+
+    Lines may end in ``\\n`` or ``\\r\\n``. Comment lines (starting with
+    ``:``) and fields other than ``data`` are skipped; multiple ``data``
+    lines in one event are joined with ``\\n`` as the SSE spec requires. An
+    event is complete at the blank line that terminates it. Incomplete
+    lines stay in a reusable buffer until more bytes arrive.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Add ``chunk`` and return the payloads of events it completes."""
+
+        buffer = self._buffer
+        buffer += chunk
+        events: List[bytes] = []
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            end = newline
+            if end > start and buffer[end - 1] == _CARRIAGE_RETURN:
+                end -= 1
+            if end == start:
+                if self._data:
+                    events.append(self._take_event())
+            elif buffer.startswith(b"data:", start):
+                value_start = start + 5
+                if value_start < end and buffer[value_start] == _SPACE:
+                    value_start += 1
+                self._data.append(bytes(buffer[value_start:end]))
+            start = newline + 1
+        if start:
+            del buffer[:start]
+        return events
+
+    def flush(self) -> List[bytes]:
+        """Return a final event left unterminated when the stream ended."""
+
+        if self._buffer:
+            self.feed(b"\n")
+        return [self._take_event()] if self._data else []
+
+    def _take_event(self) -> bytes:
+        """Return the pending ``data`` lines as one payload and reset them."""
+
+        data = self._data
+        self._data = []
+        return data[0] if len(data) == 1 else b"\n".join(data)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+"""Immutable in-memory snapshot of the topic/question/answer graph."""
+
+import math
+import sys
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.utils.embedding_utils import tokenize
+
+
+# Match weight of a query term found in a topic name, relative to one found
+# only in the topic's questions.
+TOPIC_NAME_WEIGHT = 2.0
+
+
+class TopicGraph:
+    """
+    Compact read-only copy of the topic/question/answer adjacency.
+
+    Topic names, question and answer texts are interned and stored once;
+    adjacency is held in integer arrays. Entry ``e`` is the pair
+    ``(questions[entry_questions[e]], answers[entry_answers[e]])`` and the
+    entries of topic ``t`` are ``topic_entries[topic_offsets[t]:topic_offsets[t + 1]]``.
+
+    Snapshots are never modified after construction, so a reader holding
+    one is unaffected when the owner swaps in a newer snapshot.
+    """
+
+    def __init__(
+        self,
+        topics: List[str],
+        questions: List[str],
+        answers: List[str],
+        entry_questions: np.ndarray,
+        entry_answers: np.ndarray,
+        topic_offsets: np.ndarray,
+        topic_entries: np.ndarray,
+        term_topics: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        version: Optional[Hashable] = None,
+    ) -> None:
+        self._topics = topics
+        self._topic_ids = {name: index for index, name in enumerate(topics)}
+        self._questions = questions
+        self._answers = answers
+        self._entry_questions = entry_questions
+        self._entry_answers = entry_answers
+        self._topic_offsets = topic_offsets
+        self._topic_entries = topic_entries
+        self._term_topics = term_topics
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        version: Optional[Hashable] = None,
+    ) -> "TopicGraph":
+        """Build a snapshot from ``topic``/``question``/``answer`` records."""
+
+        topic_ids: Dict[str, int] = {}
+        question_ids: Dict[str, int] = {}
+        answer_ids: Dict[str, int] = {}
+        entry_ids: Dict[Tuple[int, int], int] = {}
+        links: Dict[Tuple[int, int], None] = {}
+
+        for record in records:
+            topic, question, answer = record.get("topic"), record.get("question"), record.get("answer")
+            if not topic or not question or not answer:
+                continue
+            topic_id = topic_ids.setdefault(sys.intern(topic), len(topic_ids))
+            question_id = question_ids.setdefault(sys.intern(question), len(question_ids))
+            answer_id = answer_ids.setdefault(sys.intern(answer), len(answer_ids))
+            entry_id = entry_ids.setdefault((question_id, answer_id), len(entry_ids))
+            links[(topic_id, entry_id)] = None
+
+        pairs = np.asarray(list(entry_ids), dtype=np.int32).reshape(-1, 2)
+        edges = np.asarray(list(links), dtype=np.int32).reshape(-1, 2)
+        order = np.argsort(edges[:, 0], kind="stable")
+        counts = np.bincount(edges[:, 0], minlength=len(topic_ids))
+        topic_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        topic_entries = edges[order, 1]
+
+        topics = list(topic_ids)
+        questions = list(question_ids)
+        term_weights: Dict[str, Dict[int, float]] = {}
+        for topic_id, name in enumerate(topics):
+            for token in tokenize(name):
+                term_weights.setdefault(token, {})[topic_id] = TOPIC_NAME_WEIGHT
+        for topic_id, entry_id in edges.tolist():
+            for token in tokenize(questions[pairs[entry_id, 0]]):
+                term_weights.setdefault(token, {}).setdefault(topic_id, 1.0)
+
+        # Terms shared by many topics say little about any of them.
+        term_topics: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for token, weights in term_weights.items():
+            idf = math.log(1.0 + len(topics) / len(weights))
+            term_topics[sys.intern(token)] = (
+                np.fromiter(weights.keys(), dtype=np.int32, count=len(weights)),
+                np.fromiter(weights.values(), dtype=np.float32, count=len(weights)) * idf,
+            )
+
+        return cls(
+            topics=topics,
+            questions=questions,
+            answers=list(answer_ids),
+            entry_questions=np.ascontiguousarray(pairs[:, 0]),
+            entry_answers=np.ascontiguousarray(pairs[:, 1]),
+            topic_offsets=topic_offsets,
+            topic_entries=np.ascontiguousarray(topic_entries),
+            term_topics=term_topics,
+            version=version,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entry_questions)
+
+    @property
+    def topics(self) -> List[str]:
+        """Return the topic names."""
+
+        return self._topics
+
+    @property
+    def version(self) -> Optional[Hashable]:
+        """Return the graph version probe this snapshot was built for."""
+
+        return self._version
+
+    @property
+    def age(self) -> float:
+        """Return the seconds since this snapshot was built."""
+
+        return time.monotonic() - self._loaded_at
+
+    def expand_topics(self, topics: Sequence[str], limit: int = 20) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` Q&A records under the named topics, in order."""
+
+        topic_ids = [self._topic_ids[name] for name in topics if name in self._topic_ids]
+        return self._records(topic_ids, [0.0] * len(topic_ids), limit)
+
+    def match_topics(self, query: str, seeds: int = 5) -> List[Tuple[str, float]]:
+        """
+        Rank up to ``seeds`` topics by the query terms in their names or questions.
+
+        Terms are weighted by inverse topic frequency, and terms in the topic
+        name count :data:`TOPIC_NAME_WEIGHT` times as much.
+        """
+
+        scores = np.zeros(len(self._topics), dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self._term_topics.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        touched = np.flatnonzero(scores)
+        if seeds < len(touched):
+            touched = touched[np.argpartition(scores[touched], -seeds)[-seeds:]]
+        best = touched[np.argsort(-scores[touched], kind="stable")]
+        return [(self._topics[index], float(scores[index])) for index in best]
+
+    def neighbourhood(self, query: str, limit: int = 20, seeds: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return Q&A records from the topics best matching ``query``.
+
+        The in-memory counterpart of
+        :meth:`~backend.utils.neo4j_client.Neo4jClient.get_topic_neighbourhood_qa`;
+        each record carries its topic's match ``score``.
+        """
+
+        matches = self.match_topics(query, seeds)
+        return self._records(
+            [self._topic_ids[name] for name, _ in matches],
+            [score for _, score in matches],
+            limit,
+        )
+
+    def _records(self, topic_ids: Sequence[int], scores: Sequence[float], limit: int) -> List[Dict[str, Any]]:
+        """Materialize the entries of ``topic_ids`` as records, skipping repeats."""
+
+        records: List[Dict[str, Any]] = []
+        seen = set()
+        for topic_id, score in zip(topic_ids, scores):
+            start, end = self._topic_offsets[topic_id], self._topic_offsets[topic_id + 1]
+            for entry_id in self._topic_entries[start:end].tolist():
+                if len(records) >= limit:
+                    return records
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                records.append(
+                    {
+                        "topic": self._topics[topic_id],
+                        "question": self._questions[self._entry_questions[entry_id]],
+                        "answer": self._answers[self._entry_answers[entry_id]],
+                        "score": score,
+                    }
+                )
+        return records
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+"""
+Request-scoped trace timelines with slow-request dumping.
+
+A :class:`RequestTrace` is bound to the current chat turn through a context
+variable, so code along the request path records spans with
+:func:`trace_span` without passing the trace around explicitly; tasks
+spawned during the turn inherit it. When no trace is active,
+:func:`trace_span` returns a shared no-op context manager.
+
+Turns slower than the configured threshold are written as one JSON line to
+a rotating log file, optionally with a sampled stack profile of the event
+loop thread collected while the turn was running.
+"""
+
+import contextvars
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from logging.handlers import RotatingFileHandler
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar(
+    "current_trace",
+    default=None,
+)
+_NULL_SPAN: ContextManager[None] = nullcontext()
+
+
+class RequestTrace:
+    """Timeline of spans and point events for one request."""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.finished: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.stack_samples: Optional[Counter[str]] = None
+
+    def _offset_ms(self, timestamp: float) -> float:
+        """Convert a ``perf_counter`` timestamp to ms since trace start."""
+
+        return round((timestamp - self.started) * 1000.0, 3)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[None]:
+        """Record the start and end of the ``with`` block as a span."""
+
+        started = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            yield
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            record: Dict[str, Any] = {
+                "name": name,
+                "start_ms": self._offset_ms(started),
+                "end_ms": self._offset_ms(time.perf_counter()),
+            }
+            if attributes:
+                record["attributes"] = attributes
+            if error is not None:
+                record["error"] = error
+            self.spans.append(record)
+
+    def mark(self, name: str, **attributes: Any) -> None:
+        """Record a point-in-time event."""
+
+        now = self._offset_ms(time.perf_counter())
+        record: Dict[str, Any] = {"name": name, "start_ms": now, "end_ms": now}
+        if attributes:
+            record["attributes"] = attributes
+        self.spans.append(record)
+
+    @property
+    def duration_ms(self) -> float:
+        """Return the elapsed time so far, or the total once finished."""
+
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000.0
+
+    def to_dict(self, top_stacks: int = 25) -> Dict[str, Any]:
+        """Return the JSON-serializable timeline."""
+
+        data: Dict[str, Any] = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_wall,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+        }
+        if self.stack_samples:
+            data["stack_samples"] = [
+                {"stack": stack, "count": count}
+                for stack, count in self.stack_samples.most_common(top_stacks)
+            ]
+        return data
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Return the trace bound to the current context, if any."""
+
+    return _current_trace.get()
+
+
+def trace_span(name: str, **attributes: Any) -> ContextManager[None]:
+    """Return a span context manager on the current trace (or a no-op)."""
+
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name, **attributes)
+
+
+def trace_mark(name: str, **attributes: Any) -> None:
+    """Record a point event on the current trace, if any."""
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(name, **attributes)
+
+
+class _StackSampler:
+    """
+    Background thread sampling the event loop thread's Python stack.
+
+    Each sample is added, as a collapsed ``file:function;...`` stack, to
+    every trace currently being profiled. Because the event loop interleaves
+    requests, samples describe what the loop was doing during the turn, not
+    only work done on behalf of that turn.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._target_thread_id = 0
+        self._traces: Set[RequestTrace] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, trace: RequestTrace) -> None:
+        """Start collecting samples of the calling thread into ``trace``."""
+
+        trace.stack_samples = Counter()
+        with self._lock:
+            self._target_thread_id = threading.get_ident()
+            self._traces.add(trace)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="trace-stack-sampler",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def remove(self, trace: RequestTrace) -> None:
+        """Stop collecting samples into ``trace``."""
+
+        with self._lock:
+            self._traces.discard(trace)
+
+    def _run(self) -> None:
+        """Sample until no traces remain, then exit."""
+
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._traces:
+                    self._thread = None
+                    return
+                traces = list(self._traces)
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            parts: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                frame = frame.f_back
+            stack = ";".join(reversed(parts))
+            for trace in traces:
+                if trace.stack_samples is not None:
+                    trace.stack_samples[stack] += 1
+
+
+class TraceRecorder:
+    """
+    Create request traces and dump the slow ones to a rotating file.
+
+    When disabled, :meth:`start` returns ``None`` and nothing is recorded.
+    ``profile_sample_rate`` is the fraction of traced requests that also
+    collect a stack profile every ``profile_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        slow_threshold_ms: float = 2000.0,
+        path: str = "slow_traces.log",
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+        profile_sample_rate: float = 0.0,
+        profile_interval: float = 0.005,
+    ) -> None:
+        self.enabled = enabled
+        self._slow_threshold_ms = slow_threshold_ms
+        self._profile_sample_rate = profile_sample_rate
+        self._sampler: Optional[_StackSampler] = None
+        self._file_logger: Optional[logging.Logger] = None
+        if not enabled:
+            return
+
+        if profile_sample_rate > 0:
+            self._sampler = _StackSampler(profile_interval)
+        file_logger = logging.getLogger("backend.slow_traces")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        if not file_logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            file_logger.addHandler(handler)
+        self._file_logger = file_logger
+
+    def start(self, name: str, **attributes: Any) -> Optional[RequestTrace]:
+        """Begin a trace and bind it to the current context."""
+
+        if not self.enabled:
+            return None
+        trace = RequestTrace(name, attributes)
+        _current_trace.set(trace)
+        if self._sampler is not None and random.random() < self._profile_sample_rate:
+            self._sampler.add(trace)
+        return trace
+
+    def finish(self, trace: Optional[RequestTrace]) -> None:
+        """End ``trace`` and dump it if it exceeded the slow threshold."""
+
+        if trace is None:
+            return
+        trace.finished = time.perf_counter()
+        if _current_trace.get() is trace:
+            _current_trace.set(None)
+        if self._sampler is not None:
+            self._sampler.remove(trace)
+        if trace.duration_ms < self._slow_threshold_ms or self._file_logger is None:
+            return
+        try:
+            self._file_logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Failed to write slow request trace: %s", exc)
+        logger.info(
+            "Slow request %s (%s) took %.0f ms; trace written",
+            trace.trace_id,
+            trace.name,
+            trace.duration_ms,
+        )
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+"""In-process vector index over knowledge graph question/answer entries."""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.utils.embedding_store import EmbeddingStore
+from backend.utils.embedding_utils import (
+    EMBEDDING_DIMENSION,
+    embed_texts,
+    top_k_by_similarity,
+    top_k_by_similarity_batch,
+)
+from backend.utils.neo4j_client import Neo4jClient
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_qa_snippet(item: Dict[str, Any]) -> str:
+    """Format a topic/question/answer record as a context snippet."""
+
+    topic = item.get("topic") or "General"
+    question = item.get("question") or ""
+    answer = item.get("answer") or ""
+    return f"Topic: {topic}\nQuestion: {question}\nAnswer: {answer}"
+
+
+def embed_entries(entries: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Embed Q&A records as formatted by :func:`format_qa_snippet`."""
+
+    return embed_texts(format_qa_snippet(entry) for entry in entries)
+
+
+class VectorIndex:
+    """
+    Dense embedding index kept as one contiguous float32 matrix.
+
+    Each entry is a record with ``id``, ``topic``, ``question`` and
+    ``answer`` keys. Rows are stored densely in insertion order; removals
+    move the last row into the freed slot so the live rows always form a
+    single ``[:size]`` slice that can be scored with one mat-vec product.
+
+    The matrix may also be a read-only view of an :class:`EmbeddingStore`
+    (see :meth:`load_from_store`); it is copied into memory on the first
+    modification.
+    """
+
+    def __init__(self, initial_capacity: int = 1024) -> None:
+        self._matrix = np.zeros(
+            (max(initial_capacity, 1), EMBEDDING_DIMENSION),
+            dtype=np.float32,
+        )
+        self._entries: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entry_id: object) -> bool:
+        return entry_id in self._rows
+
+    @property
+    def entries(self) -> List[Dict[str, Any]]:
+        """Return the indexed entries in row order."""
+
+        return self._entries
+
+    def _ensure_capacity(self, size: int) -> None:
+        """Grow the backing matrix geometrically to hold ``size`` rows."""
+
+        capacity = self._matrix.shape[0]
+        if size <= capacity and self._matrix.flags.writeable:
+            return
+        capacity = max(capacity, 1)
+        while capacity < size:
+            capacity *= 2
+        grown = np.zeros((capacity, EMBEDDING_DIMENSION), dtype=np.float32)
+        grown[: len(self._entries)] = self._matrix[: len(self._entries)]
+        self._matrix = grown
+
+    def add(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or replace entries, embedding them in one batch.
+
+        Entries whose ``id`` is already indexed are updated in place.
+        Returns the number of entries written.
+        """
+
+        batch = [entry for entry in entries if entry.get("id") is not None]
+        if not batch:
+            return 0
+
+        embeddings = embed_entries(batch)
+        self._ensure_capacity(len(self._entries) + len(batch))
+        for entry, embedding in zip(batch, embeddings):
+            row = self._rows.get(entry["id"])
+            if row is None:
+                row = len(self._entries)
+                self._entries.append(entry)
+                self._rows[entry["id"]] = row
+            else:
+                self._entries[row] = entry
+            self._matrix[row] = embedding
+        return len(batch)
+
+    def remove(self, entry_ids: Iterable[str]) -> int:
+        """Remove entries by id and return how many were present."""
+
+        removed = 0
+        for entry_id in entry_ids:
+            row = self._rows.pop(entry_id, None)
+            if row is None:
+                continue
+            last = len(self._entries) - 1
+            self._ensure_capacity(last + 1)
+            if row != last:
+                moved = self._entries[last]
+                self._entries[row] = moved
+                self._matrix[row] = self._matrix[last]
+                self._rows[moved["id"]] = row
+            self._entries.pop()
+            removed += 1
+        return removed
+
+    def sync(self, entries: Sequence[Dict[str, Any]]) -> int:
+        """
+        Make the index hold exactly ``entries`` and return how many were embedded.
+
+        Entries no longer present are removed; new or edited entries are
+        embedded and written. Unchanged entries keep their rows.
+        """
+
+        current = {entry["id"]: entry for entry in entries if entry.get("id") is not None}
+        stale = [entry_id for entry_id in self._rows if entry_id not in current]
+        changed = [
+            entry
+            for entry_id, entry in current.items()
+            if entry_id not in self._rows or self._entries[self._rows[entry_id]] != entry
+        ]
+        self.remove(stale)
+        return self.add(changed)
+
+    def copy(self) -> "VectorIndex":
+        """Return an independent, writable copy of the index."""
+
+        clone = VectorIndex(initial_capacity=len(self._entries))
+        clone._matrix[: len(self._entries)] = self._matrix[: len(self._entries)]
+        clone._entries = list(self._entries)
+        clone._rows = dict(self._rows)
+        return clone
+
+    def embeddings_for(self, entry_ids: Sequence[str]) -> Optional[np.ndarray]:
+        """Return the stored embedding rows for ``entry_ids``, or ``None`` if any is missing."""
+
+        rows = [self._rows.get(entry_id) for entry_id in entry_ids]
+        if any(row is None for row in rows):
+            return None
+        return self._matrix[rows]
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the ``top_k`` entries most similar to the query embedding."""
+
+        rankings = top_k_by_similarity(
+            query_embedding,
+            self._matrix[: len(self._entries)],
+            top_k,
+        )
+        return [(self._entries[idx], score) for idx, score in rankings]
+
+    def search_many(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int,
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Return the ``top_k`` entries for each row of ``query_matrix``, scored in batches."""
+
+        rankings = top_k_by_similarity_batch(
+            query_matrix,
+            self._matrix[: len(self._entries)],
+            top_k,
+        )
+        return [[(self._entries[idx], score) for idx, score in ranking] for ranking in rankings]
+
+    async def load_from_store(
+        self,
+        store: EmbeddingStore,
+        neo4j_client: Optional[Neo4jClient],
+    ) -> int:
+        """
+        Serve the index from a memory-mapped embedding store.
+
+        The store is opened (file I/O runs in a worker thread) and, when
+        the graph could be read, synced with it so only new or edited Q&A
+        entries are embedded. The index then reads the store's matrix in
+        place instead of holding its own copy.
+        """
+
+        await asyncio.to_thread(store.open)
+        if neo4j_client is not None:
+            entries = await neo4j_client.get_all_qa()
+            if entries is not None:
+                embedded = await asyncio.to_thread(store.sync, entries, embed_entries)
+                if embedded:
+                    logger.info("Embedded %d new entries into %s", embedded, store.path)
+        self.attach_store(store)
+        logger.info("Vector index mapped %d entries from %s", len(self), store.path)
+        return len(self)
+
+    def attach_store(self, store: EmbeddingStore) -> None:
+        """Serve the current contents of an opened store without copying them."""
+
+        self._entries = list(store.entries)
+        self._rows = {entry["id"]: row for row, entry in enumerate(self._entries)}
+        self._matrix = store.matrix
@@ -1,18 +1,35 @@
 let socket = null;
 let listeners = new Set();
+let reconnectListeners = new Set();
+let hasConnected = false;
 
 const WS_URL = 'ws://localhost:8000/ws/chat';
+const SESSION_KEY = 'deepseek_session';
+
+// Server-issued session token; conversations and answers are private to it.
+function sessionUrl() {
+  const token = localStorage.getItem(SESSION_KEY);
+  return token ? `${WS_URL}?session=${encodeURIComponent(token)}` : WS_URL;
+}
 
 function setupSocket() {
-  socket = new WebSocket(WS_URL);
+  socket = new WebSocket(sessionUrl());
 
   socket.onopen = () => {
     console.info('[WebSocket] Connected');
+    if (hasConnected) {
+      reconnectListeners.forEach((listener) => listener());
+    }
+    hasConnected = true;
   };
 
   socket.onmessage = (event) => {
     try {
       const data = JSON.parse(event.data);
+      if (data.type === 'session') {
+        localStorage.setItem(SESSION_KEY, data.session);
+        return;
+      }
       listeners.forEach((listener) => listener(data));
     } catch (error) {
       console.error('[WebSocket] Failed to parse message', error);
@@ -44,6 +61,14 @@ export function addMessageListener(listener) {
   };
 }
 
+// Called after the socket reconnects, e.g. to resume interrupted answers.
+export function addReconnectListener(listener) {
+  reconnectListeners.add(listener);
+  return () => {
+    reconnectListeners.delete(listener);
+  };
+}
+
 export function sendUserMessage(payload) {
   if (!socket || socket.readyState !== WebSocket.OPEN) {
     console.warn('[WebSocket] Not connected, cannot send message yet');
@@ -52,3 +77,17 @@ export function sendUserMessage(payload) {
   socket.send(JSON.stringify(payload));
 }
 
+
+export function sendCancel(messageId) {
+  if (!socket || socket.readyState !== WebSocket.OPEN) {
+    return;
+  }
+  socket.send(JSON.stringify({ type: 'cancel', message_id: messageId }));
+}
+
+export function sendResume(messageId, offset) {
+  if (!socket || socket.readyState !== WebSocket.OPEN) {
+    return;
+  }
+  socket.send(JSON.stringify({ type: 'resume', message_id: messageId, offset }));
+}